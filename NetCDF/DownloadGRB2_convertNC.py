@@ -1,28 +1,61 @@
 """
+Download the monthly NOAA WAVEWATCH III at_10m wind GRIB2 files from THREDDS, cut to the Gulf of Mexico box,
+as NetCDF. See grb2nc for the conversion; --source takes a local folder laid out like the THREDDS paths
+in place of the server, e.g. for testing:
 
+	python DownloadGRB2_convertNC.py --years 2005-2006 --workers 4
+	python DownloadGRB2_convertNC.py --source "/data/nww3/{year}/{month}/gribs/multi_1.at_10m.wind.{year}{month}.nc"
+
+Months whose NetCDF is already there (same box) are skipped.
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
 """
 
 import os
+import sys
+from argparse import ArgumentParser
+from grb2nc import GOM_BOX, MONTHS, THREDDS_URL, convertAll, monthlyJobs, printReport, writeReportCSV
 
 # years = list(range(2005,2020))
 years = [2005]
 
-months = ['01','02','03','04','05','06','07','08','09','10','11','12']
-
-for y in years:
-	for m in months:
-		
-		if (y == 2005) and (m == '01'):
-			continue
-		
-		url = "https://data.nodc.noaa.gov/thredds/dodsC/ncep/nww3/{}/{}/gribs/multi_1.at_10m.wind.{}.grb2".format(str(y),m,str(y) + m)
-		
-		path = "data.nodc.noaa.gov/thredds/dodsC/ncep/nww3/{}/{}/gribs/multi_1.at_10m.wind.{}.grb2".format(str(y),m,str(y) + m)
-		
-		file = "at_10m_{}.grb2".format(m+str(y))
-		
-		print(file)
-		
-		os.system("ncks -d lon,262.0,282.0 -d lat,18.0,30.8 {} -l {}".format(url,file))
-		
-		os.system("cdo -f nc copy {} {}".format(file, file.replace('.grb2', '.nc')))
\ No newline at end of file
+months = MONTHS
+
+# months (YYYYMM) left out, the original script always skipped January 2005
+skip = ['200501']
+
+
+def parseYears(text):
+
+	# '2005' or '2005-2019'
+	if '-' in text:
+		first, last = text.split('-')
+		return list(range(int(first), int(last) + 1))
+
+	return [int(text)]
+
+
+if __name__ == '__main__':
+
+	prsr = ArgumentParser(description='Download the monthly at_10m wind files as NetCDF cut to a box')
+	prsr.add_argument('--years', type=parseYears, default=years, help="e.g. 2005 or 2005-2019")
+	prsr.add_argument('--months', nargs='+', default=months, help='months, e.g. 01 02')
+	prsr.add_argument('--skip', nargs='*', default=skip, help='months (YYYYMM) to leave out, default 200501')
+	prsr.add_argument('--source', default=THREDDS_URL, help='URL or path template with {year} and {month}')
+	prsr.add_argument('--out_dir', default='.', help='folder of the NetCDFs')
+	prsr.add_argument('--box', type=float, nargs=4, default=GOM_BOX, metavar=('LON_MIN', 'LON_MAX', 'LAT_MIN', 'LAT_MAX'),
+					  help='lat/lon box to cut, default the Gulf of Mexico')
+	prsr.add_argument('--workers', type=int, default=4, help='downloads at once, 0 for one per core')
+	prsr.add_argument('--force', action='store_true', help='download even when the output is up to date')
+	prsr.add_argument('--report', default=None, help='CSV of the per-file status and timings')
+	args = prsr.parse_args()
+
+	os.makedirs(args.out_dir, exist_ok=True)
+	records = convertAll(monthlyJobs(args.years, args.months, args.source, args.out_dir, args.skip), tuple(args.box),
+						 args.workers, args.force)
+	printReport(records)
+	if args.report is not None:
+		writeReportCSV(records, args.report)
+	if any(r['status'] == 'failed' for r in records):
+		sys.exit(1)
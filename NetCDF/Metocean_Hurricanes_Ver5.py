@@ -3,9 +3,10 @@ Script to calculate the number of times and duration a platform is hit by a cert
 Uses storm NetCDFs and determines the category based on wind speed, which determines the size of the
 buffer that the platform must be within to be 'hit' by the storm.
 
-The mean time between each storm observation is 0.23 days (approx. 5.5 hours). This number was used to
-calculate the duration of each storm impact on a platform. Each time a platorm was within the buffer
-of a storm, 0.23 days was added to the duration for the category of the type of storm.
+Each time a platform is within the buffer of a storm, the days the hitting observation stands for are added
+to the duration for the category of the storm: half the time to the previous and half the time to the next
+observation of the same storm (storm_observations.observationDays). Earlier versions added a fixed 0.24 days
+per hit instead; --fixed_days brings that back for comparison with old outputs.
 
 In order to determine if the platform is within the storm buffer, the platform and storm latitude and
 longitudes needed to be converted from degrees to a standard x/y distance in meters. The latitude and
@@ -41,6 +42,9 @@ import os
 import scipy
 import time
 from osgeo import ogr
+from storm_dataset import StormDataset
+from char_arrays import decodeChars
+from storm_observations import observationDays
 import numpy as np
 
 D_FORMAT = '%m/%d/%Y'
@@ -52,6 +56,12 @@ LAST_DATE = datetime(2021,1,27)
 
 FLD_NAME = 'Storms'
 
+# days added per hit by the earlier versions, used with --fixed_days
+HIT_DAYS = 0.24
+
+# storm NetCDF variables read by runStatsForStorms
+STORM_VARIABLES = ['usa_lat', 'usa_lon', 'time', 'iso_time', 'usa_sshs', 'usa_wind', 'usa_seahgt', 'usa_gust', 'usa_pres', 'subbasin', 'sid']
+
 # NC_YEAR_FORMAT = f'Year.{year}.ibtracs_wmo.v03r10.nc'
 
 class PlatformRecord(object):
@@ -171,7 +181,7 @@ class PlatformRecord(object):
 		self.MCPP75 = None
 		self.MCPP90 = None
 
-	def addValue(self, cat, wave, wind, gust, mcp):
+	def addValue(self, cat, wave, wind, gust, mcp, days=HIT_DAYS):
 
 		self.totalHitCount += 1
 		
@@ -230,37 +240,37 @@ class PlatformRecord(object):
 				self.stormTotal += 1
 				self.tropical += 1
 				self.tropical_hitCheck = True
-			self.tropical_days += 0.24
+			self.tropical_days += days
 		if cat == 'C1':
 			if self.C1_hitCheck is False:
 				self.stormTotal += 1
 				self.C1 += 1
 				self.C1_hitCheck = True
-			self.C1_days += 0.24
+			self.C1_days += days
 		if cat == 'C2':
 			if self.C2_hitCheck is False:
 				self.stormTotal += 1
 				self.C2 += 1
 				self.C2_hitCheck = True
-			self.C2_days += 0.24
+			self.C2_days += days
 		if cat == 'C3':
 			if self.C3_hitCheck is False:
 				self.stormTotal += 1
 				self.C3 += 1
 				self.C3_hitCheck = True
-			self.C3_days += 0.24
+			self.C3_days += days
 		if cat == 'C4':
 			if self.C4_hitCheck is False:
 				self.stormTotal += 1
 				self.C4 += 1
 				self.C4_hitCheck = True
-			self.C4_days += 0.24
+			self.C4_days += days
 		if cat == 'C5':
 			if self.C5_hitCheck is False:
 				self.stormTotal += 1
 				self.C5 += 1
 				self.C5_hitCheck = True
-			self.C5_days += 0.24
+			self.C5_days += days
 
 	def FinishPlatform(self):
 
@@ -395,38 +405,38 @@ class YearlyRecord(object):
 		self.C5 = 0
 		self.C5_days = 0
 		
-	def AddHit(self, cat):
+	def AddHit(self, cat, days=HIT_DAYS):
 		
 		if cat == 'tropical':
 			if self.tropical_hitCheck == False:
 				self.tropical += 1
 				self.tropical_hitCheck = True
-			self.tropical_days += 0.24
+			self.tropical_days += days
 		if cat == 'C1':
 			if self.C1_hitCheck == False:
 				self.C1 += 1
 				self.C1_hitCheck = True
-			self.C1_days += 0.24
+			self.C1_days += days
 		if cat == 'C2':
 			if self.C2_hitCheck is False:
 				self.C2 += 1
 				self.C2_hitCheck = True
-			self.C2_days += 0.24
+			self.C2_days += days
 		if cat == 'C3':
 			if self.C3_hitCheck is False:
 				self.C3 += 1
 				self.C3_hitCheck = True
-			self.C3_days += 0.24
+			self.C3_days += days
 		if cat == 'C4':
 			if self.C4_hitCheck is False:
 				self.C4 += 1
 				self.C4_hitCheck = True
-			self.C4_days += 0.24
+			self.C4_days += days
 		if cat == 'C5':
 			if self.C5_hitCheck is False:
 				self.C5 += 1
 				self.C5_hitCheck = True
-			self.C5_days += 0.24
+			self.C5_days += days
 			
 	def ResetHitCheck(self):
 		
@@ -630,7 +640,7 @@ def GetDistanceBetweenPoints(platform_coords_list, storm_coords_list, id, iso_t,
 
 	return dist
 
-def checkHurricaneEffect(platform, storm_lon, storm_lat, cat, wind_speed, wave, gust, lon_min, lat_min, mcp, sid, iso_t, platform_coords_list, storm_coords_list):
+def checkHurricaneEffect(platform, storm_lon, storm_lat, cat, wind_speed, wave, gust, lon_min, lat_min, mcp, sid, iso_t, platform_coords_list, storm_coords_list, days=HIT_DAYS):
 	
 	# Saffir-Simpson Scale Hurricane Category
 	#Category  mph		m/s		kts
@@ -706,7 +716,7 @@ def checkHurricaneEffect(platform, storm_lon, storm_lat, cat, wind_speed, wave,
 
 		if distance <= radius:
 			# update platform record with stat
-			platform.addValue(category, wave, wind_speed, gust, mcp)
+			platform.addValue(category, wave, wind_speed, gust, mcp, days)
 			
 			return category
 		else:
@@ -715,7 +725,7 @@ def checkHurricaneEffect(platform, storm_lon, storm_lat, cat, wind_speed, wave,
 	return None
 
 
-def processStats(platform, numStorms, lat, lon, time, categ, msw, wave, gust, lon_min, lat_min, mcp, region, sid, iso_time, platform_coords_list, storm_coords_list):
+def processStats(platform, numStorms, lat, lon, time, categ, msw, wave, gust, lon_min, lat_min, mcp, region, sid, iso_time, platform_coords_list, storm_coords_list, hit_days=None):
 	# loop through each storm
 	error_count = 0
 	# set year to none for later
@@ -736,16 +746,26 @@ def processStats(platform, numStorms, lat, lon, time, categ, msw, wave, gust, lo
 			wave_storm = wave[i:i + 1].tolist()[0]
 			gust_storm = gust[i:i + 1].tolist()[0]
 			mcp_storm = mcp[i:i + 1].tolist()[0]
-			region_storm = region[i:i + 1].tolist()[0]
-			sid_storm = sid[i:i + 1].tolist()[0]
-			iso_time_storm = iso_time[i:i + 1].tolist()[0]
+			# char variables decoded for the whole track, '' where there is no observation
+			region_storm = decodeChars(region[i])
+			sid_storm = decodeChars(sid[i])
+			iso_time_storm = decodeChars(iso_time[i])
 		except:
 			error_count += 1
 			print("Read failed, storm # " + format(i))
 			continue
 
-		sid_list = sid_storm
-		sid_num = b''.join(sid_list).decode('utf-8')
+		sid_num = sid_storm.item()
+
+		# datetime of every observation of the track, None where the time is missing
+		track_time = iso_time_storm.astype('datetime64[s]')
+		time_obs_storm = track_time.tolist()
+
+		# days each observation of the track stands for, or hit_days for every one
+		if hit_days is None:
+			days_storm = observationDays(np.zeros(len(track_time)), track_time)
+		else:
+			days_storm = np.full(len(time_storm), hit_days)
 
 		# iso_t = b"".join(iso_time_storm[0]).decode("utf-8")
 		# if iso_t != None:
@@ -759,20 +779,15 @@ def processStats(platform, numStorms, lat, lon, time, categ, msw, wave, gust, lo
 		# for lat_s, lon_s, time_s, msw_s in zip(lat_storm,lon_storm,time_storm,msw_storm):
 		for t in range(0, len(time_storm)):
 
-			if region_storm[t][0] is not None:
+			if region_storm[t] != '':
 
-				r_list = region_storm[t]
-				r_reg = b''.join(r_list)
+				r_reg = region_storm[t]
 
-				# if (r_reg == b'GM') or (r_reg == b'NA'):
+				# if (r_reg == 'GM') or (r_reg == 'NA'):
 
-				# turn time_v into datetime object
-				try:
-					iso_t = b"".join(iso_time_storm[t]).decode("utf-8")
-					timeObs = readStormDateTime_ISO(iso_t)
-				# timeObs_next = readStormDateTime(time_storm[t+1])
-				except TypeError:
-					#print(TypeError)
+				iso_t = iso_time_storm[t]
+				timeObs = time_obs_storm[t]
+				if timeObs is None:
 					# occurs when the time variable is missing
 					continue
 				# keep track of the year for processing stats per year
@@ -796,20 +811,20 @@ def processStats(platform, numStorms, lat, lon, time, categ, msw, wave, gust, lo
 
 				if (platform.remove_date is None) and (timeObs >= platform.install_date):
 					# check whether or not the platform is affected by the storm and by what category
-					categ_hit = checkHurricaneEffect(platform, lon_storm[t], lat_storm[t], cat_storm[t], msw_storm[t], wave_storm[t], gust_storm[t], lon_min, lat_min, mcp_storm[t], sid_num, iso_t, platform_coords_list, storm_coords_list)
+					categ_hit = checkHurricaneEffect(platform, lon_storm[t], lat_storm[t], cat_storm[t], msw_storm[t], wave_storm[t], gust_storm[t], lon_min, lat_min, mcp_storm[t], sid_num, iso_t, platform_coords_list, storm_coords_list, days_storm[t])
 					# if the platform was "hit" by the hurricane, update the yearly stats
 					if categ_hit is not None:
-						YearStats.AddHit(categ_hit)
+						YearStats.AddHit(categ_hit, days_storm[t])
 
 					continue
 
 				# check if the time is between the platform install and removal date or no removal date
 				if (timeObs >= platform.install_date) and (timeObs <= platform.remove_date):
 					# check whether or not the platform is affected by the storm and by what category
-					categ_hit = checkHurricaneEffect(platform, lon_storm[t], lat_storm[t], cat_storm[t], msw_storm[t], wave_storm[t], gust_storm[t], lon_min, lat_min, mcp_storm[t], sid_num, iso_t, platform_coords_list, storm_coords_list)
+					categ_hit = checkHurricaneEffect(platform, lon_storm[t], lat_storm[t], cat_storm[t], msw_storm[t], wave_storm[t], gust_storm[t], lon_min, lat_min, mcp_storm[t], sid_num, iso_t, platform_coords_list, storm_coords_list, days_storm[t])
 					# if the platform was "hit" by the hurricane, update the yearly stats
 					if categ_hit is not None:
-						YearStats.AddHit(categ_hit)
+						YearStats.AddHit(categ_hit, days_storm[t])
 
 	# update platform yearly stats with YearRecord
 	platform.UpdateYearlyStats(YearStats)
@@ -832,58 +847,53 @@ def GetNC_Min(ncDir, var_name):
 			
 	return min
 
-def runStatsForStorms(platforms, ncDir, start_date, stop_date, platform_coords_list, storm_coords_list):
+def runStatsForStorms(platforms, ncDir, start_date, stop_date, platform_coords_list, storm_coords_list, workers=1, hit_days=None):
 	
-	# get minimum values for all latitude and longitudes in the net CDFs
-	lat_min = GetNC_Min(ncDir, 'usa_lat')
-	lon_min = GetNC_Min(ncDir, 'usa_lon')
+	# every storm NetCDF matching ncDir, read in parallel and stacked into one dataset in file order
+	print('Reading: ' + format(ncDir))
+	ds = StormDataset(sorted(iglob(ncDir)), STORM_VARIABLES, workers)
 	
-	ncFiles = iglob(ncDir)
+	# minimum values for all latitude and longitudes in the net CDFs, taken while reading
+	lat_min = ds.Min('usa_lat')
+	lon_min = ds.Min('usa_lon')
 	
-	for nc in ncFiles:
+	start = time.time()
+	
+	# grab variables of all storms
+	c_lat = ds.variables['usa_lat']
+	c_lon = ds.variables['usa_lon']
+	c_time = ds.variables['time']
+	c_time_iso = ds.variables['iso_time']
+	c_cat = ds.variables['usa_sshs']
+	c_msw = ds.variables['usa_wind']
+	c_wave = ds.variables['usa_seahgt']
+	c_gust = ds.variables['usa_gust']
+	c_mcp = ds.variables['usa_pres']
+	c_region = ds.variables['subbasin']
+	c_sid = ds.variables['sid']
+	
+	# note number of storms in all netCDFs
+	dsLen = len(ds.dimensions['storm'])
+	# keeping track of platform records
+	n = 1
+	plat_length = len(platforms)
+	# loop over each platform record
+	for p in platforms:
 
-		print('Processing: ' + format(nc))
-		
-		start = time.time()
+		asd = p.lat
+
+		if p.lat == asd:
 		
-		# open netCDF
-		ds = netCDF4.Dataset(nc, 'r')
+			print('Completing ' + format(n) + ' out of ' + format(plat_length) + ' platform records')
+			# print('Platform Record: ' + format(n))
+			# calculate the x and y coordinates for the platform
+			p.x, p.y = sph2xy(p.lon, lon_min, p.lat, lat_min)
+			processStats(p, dsLen, c_lat, c_lon, c_time, c_cat, c_msw, c_wave, c_gust, lon_min, lat_min, c_mcp, c_region, c_sid, c_time_iso, platform_coords_list, storm_coords_list, hit_days)
+			n += 1
 		
-		# grab variables for current index
-		c_lat = ds.variables['usa_lat']
-		c_lon = ds.variables['usa_lon']
-		c_time = ds.variables['time']
-		c_time_iso = ds.variables['iso_time']
-		c_cat = ds.variables['usa_sshs']
-		c_msw = ds.variables['usa_wind']
-		c_wave = ds.variables['usa_seahgt']
-		c_gust = ds.variables['usa_gust']
-		c_mcp = ds.variables['usa_pres']
-		c_region = ds.variables['subbasin']
-		c_sid = ds.variables['sid']
+	end = time.time()
+	print(end - start)
 		
-		# note number of storms in netCDF
-		dsLen = len(ds.dimensions['storm'])
-		# keeping track of platform records
-		n = 1
-		plat_length = len(platforms)
-		# loop over each platform record
-		for p in platforms:
-
-			asd = p.lat
-
-			if p.lat == asd:
-			
-				print('Completing ' + format(n) + ' out of ' + format(plat_length) + ' platform records')
-				# print('Platform Record: ' + format(n))
-				# calculate the x and y coordinates for the platform
-				p.x, p.y = sph2xy(p.lon, lon_min, p.lat, lat_min)
-				processStats(p, dsLen, c_lat, c_lon, c_time, c_cat, c_msw, c_wave, c_gust, lon_min, lat_min, c_mcp, c_region, c_sid, c_time_iso, platform_coords_list, storm_coords_list)
-				n += 1
-			
-		end = time.time()
-		print(end - start)
-			
 def writeResultsToCSV(platforms, outpath):
 	
 	with open(outpath, 'w', newline='') as outfile:
@@ -943,26 +953,31 @@ if __name__ == "__main__":
 	#storm_points_name = 'IBTRACS_NA_Points_GomAlbers'
 	
 	prsr = ArgumentParser(description="Generate Stats per platform")
-	prsr.add_argument('platform_csv', type=str,
+	prsr.add_argument('platform_csv', type=str, nargs='?', default=platform_csv,
 					  help='csv with platform data')
-	prsr.add_argument('nc_dir', type=str, help='path to directory containing netcdf data')
-	prsr.add_argument('outputs', type=str, help='path to output data')
+	prsr.add_argument('nc_dir', type=str, nargs='?', default=nc_dir, help='path to directory containing netcdf data')
+	prsr.add_argument('outputs', type=str, nargs='?', default=output_path, help='path to output data')
+	prsr.add_argument('--platform_points', type=str, default=platform_points, help='platform point shapefile')
+	prsr.add_argument('--storm_points', type=str, default=storm_points, help='storm point shapefile')
 	prsr.add_argument('--start_date', type=readPlatDateTime, default=FIRST_DATE, help='Start of querying period')
 	prsr.add_argument('--stop_date', type=readPlatDateTime, default=LAST_DATE, help='End of querying period')
 	prsr.add_argument('--stats', '-s', nargs='+', help='statistics to run')
+	prsr.add_argument('--workers', type=int, default=1, help='processes reading the storm NetCDFs, 0 for one per core')
+	prsr.add_argument('--fixed_days', action='store_const', const=HIT_DAYS, default=None,
+					  help='add 0.24 days per hit as the earlier versions did, instead of the time between observations')
 
-	args = prsr.parse_args([platform_csv, nc_dir, output_path])
+	args = prsr.parse_args()
 
 	if args.start_date >= args.stop_date:
 		raise Exception('start_date must proceed stop_date')
 
 	# open platform and storm points and get IDs and coordinates as a list
-	platform_coords_list = GetPlatformCoords(platform_points)
-	storm_coords_list = GetStormCoords(storm_points)
+	platform_coords_list = GetPlatformCoords(args.platform_points)
+	storm_coords_list = GetStormCoords(args.storm_points)
 
 	# load the platforms csv
 	platforms = loadPlatformCsv(args.platform_csv)
 
-	runStatsForStorms(platforms, os.path.join(args.nc_dir, '*.nc'), args.start_date, args.stop_date, platform_coords_list, storm_coords_list)
+	runStatsForStorms(platforms, os.path.join(args.nc_dir, '*.nc'), args.start_date, args.stop_date, platform_coords_list, storm_coords_list, args.workers, args.fixed_days)
 	
-	writeResultsToCSV(platforms, output_path)
\ No newline at end of file
+	writeResultsToCSV(platforms, args.outputs)
\ No newline at end of file
@@ -3,9 +3,9 @@ Script to calculate the number of times and duration a platform is hit by a cert
 Uses storm NetCDFs and determines the category based on wind speed, which determines the size of the
 buffer that the platform must be within to be 'hit' by the storm.
 
-The mean time between each storm observation is 0.23 days (approx. 5.5 hours). This number was used to
-calculate the duration of each storm impact on a platform. Each time a platorm was within the buffer
-of a storm, 0.23 days was added to the duration for the category of the type of storm.
+Each observation hitting a grid cell adds the days it stands for to the cell, taken from the time to the
+neighbouring observations of its storm (see storm_observations.observationDays). Earlier versions added a
+fixed 0.24 days per hit, about twice the 3-hourly step of the v04 data; --fixed_days keeps that behaviour.
 
 In order to determine if the platform is within the storm buffer, the platform and storm latitude and
 longitudes needed to be converted from degrees to a standard x/y distance in meters. The latitude and
@@ -42,6 +42,12 @@ import os
 import scipy
 import time
 from osgeo import ogr, gdal, osr
+from spatial_index import GridIndex
+from projection import GetTransform, ProjectPoints, ProjectPoint
+from storm_dataset import StormDataset
+from storm_observations import interpolateTracks, observationDays, tableFromArrays
+from char_arrays import decodeChars
+from storm_category import CATEGORIES, CATEGORY_RADII, NO_CATEGORY, categoryCode, categoryCodes
 
 D_FORMAT = '%m/%d/%Y'
 DT_FORMAT = '%m/%d/%Y %H:%M:%S'
@@ -52,11 +58,28 @@ LAST_DATE = datetime(2021, 1, 27)
 
 FLD_NAME = 'Storms'
 
+# storm NetCDF variables read by runStatsForStorms
+STORM_VARIABLES = ['usa_lat', 'usa_lon', 'time', 'iso_time', 'usa_sshs', 'usa_wind', 'usa_seahgt', 'usa_gust',
+                   'usa_pres', 'subbasin', 'sid']
+
+# days per hit of the earlier versions, kept for --fixed_days
+HIT_DAYS = 0.24
+
+# observations whose cells are found and added at once by processTable
+TABLE_CHUNK_SIZE = 1024
+
 
 # NC_YEAR_FORMAT = f'Year.{year}.ibtracs_wmo.v03r10.nc'
 
 class GridRecord(object):
 
+    # Hurricane statistics per grid cell. The count, min and max grids are float32 and the wave/wind/gust/MCP
+    # averages are only computed at export (UpdateAverages), not on every hit. The running sums (values and
+    # days) are float64, float32 stops adding whole numbers exactly above 2**24, and are cast at export
+
+    DTYPE = np.float32
+    SUM_DTYPE = np.float64
+
     def __init__(self, grid, mask):
 
         self.grid = grid
@@ -65,266 +88,170 @@ class GridRecord(object):
         # self.lon = float(Lon)
         self.x = grid.shape[0]
         self.y = grid.shape[1]
-        self.grid_init_zeros = np.zeros((self.x, self.y), dtype=np.float)
-        self.grid_init_zeros = np.zeros((self.x, self.y), dtype=np.float)
-        self.grid_init_pos = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.grid_init_neg = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.stormTotal = np.zeros((self.x, self.y), dtype=np.float)
-        self.cat_noneCount = np.zeros((self.x, self.y), dtype=np.float)
-        self.tropical_hitCheck = False
-        self.tropical = np.zeros((self.x, self.y), dtype=np.float)
-        self.tropical_min = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.tropical_max = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.tropical_mean = np.zeros((self.x, self.y), dtype=np.float)
-        self.tropical_days = np.zeros((self.x, self.y), dtype=np.float)
-        self.tropical_days_min = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.tropical_days_max = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.tropical_days_mean = np.zeros((self.x, self.y), dtype=np.float)
-        self.C1_hitCheck = False
-        self.C1 = np.zeros((self.x, self.y), dtype=np.float)
-        self.C1_min = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.C1_max = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.C1_mean = np.zeros((self.x, self.y), dtype=np.float)
-        self.C1_days = np.zeros((self.x, self.y), dtype=np.float)
-        self.C1_days_min = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.C1_days_max = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.C1_days_mean = np.zeros((self.x, self.y), dtype=np.float)
-        self.C2_hitCheck = False
-        self.C2 = np.zeros((self.x, self.y), dtype=np.float)
-        self.C2_min = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.C2_max = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.C2_mean = np.zeros((self.x, self.y), dtype=np.float)
-        self.C2_days = np.zeros((self.x, self.y), dtype=np.float)
-        self.C2_days_min = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.C2_days_max = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.C2_days_mean = np.zeros((self.x, self.y), dtype=np.float)
-        self.C3_hitCheck = False
-        self.C3 = np.zeros((self.x, self.y), dtype=np.float)
-        self.C3_min = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.C3_max = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.C3_mean = np.zeros((self.x, self.y), dtype=np.float)
-        self.C3_days = np.zeros((self.x, self.y), dtype=np.float)
-        self.C3_days_min = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.C3_days_max = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.C3_days_mean = np.zeros((self.x, self.y), dtype=np.float)
-        self.C4_hitCheck = False
-        self.C4 = np.zeros((self.x, self.y), dtype=np.float)
-        self.C4_min = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.C4_max = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.C4_mean = np.zeros((self.x, self.y), dtype=np.float)
-        self.C4_days = np.zeros((self.x, self.y), dtype=np.float)
-        self.C4_days_min = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.C4_days_max = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.C4_days_mean = np.zeros((self.x, self.y), dtype=np.float)
-        self.C5_hitCheck = False
-        self.C5 = np.zeros((self.x, self.y), dtype=np.float)
-        self.C5_min = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.C5_max = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.C5_mean = np.zeros((self.x, self.y), dtype=np.float)
-        self.C5_days = np.zeros((self.x, self.y), dtype=np.float)
-        self.C5_days_min = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.C5_days_max = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.C5_days_mean = np.zeros((self.x, self.y), dtype=np.float)
-        self.waveHeightCount = np.zeros((self.x, self.y), dtype=np.float)
-        self.waveHeightNoneCount = np.zeros((self.x, self.y), dtype=np.float)
-        self.waveHeightSum = np.zeros((self.x, self.y), dtype=np.float)
-        self.waveHeightAverage = np.zeros((self.x, self.y), dtype=np.float)
-        self.waveHeightMax = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.waveHeightMin = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.windCount = np.zeros((self.x, self.y), dtype=np.float)
-        self.windNoneCount = np.zeros((self.x, self.y), dtype=np.float)
-        self.windSum = np.zeros((self.x, self.y), dtype=np.float)
-        self.windAverage = np.zeros((self.x, self.y), dtype=np.float)
-        self.windMax = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.windMin = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.gustCount = np.zeros((self.x, self.y), dtype=np.float)
-        self.gustNoneCount = np.zeros((self.x, self.y), dtype=np.float)
-        self.gustSum = np.zeros((self.x, self.y), dtype=np.float)
-        self.gustAverage = np.zeros((self.x, self.y), dtype=np.float)
-        self.gustMax = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.gustMin = np.full((self.x, self.y), 999999, dtype=np.float)
-        self.yearCount = np.zeros((self.x, self.y), dtype=np.float)
-        self.MCPCount = np.zeros((self.x, self.y), dtype=np.float)
-        self.MCPNoneCount = np.zeros((self.x, self.y), dtype=np.float)
-        self.MCPSum = np.zeros((self.x, self.y), dtype=np.float)
-        self.MCPAverage = np.zeros((self.x, self.y), dtype=np.float)
-        self.MCPMax = np.full((self.x, self.y), -999999, dtype=np.float)
-        self.MCPMin = np.full((self.x, self.y), 999999, dtype=np.float)
-
-    def addValue(self, cat, indx, wave, wind, gust, mcp):
-
+        self.stormTotal = self.Zeros()
+        self.cat_noneCount = self.Zeros()
+        # per category grids stacked along the first axis, so they are indexed by category code
+        # (see storm_category). tropical, C1_days_max, ... are views into the stacks
+        k = len(CATEGORIES)
+        self.hit_check = np.zeros(k, dtype=bool)
+        self.cat_count = self.Zeros(k)
+        self.cat_min = self.Full(999999, k)
+        self.cat_max = self.Full(-999999, k)
+        self.cat_mean = self.Zeros(k)
+        self.cat_days = self.Zeros(k, self.SUM_DTYPE)
+        self.cat_days_min = self.Full(999999, k)
+        self.cat_days_max = self.Full(-999999, k)
+        self.cat_days_mean = self.Zeros(k)
+        for code, name in enumerate(CATEGORIES):
+            setattr(self, name, self.cat_count[code])
+            setattr(self, name + '_min', self.cat_min[code])
+            setattr(self, name + '_max', self.cat_max[code])
+            setattr(self, name + '_mean', self.cat_mean[code])
+            setattr(self, name + '_days', self.cat_days[code])
+            setattr(self, name + '_days_min', self.cat_days_min[code])
+            setattr(self, name + '_days_max', self.cat_days_max[code])
+            setattr(self, name + '_days_mean', self.cat_days_mean[code])
+        self.waveHeightCount = self.Zeros()
+        self.waveHeightNoneCount = self.Zeros()
+        self.waveHeightSum = self.Zeros(dtype=self.SUM_DTYPE)
+        self.waveHeightMax = self.Full(-999999)
+        self.waveHeightMin = self.Full(999999)
+        self.windCount = self.Zeros()
+        self.windNoneCount = self.Zeros()
+        self.windSum = self.Zeros(dtype=self.SUM_DTYPE)
+        self.windMax = self.Full(-999999)
+        self.windMin = self.Full(999999)
+        self.gustCount = self.Zeros()
+        self.gustNoneCount = self.Zeros()
+        self.gustSum = self.Zeros(dtype=self.SUM_DTYPE)
+        self.gustMax = self.Full(-999999)
+        self.gustMin = self.Full(999999)
+        self.yearCount = self.Zeros()
+        self.MCPCount = self.Zeros()
+        self.MCPNoneCount = self.Zeros()
+        self.MCPSum = self.Zeros(dtype=self.SUM_DTYPE)
+        self.MCPMax = self.Full(-999999)
+        self.MCPMin = self.Full(999999)
+
+    def Zeros(self, k=None, dtype=None):
+        return np.zeros(self.Shape(k), dtype=self.DTYPE if dtype is None else dtype)
+
+    def Full(self, value, k=None):
+        return np.full(self.Shape(k), value, dtype=self.DTYPE)
+
+    def Shape(self, k=None):
+
+        # one grid, or k stacked grids
+        return (self.x, self.y) if k is None else (k, self.x, self.y)
+
+    def addValue(self, cat, indx, wave, wind, gust, mcp, days=HIT_DAYS):
+
+        # indx is a (rows, cols) tuple of distinct cells, so the fancy index updates below
+        # touch only the hit cells. days is the time the observation stands for
         self.stormTotal[indx] += 1
 
         if wave is not None:
             self.waveHeightCount[indx] += 1
             self.waveHeightSum[indx] += wave
-            self.waveHeightAverage[indx] = (self.waveHeightSum[indx] / self.waveHeightCount[indx])
-            if (wave > self.waveHeightMax[indx].any()) or (wave < self.waveHeightMin[indx].any()):
-                for xi, yi in np.array(indx).T.tolist():
-                    if self.waveHeightMax[xi, yi] < wave:
-                        self.waveHeightMax[xi, yi] = wave
-                    if self.waveHeightMin[xi, yi] > wave:
-                        self.waveHeightMin[xi, yi] = wave
+            self.waveHeightMax[indx] = np.maximum(self.waveHeightMax[indx], wave)
+            self.waveHeightMin[indx] = np.minimum(self.waveHeightMin[indx], wave)
         if wave is None:
             self.waveHeightNoneCount[indx] += 1
 
         if wind is not None:
             self.windCount[indx] += 1
             self.windSum[indx] += wind
-            self.windAverage[indx] = (self.windSum[indx] / self.windCount[indx])
-            if (wind > self.windMax[indx].any()) or (wind < self.windMin[indx].any()):
-                for xi, yi in np.array(indx).T.tolist():
-                    if self.windMax[xi, yi] < wind:
-                        self.windMax[xi, yi] = wind
-                    if self.windMin[xi, yi] > wind:
-                        self.windMin[xi, yi] = wind
+            self.windMax[indx] = np.maximum(self.windMax[indx], wind)
+            self.windMin[indx] = np.minimum(self.windMin[indx], wind)
         if wind is None:
             self.windNoneCount[indx] += 1
 
         if gust is not None:
             self.gustCount[indx] += 1
             self.gustSum[indx] += gust
-            self.gustAverage[indx] = (self.gustSum[indx] / self.gustCount[indx])
-            if (gust > self.gustMax[indx].any()) or (gust < self.gustMin[indx].any()):
-                for xi, yi in np.array(indx).T.tolist():
-                    if self.gustMax[xi, yi] < gust:
-                        self.gustMax[xi, yi] = gust
-                    if self.gustMin[xi, yi] > gust:
-                        self.gustMax[xi, yi] = gust
+            self.gustMax[indx] = np.maximum(self.gustMax[indx], gust)
+            self.gustMin[indx] = np.minimum(self.gustMin[indx], gust)
         if gust is None:
             self.gustNoneCount[indx] += 1
 
         if mcp is not None:
             self.MCPCount[indx] += 1
             self.MCPSum[indx] += mcp
-            self.MCPAverage[indx] = (self.MCPSum[indx] / self.MCPCount[indx])
-            if (mcp > self.MCPMax[indx].any()) or (mcp < self.MCPMin[indx].any()):
-                for xi, yi in np.array(indx).T.tolist():
-                    if self.MCPMax[xi, yi] < mcp:
-                        self.MCPMax[xi, yi] = mcp
-                    if self.MCPMin[xi, yi] > mcp:
-                        self.MCPMin[xi, yi] = mcp
+            self.MCPMax[indx] = np.maximum(self.MCPMax[indx], mcp)
+            self.MCPMin[indx] = np.minimum(self.MCPMin[indx], mcp)
         if mcp is None:
             self.gustNoneCount[indx] += 1
 
-        if cat is None:
+        # cat is a category code (see storm_category)
+        if cat is None or cat == NO_CATEGORY:
             self.cat_noneCount[indx] += 1
             return
-        if cat == 'tropical':
-            if self.tropical_hitCheck is False:
-                self.tropical[indx] += 1
-                self.tropical_hitCheck = True
-            self.tropical_days[indx] += 0.24
-        if cat == 'C1':
-            if self.C1_hitCheck is False:
-                self.C1[indx] += 1
-                self.C1_hitCheck = True
-            self.C1_days[indx] += 0.24
-        if cat == 'C2':
-            if self.C2_hitCheck is False:
-                self.C2[indx] += 1
-                self.C2_hitCheck = True
-            self.C2_days[indx] += 0.24
-        if cat == 'C3':
-            if self.C3_hitCheck is False:
-                self.C3[indx] += 1
-                self.C3_hitCheck = True
-            self.C3_days[indx] += 0.24
-        if cat == 'C4':
-            if self.C4_hitCheck is False:
-                self.C4[indx] += 1
-                self.C4_hitCheck = True
-            self.C4_days[indx] += 0.24
-        if cat == 'C5':
-            if self.C5_hitCheck is False:
-                self.C5[indx] += 1
-                self.C5_hitCheck = True
-            self.C5_days[indx] += 0.24
+        if self.hit_check[cat] == False:
+            self.cat_count[cat][indx] += 1
+            self.hit_check[cat] = True
+        self.cat_days[cat][indx] += days
+
+    def addValues(self, cells, cat, wave, wind, gust, mcp, days, first):
+
+        # hits of a batch of observations as (flat cell, observation) pairs in observation order, with
+        # the category code, values (masked where missing) and days of the observation of every pair.
+        # first marks the pairs of the first observation of its category in the storm, see addValue.
+        # The values added match the dtype of the grids and the stacks are indexed flat, which keeps
+        # np.add.at on its fast path
+        cells = np.asarray(cells, dtype=np.intp)
+        one = self.DTYPE(1)
+        np.add.at(self.stormTotal.reshape(-1), cells, one)
+
+        # missing pressure has always been counted as missing gust
+        for value, count, none, total, vmax, vmin in (
+                (wave, self.waveHeightCount, self.waveHeightNoneCount, self.waveHeightSum, self.waveHeightMax,
+                 self.waveHeightMin),
+                (wind, self.windCount, self.windNoneCount, self.windSum, self.windMax, self.windMin),
+                (gust, self.gustCount, self.gustNoneCount, self.gustSum, self.gustMax, self.gustMin),
+                (mcp, self.MCPCount, self.gustNoneCount, self.MCPSum, self.MCPMax, self.MCPMin)):
+            missing = np.ma.getmaskarray(value)
+            np.add.at(none.reshape(-1), cells[missing], one)
+            c = cells[~missing]
+            v = np.ma.getdata(value)[~missing].astype(self.SUM_DTYPE)
+            np.add.at(count.reshape(-1), c, one)
+            np.add.at(total.reshape(-1), c, v)
+            np.maximum.at(vmax.reshape(-1), c, v.astype(self.DTYPE))
+            np.minimum.at(vmin.reshape(-1), c, v.astype(self.DTYPE))
+
+        none = cat == NO_CATEGORY
+        np.add.at(self.cat_noneCount.reshape(-1), cells[none], one)
+        flat = cat * self.stormTotal.size + cells
+        first = first & ~none
+        np.add.at(self.cat_count.reshape(-1), flat[first], one)
+        np.add.at(self.cat_days.reshape(-1), flat[~none], days[~none].astype(self.SUM_DTYPE))
+
+    def UpdateAverages(self):
+
+        # mean value per hit, 0 where a cell has no values
+        self.waveHeightAverage = self.Average(self.waveHeightSum, self.waveHeightCount)
+        self.windAverage = self.Average(self.windSum, self.windCount)
+        self.gustAverage = self.Average(self.gustSum, self.gustCount)
+        self.MCPAverage = self.Average(self.MCPSum, self.MCPCount)
+
+    def Average(self, total, count):
+        return np.divide(total, count, out=self.Zeros(), where=count > 0)
 
     def ResetHitCheck(self):
 
-        self.tropical_hitCheck = False
-        self.C1_hitCheck = False
-        self.C2_hitCheck = False
-        self.C3_hitCheck = False
-        self.C4_hitCheck = False
-        self.C5_hitCheck = False
+        self.hit_check[:] = False
 
     def UpdateYearlyStats(self, YearStats):
 
         self.yearCount += 1
 
-        topical_min_indx = np.where((YearStats.tropical - self.tropical_min) < 0)
-        self.tropical_min[topical_min_indx] = YearStats.tropical[topical_min_indx]
-        topical_max_indx = np.where((YearStats.tropical - self.tropical_max) > 0)
-        self.tropical_max[topical_max_indx] = YearStats.tropical[topical_max_indx]
-        self.tropical_mean = (self.tropical / self.yearCount)
-
-        tropical_days_min_indx = np.where((YearStats.tropical_days - self.tropical_days_min) < 0)
-        self.tropical_days_min[tropical_days_min_indx] = YearStats.tropical_days[tropical_days_min_indx]
-        tropical_days_max_indx = np.where((YearStats.tropical_days - self.tropical_days_max) > 0)
-        self.tropical_days_max[tropical_days_max_indx] = YearStats.tropical_days[tropical_days_max_indx]
-        self.tropical_days_mean = (self.tropical_days / self.yearCount)
-
-        c1_min_indx = np.where((YearStats.C1 - self.C1_min) < 0)
-        self.C1_min[c1_min_indx] = YearStats.C1[c1_min_indx]
-        c1_max_indx = np.where((YearStats.C1 - self.C1_max) > 0)
-        self.C1_max[c1_max_indx] = YearStats.C1[c1_max_indx]
-        self.C1_mean = (self.C1 / self.yearCount)
-
-        c1_days_min_indx = np.where((YearStats.C1_days - self.C1_days_min) < 0)
-        self.C1_days_min[c1_days_min_indx] = YearStats.C1_days[c1_days_min_indx]
-        c1_days_max_indx = np.where((YearStats.C1_days - self.C1_days_max) > 0)
-        self.C1_days_max[c1_days_max_indx] = YearStats.C1_days[c1_days_max_indx]
-        self.C1_days_mean = (self.C1_days / self.yearCount)
-
-        c2_min_indx = np.where((YearStats.C2 - self.C2_min) < 0)
-        self.C2_min[c2_min_indx] = YearStats.C2[c2_min_indx]
-        c2_max_indx = np.where((YearStats.C2 - self.C2_max) > 0)
-        self.C2_max[c2_max_indx] = YearStats.C2[c2_max_indx]
-        self.C2_mean = (self.C2 / self.yearCount)
-
-        c2_days_min_indx = np.where((YearStats.C2_days - self.C2_days_min) < 0)
-        self.C2_days_min[c2_days_min_indx] = YearStats.C2_days[c2_days_min_indx]
-        c2_days_max_indx = np.where((YearStats.C2_days - self.C2_days_max) > 0)
-        self.C2_days_max[c2_days_max_indx] = YearStats.C2_days[c2_days_max_indx]
-        self.C2_days_mean = (self.C2_days / self.yearCount)
-
-        c3_min_indx = np.where((YearStats.C3 - self.C3_min) < 0)
-        self.C3_min[c3_min_indx] = YearStats.C3[c3_min_indx]
-        c3_max_indx = np.where((YearStats.C3 - self.C3_max) > 0)
-        self.C3_max[c3_max_indx] = YearStats.C3[c3_max_indx]
-        self.C3_mean = (self.C3 / self.yearCount)
-
-        c3_days_min_indx = np.where((YearStats.C3_days - self.C3_days_min) < 0)
-        self.C3_days_min[c3_days_min_indx] = YearStats.C3_days[c3_days_min_indx]
-        c3_days_max_indx = np.where((YearStats.C3_days - self.C3_days_max) > 0)
-        self.C3_days_max[c3_days_max_indx] = YearStats.C3_days[c3_days_max_indx]
-        self.C3_days_mean = (self.C3_days / self.yearCount)
-
-        c4_min_indx = np.where((YearStats.C4 - self.C4_min) < 0)
-        self.C4_min[c4_min_indx] = YearStats.C4[c4_min_indx]
-        c4_max_indx = np.where((YearStats.C4 - self.C4_max) > 0)
-        self.C4_max[c4_max_indx] = YearStats.C4[c4_max_indx]
-        self.C4_mean = (self.C4 / self.yearCount)
-
-        c4_days_min_indx = np.where((YearStats.C4_days - self.C4_days_min) < 0)
-        self.C4_days_min[c4_days_min_indx] = YearStats.C4_days[c4_days_min_indx]
-        c4_days_max_indx = np.where((YearStats.C4_days - self.C4_days_max) > 0)
-        self.C4_days_max[c4_days_max_indx] = YearStats.C4_days[c4_days_max_indx]
-        self.C4_days_mean = (self.C4_days / self.yearCount)
-
-        c5_min_indx = np.where((YearStats.C5 - self.C5_min) < 0)
-        self.C5_min[c5_min_indx] = YearStats.C5[c5_min_indx]
-        c5_max_indx = np.where((YearStats.C5 - self.C5_max) > 0)
-        self.C5_max[c5_max_indx] = YearStats.C5[c5_max_indx]
-        self.C5_mean = (self.C5 / self.yearCount)
-
-        c5_days_min_indx = np.where((YearStats.C5_days - self.C5_days_min) < 0)
-        self.C5_days_min[c5_days_min_indx] = YearStats.C5_days[c5_days_min_indx]
-        c5_days_max_indx = np.where((YearStats.C5_days - self.C5_days_max) > 0)
-        self.C5_days_max[c5_days_max_indx] = YearStats.C5_days[c5_days_max_indx]
-        self.C5_days_mean = (self.C5_days / self.yearCount)
+        # yearly min/max of the category counts and days, and their mean over the years so far
+        np.minimum(self.cat_min, YearStats.cat_count, out=self.cat_min)
+        np.maximum(self.cat_max, YearStats.cat_count, out=self.cat_max)
+        np.divide(self.cat_count, self.yearCount, out=self.cat_mean)
+
+        np.minimum(self.cat_days_min, YearStats.cat_days, out=self.cat_days_min)
+        np.maximum(self.cat_days_max, YearStats.cat_days, out=self.cat_days_max)
+        np.divide(self.cat_days, self.yearCount, out=self.cat_days_mean)
 
 
 class YearlyRecord(object):
@@ -335,67 +262,33 @@ class YearlyRecord(object):
     def __init__(self, grid):
         self.x = grid[0]
         self.y = grid[1]
-        self.grid_init_zeros = np.zeros((self.x, self.y), dtype=np.float)
-        self.tropical_hitCheck = False
-        self.tropical = np.zeros((self.x, self.y), dtype=np.float)
-        self.tropical_days = np.zeros((self.x, self.y), dtype=np.float)
-        self.C1_hitCheck = False
-        self.C1 = np.zeros((self.x, self.y), dtype=np.float)
-        self.C1_days = np.zeros((self.x, self.y), dtype=np.float)
-        self.C2_hitCheck = False
-        self.C2 = np.zeros((self.x, self.y), dtype=np.float)
-        self.C2_days = np.zeros((self.x, self.y), dtype=np.float)
-        self.C3_hitCheck = False
-        self.C3 = np.zeros((self.x, self.y), dtype=np.float)
-        self.C3_days = np.zeros((self.x, self.y), dtype=np.float)
-        self.C4_hitCheck = False
-        self.C4 = np.zeros((self.x, self.y), dtype=np.float)
-        self.C4_days = np.zeros((self.x, self.y), dtype=np.float)
-        self.C5_hitCheck = False
-        self.C5 = np.zeros((self.x, self.y), dtype=np.float)
-        self.C5_days = np.zeros((self.x, self.y), dtype=np.float)
-
-    def AddHit(self, cat, indx):
-
-        if cat == 'tropical':
-            if self.tropical_hitCheck == False:
-                self.tropical[indx] += 1
-                self.tropical_hitCheck = True
-            self.tropical_days[indx] += 0.24
-        if cat == 'C1':
-            if self.C1_hitCheck == False:
-                self.C1[indx] += 1
-                self.C1_hitCheck = True
-            self.C1_days[indx] += 0.24
-        if cat == 'C2':
-            if self.C2_hitCheck is False:
-                self.C2[indx] += 1
-                self.C2_hitCheck = True
-            self.C2_days[indx] += 0.24
-        if cat == 'C3':
-            if self.C3_hitCheck is False:
-                self.C3[indx] += 1
-                self.C3_hitCheck = True
-            self.C3_days[indx] += 0.24
-        if cat == 'C4':
-            if self.C4_hitCheck is False:
-                self.C4[indx] += 1
-                self.C4_hitCheck = True
-            self.C4_days[indx] += 0.24
-        if cat == 'C5':
-            if self.C5_hitCheck is False:
-                self.C5[indx] += 1
-                self.C5_hitCheck = True
-            self.C5_days[indx] += 0.24
+        k = len(CATEGORIES)
+        self.hit_check = np.zeros(k, dtype=bool)
+        self.cat_count = np.zeros((k, self.x, self.y), dtype=GridRecord.DTYPE)
+        self.cat_days = np.zeros((k, self.x, self.y), dtype=GridRecord.SUM_DTYPE)
+        for code, name in enumerate(CATEGORIES):
+            setattr(self, name, self.cat_count[code])
+            setattr(self, name + '_days', self.cat_days[code])
+
+    def AddHit(self, cat, indx, days=HIT_DAYS):
+
+        # cat is a category code (see storm_category)
+        if self.hit_check[cat] == False:
+            self.cat_count[cat][indx] += 1
+            self.hit_check[cat] = True
+        self.cat_days[cat][indx] += days
+
+    def AddHits(self, cells, cat, days, first):
+
+        # batch of AddHit as (flat cell, observation) pairs, first marks the pairs of the first observation
+        # of its category since the last ResetHitCheck, see GridRecord.addValues
+        flat = cat * (self.x * self.y) + cells
+        np.add.at(self.cat_count.reshape(-1), flat[first], GridRecord.DTYPE(1))
+        np.add.at(self.cat_days.reshape(-1), flat, days.astype(GridRecord.SUM_DTYPE))
 
     def ResetHitCheck(self):
 
-        self.tropical_hitCheck = False
-        self.C1_hitCheck = False
-        self.C2_hitCheck = False
-        self.C3_hitCheck = False
-        self.C4_hitCheck = False
-        self.C5_hitCheck = False
+        self.hit_check[:] = False
 
 
 def sph2xy(lon, lon_origin, lat, lat_origin):
@@ -734,15 +627,12 @@ def GetIndicesOfIntersection_Ver2(ds_grid, rad, lon, lat):
     # get projection
     gomalbers_srs = osr.SpatialReference()  # makes an empty spatial ref object
     gomalbers_srs.ImportFromWkt(ds_grid.GetProjection())
-    wgs84_srs = osr.SpatialReference()
-    wgs84_srs.ImportFromEPSG(4326)
 
     # build point geometry
     wkt = "POINT ({} {})".format(lon, lat)
     pt = ogr.CreateGeometryFromWkt(wkt)
     # project point geometry from wgs84 to gomAlbers
-    transform = osr.CoordinateTransformation(wgs84_srs, gomalbers_srs)
-    pt.Transform(transform)
+    pt.Transform(GetTransform(gomalbers_srs))
     # create point layer
     ogr_mem_driver = ogr.GetDriverByName('MEMORY')
     point_ds = ogr_mem_driver.CreateDataSource('point')
@@ -805,8 +695,49 @@ def GetIndicesOfIntersection_Ver2(ds_grid, rad, lon, lat):
     return ds_grid, indx
 
 
-def checkHurricaneEffect(arrays, ds_grid, storm_lon, storm_lat, cat, wind_speed, wave, gust, lon_min, lat_min, mcp, sid,
-                         iso_t):
+class GridCells(object):
+
+    # Cell-center coordinates and spatial reference of a north-up grid, built once
+    # so the cells inside a storm buffer can be found without an ogr layer or MEM raster per observation
+
+    def __init__(self, ds_grid):
+
+        gt = ds_grid.GetGeoTransform()
+        if gt[2] != 0 or gt[4] != 0:
+            raise ValueError('rotated grids are not supported')
+
+        self.gt = gt
+        self.shape = (ds_grid.RasterYSize, ds_grid.RasterXSize)
+        self.x = gt[0] + (np.arange(ds_grid.RasterXSize) + 0.5) * gt[1]
+        self.y = gt[3] + (np.arange(ds_grid.RasterYSize) + 0.5) * gt[5]
+        self.index = GridIndex(self.x, self.y)
+
+        self.srs = osr.SpatialReference()
+        self.srs.ImportFromWkt(ds_grid.GetProjection())
+
+    def Project(self, lon, lat):
+
+        # project a point from wgs84 to the grid projection
+        return ProjectPoint(lon, lat, self.srs)
+
+    def ProjectTrack(self, lon, lat):
+
+        # project every position of a storm in one call, nan where the position is missing
+        return ProjectPoints(lon, lat, self.srs)
+
+
+def GetIndicesOfIntersection_Ver3(grid_cells, rad, lon, lat, xy=None):
+
+    # Same cells as GetIndicesOfIntersection_Ver2 (cell centers inside the buffer polygon), found by
+    # distance over the window of the buffer bounding box instead of rasterizing the whole grid.
+    # xy is the position already projected to the grid, e.g. from GridCells.ProjectTrack
+    x, y = xy if xy is not None else grid_cells.Project(lon, lat)
+
+    return grid_cells, grid_cells.index.Cells(x, y, rad)
+
+
+def checkHurricaneEffect(arrays, grid_cells, storm_lon, storm_lat, cat, wind_speed, wave, gust, lon_min, lat_min, mcp, sid,
+                         iso_t, storm_xy=None, code=None, days=HIT_DAYS):
     # Saffir-Simpson Scale Hurricane Category
     # Category  mph		m/s		kts
     # 1		  74-95	   33-42   64-82
@@ -823,52 +754,9 @@ def checkHurricaneEffect(arrays, ds_grid, storm_lon, storm_lat, cat, wind_speed,
 
     # determine radius (m) of the storm by the wind speed
 
-    category = None
-    radius = None
-
-    # try to use given category, but if cat is None use wind speed
-    # to get the radius of the hurricane
-    if cat is not None:
-        if cat == 0:
-            radius = 100000
-            category = 'tropical'
-        if cat == 1:
-            radius = 300000
-            category = 'C1'
-        if cat == 2:
-            radius = 300000
-            category = 'C2'
-        if cat == 3:
-            radius = 450000
-            category = 'C3'
-        if cat == 4:
-            radius = 450000
-            category = 'C4'
-        if cat == 5:
-            radius = 450000
-            category = 'C5'
-    else:
-        # if there is no category given, use the wind speed to approximate radius
-        if wind_speed is not None:
-            wind_speed = float(wind_speed)
-            if (wind_speed >= 34) and (wind_speed < 64):
-                radius = 100000
-                category = 'tropical'
-            if (wind_speed >= 64) and (wind_speed < 83):
-                radius = 300000
-                category = 'C1'
-            if (wind_speed >= 83) and (wind_speed < 96):
-                radius = 300000
-                category = 'C2'
-            if (wind_speed >= 96) and (wind_speed < 113):
-                radius = 450000
-                category = 'C3'
-            if (wind_speed >= 113) and (wind_speed < 137):
-                radius = 450000
-                category = 'C4'
-            if wind_speed >= 137:
-                radius = 450000
-                category = 'C5'
+    # category code from the given category, or from the wind speed when cat is None (see storm_category)
+    category = categoryCode(cat, wind_speed) if code is None else code
+    radius = CATEGORY_RADII[category] if category != NO_CATEGORY else None
 
     if radius is not None:
         # convert lat and long coordinates (degrees) into x and y (meters)
@@ -877,30 +765,30 @@ def checkHurricaneEffect(arrays, ds_grid, storm_lon, storm_lat, cat, wind_speed,
         # distance = np.sqrt((((platform.x - storm_x) ** 2) + ((platform.y - storm_y) ** 2)))
 
         # get get the grid indices that are within the radius
-        ds_grid, indx = GetIndicesOfIntersection_Ver2(ds_grid, radius, storm_lon, storm_lat)
+        grid_cells, indx = GetIndicesOfIntersection_Ver3(grid_cells, radius, storm_lon, storm_lat, storm_xy)
 
         if indx:
 
             # update platform record with stat
-            arrays.addValue(category, indx, wave, wind_speed, gust, mcp)
+            arrays.addValue(category, indx, wave, wind_speed, gust, mcp, days)
 
-            return arrays, ds_grid, indx, category
+            return arrays, grid_cells, indx, category
 
         else:
 
-            return arrays, ds_grid, None, None
+            return arrays, grid_cells, None, None
 
     else:
-        return arrays, ds_grid, None, None
+        return arrays, grid_cells, None, None
 
 
-def processStats(arrays, ds_grid, numStorms, lat, lon, time, categ, msw, wave, gust, lon_min, lat_min, mcp, region, sid,
-                 iso_time):
+def processStats(arrays, grid_cells, numStorms, lat, lon, time, categ, msw, wave, gust, lon_min, lat_min, mcp, region, sid,
+                 iso_time, hit_days=None):
     # loop through each storm
     error_count = 0
     # set year to none for later
     year = None
-    YearStats = YearlyRecord(ds_grid.ReadAsArray().shape)
+    YearStats = YearlyRecord(grid_cells.shape)
 
     for i in range(0, numStorms):
 
@@ -920,16 +808,30 @@ def processStats(arrays, ds_grid, numStorms, lat, lon, time, categ, msw, wave, g
             wave_storm = wave[i:i + 1].tolist()[0]
             gust_storm = gust[i:i + 1].tolist()[0]
             mcp_storm = mcp[i:i + 1].tolist()[0]
-            region_storm = region[i:i + 1].tolist()[0]
-            sid_storm = sid[i:i + 1].tolist()[0]
-            iso_time_storm = iso_time[i:i + 1].tolist()[0]
+            # char variables decoded for the whole track, '' where there is no observation
+            region_storm = decodeChars(region[i])
+            sid_storm = decodeChars(sid[i])
+            iso_time_storm = decodeChars(iso_time[i])
         except:
             error_count += 1
             print("Read failed, storm # " + format(i))
             continue
 
-        sid_list = sid_storm
-        sid_num = b''.join(sid_list).decode('utf-8')
+        sid_num = sid_storm.item()
+
+        # project the whole track of the storm to the grid and categorize it in one call each
+        x_storm, y_storm = grid_cells.ProjectTrack(lon_storm, lat_storm)
+        code_storm = categoryCodes(cat_storm, msw_storm)
+
+        # datetime of every observation of the track, None where the time is missing
+        track_time = iso_time_storm.astype('datetime64[s]')
+        time_obs_storm = track_time.tolist()
+
+        # days each observation of the track stands for, or hit_days for every one
+        if hit_days is None:
+            days_storm = observationDays(np.zeros(len(track_time)), track_time)
+        else:
+            days_storm = np.full(len(time_storm), hit_days)
 
         # iso_t = b"".join(iso_time_storm[0]).decode("utf-8")
         # if iso_t != None:
@@ -943,20 +845,15 @@ def processStats(arrays, ds_grid, numStorms, lat, lon, time, categ, msw, wave, g
         # for lat_s, lon_s, time_s, msw_s in zip(lat_storm,lon_storm,time_storm,msw_storm):
         for t in range(0, len(time_storm)):
 
-            if region_storm[t][0] is not None:
+            if region_storm[t] != '':
 
-                r_list = region_storm[t]
-                r_reg = b''.join(r_list)
+                r_reg = region_storm[t]
 
-                # if (r_reg == b'GM') or (r_reg == b'NA'):
+                # if (r_reg == 'GM') or (r_reg == 'NA'):
 
-                # turn time_v into datetime object
-                try:
-                    iso_t = b"".join(iso_time_storm[t]).decode("utf-8")
-                    timeObs = readStormDateTime_ISO(iso_t)
-                # timeObs_next = readStormDateTime(time_storm[t+1])
-                except TypeError:
-                    # print(TypeError)
+                iso_t = iso_time_storm[t]
+                timeObs = time_obs_storm[t]
+                if timeObs is None:
                     # occurs when the time variable is missing
                     continue
                 # keep track of the year for processing stats per year
@@ -969,23 +866,81 @@ def processStats(arrays, ds_grid, numStorms, lat, lon, time, categ, msw, wave, g
                     # update platform yearly stats with YearRecord
                     arrays.UpdateYearlyStats(YearStats)
                     # reset YearRecord
-                    YearStats = YearlyRecord(ds_grid.ReadAsArray().shape)
+                    YearStats = YearlyRecord(grid_cells.shape)
                     # reset year
                     year = timeObs.year
 
                 # check whether or not the platform is affected by the storm and by what category
-                arrays, ds_grid, indx, category = checkHurricaneEffect(arrays, ds_grid, lon_storm[t], lat_storm[t], cat_storm[t],
+                arrays, grid_cells, indx, category = checkHurricaneEffect(arrays, grid_cells, lon_storm[t], lat_storm[t], cat_storm[t],
                                                             msw_storm[t], wave_storm[t], gust_storm[t], lon_min,
-                                                            lat_min, mcp_storm[t], sid_num, iso_t)
+                                                            lat_min, mcp_storm[t], sid_num, iso_t,
+                                                            (x_storm[t], y_storm[t]), code_storm[t], days_storm[t])
                 # if the platform was "hit" by the hurricane, update the yearly stats
-                if category:
-                    YearStats.AddHit(category, indx)
+                if category is not None:
+                    YearStats.AddHit(category, indx, days_storm[t])
 
     print(format(error_count) + ' number of storms failed to read')
 
     return arrays
 
 
+def processTable(arrays, grid_cells, obs, hit_days=None, chunk_size=TABLE_CHUNK_SIZE):
+
+    # processStats on a StormObservations table sorted by storm and time, e.g. interpolated tracks. The cells
+    # of chunk_size observations come from one GridIndex query and are added as one batch, which gives the
+    # grids of the storm loop: the first observation of a category in a storm (and in a storm within a year)
+    # counts on the cells it hits, and the year is rolled when an observation of a new year comes in
+    obs = obs.Take(obs['subbasin'] != '')
+    if len(obs) == 0:
+        return arrays
+
+    storm = obs['storm'].astype(np.int64)
+    years = obs.Years()
+    codes = categoryCodes(obs['sshs'], obs['wind']).astype(np.intp)
+    days = obs['days'] if hit_days is None else np.full(len(obs), hit_days)
+    values = [np.ma.asarray(obs[name]) for name in ('seahgt', 'wind', 'gust', 'pres')]
+
+    # first observation of each category in its storm, and in its storm within a run of one year
+    k = len(CATEGORIES)
+    year_run = np.concatenate(([0], np.cumsum(years[1:] != years[:-1])))
+    has_cat = np.flatnonzero(codes != NO_CATEGORY)
+    first = np.zeros(len(obs), dtype=bool)
+    first[has_cat[np.unique(storm[has_cat] * k + codes[has_cat], return_index=True)[1]]] = True
+    year_first = np.zeros(len(obs), dtype=bool)
+    year_key = (year_run[has_cat] * (storm.max() + 1) + storm[has_cat]) * k + codes[has_cat]
+    year_first[has_cat[np.unique(year_key, return_index=True)[1]]] = True
+
+    # position and buffer radius of every categorized observation
+    x, y = grid_cells.ProjectTrack(obs['lon'][has_cat], obs['lat'][has_cat])
+    radius = np.asarray(CATEGORY_RADII, dtype=np.float64)[codes[has_cat]]
+
+    bounds = np.concatenate(([0], np.flatnonzero(years[1:] != years[:-1]) + 1, [len(obs)]))
+    YearStats = None
+    for n in range(len(bounds) - 1):
+
+        print('Processing year {} ({} observations)'.format(years[bounds[n]], bounds[n + 1] - bounds[n]))
+
+        # update the grids with the yearly stats of the year before and start a new YearlyRecord
+        if YearStats is not None:
+            arrays.UpdateYearlyStats(YearStats)
+        YearStats = YearlyRecord(grid_cells.shape)
+
+        # cells inside the buffer of chunk_size categorized observations at a time, added in observation order
+        lo, hi = np.searchsorted(has_cat, bounds[n:n + 2])
+        for start in range(lo, hi, chunk_size):
+            stop = min(start + chunk_size, hi)
+            hit_obs, cells = grid_cells.index.QueryRadius(x[start:stop], y[start:stop], radius[start:stop])
+            o = has_cat[start + hit_obs]
+            arrays.addValues(cells, codes[o], *[v[o] for v in values], days=days[o], first=first[o])
+            YearStats.AddHits(cells, codes[o], days[o], year_first[o])
+
+    # categories seen in the last storm, as the storm loop leaves them
+    arrays.ResetHitCheck()
+    arrays.hit_check[codes[first & (storm == storm[-1])]] = True
+
+    return arrays
+
+
 def GetNC_Min(ncDir, var_name):
     ncFiles = iglob(ncDir)
     min = None
@@ -1000,44 +955,126 @@ def GetNC_Min(ncDir, var_name):
     return min
 
 
-def runStatsForStorms(arrays, ds_grid, ncDir):
-    # get minimum values for all latitude and longitudes in the net CDFs
-    lat_min = GetNC_Min(ncDir, 'usa_lat')
-    lon_min = GetNC_Min(ncDir, 'usa_lon')
+def runStatsForStorms(arrays, ds_grid, ncDir, workers=1, hit_days=None, interval=None):
 
-    ncFiles = iglob(ncDir)
+    # every storm NetCDF matching ncDir, read in parallel and stacked into one dataset in file order
+    start = time.time()
+    ds = StormDataset(sorted(iglob(ncDir)), STORM_VARIABLES, workers)
+    print('Read {} storms from {} files in {:.1f}s'.format(len(ds.dimensions['storm']), len(ds.paths),
+                                                           time.time() - start))
 
-    for nc in ncFiles:
-        print('Processing: ' + format(nc))
+    # minimum values for all latitude and longitudes in the net CDFs, taken while reading
+    lat_min = ds.Min('usa_lat')
+    lon_min = ds.Min('usa_lon')
 
-        start = time.time()
+    # cell centers and projection of the grid, shared by every observation
+    grid_cells = GridCells(ds_grid)
 
-        # open netCDF
-        ds = netCDF4.Dataset(nc, 'r')
+    start = time.time()
 
-        # grab variables for current index
-        c_lat = ds.variables['usa_lat']
-        c_lon = ds.variables['usa_lon']
-        c_time = ds.variables['time']
-        c_time_iso = ds.variables['iso_time']
-        c_cat = ds.variables['usa_sshs']
-        c_msw = ds.variables['usa_wind']
-        c_wave = ds.variables['usa_seahgt']
-        c_gust = ds.variables['usa_gust']
-        c_mcp = ds.variables['usa_pres']
-        c_region = ds.variables['subbasin']
-        c_sid = ds.variables['sid']
+    # storm tracks interpolated to points at most interval seconds apart, run as one table
+    if interval is not None:
+        obs = interpolateTracks(tableFromArrays(ds.variables), interval)
+        print('Interpolated {} observations to {} points'.format(int(ds.variables['usa_lat'].count()), len(obs)))
+        processTable(arrays, grid_cells, obs, hit_days)
+        print(time.time() - start)
+        return arrays
 
-        # note number of storms in netCDF
-        dsLen = len(ds.dimensions['storm'])
+    # grab variables of all storms
+    variables = ds.variables
+    c_lat = variables['usa_lat']
+    c_lon = variables['usa_lon']
+    c_time = variables['time']
+    c_time_iso = variables['iso_time']
+    c_cat = variables['usa_sshs']
+    c_msw = variables['usa_wind']
+    c_wave = variables['usa_seahgt']
+    c_gust = variables['usa_gust']
+    c_mcp = variables['usa_pres']
+    c_region = variables['subbasin']
+    c_sid = variables['sid']
+
+    # note number of storms in all netCDFs
+    dsLen = len(ds.dimensions['storm'])
+
+    processStats(arrays, grid_cells, dsLen, c_lat, c_lon, c_time, c_cat, c_msw, c_wave, c_gust, lon_min, lat_min,
+                 c_mcp, c_region, c_sid, c_time_iso, hit_days)
+
+    end = time.time()
+    print(end - start)
 
-        processStats(arrays, ds_grid, dsLen, c_lat, c_lon, c_time, c_cat, c_msw, c_wave, c_gust, lon_min, lat_min,
-                     c_mcp, c_region, c_sid, c_time_iso)
+    return arrays
 
-        end = time.time()
-        print(end - start)
 
-        return arrays
+def StatisticBands(arrs):
+
+    # (name, grid) of every exported hurricane statistic, in export order, the float64 sums cast to float32
+    arrs.UpdateAverages()
+
+    bands = [
+        ('TotalStorms', arrs.stormTotal),
+
+        ('Tropical', arrs.tropical),
+        ('Tropical_Min', arrs.tropical_min),
+        ('Tropical_Max', arrs.tropical_max),
+        ('Tropical_Mean', arrs.tropical_mean),
+        ('TropicalDays', arrs.tropical_days),
+        ('TropicalDays_Min', arrs.tropical_days_min),
+        ('TropicalDays_Max', arrs.tropical_days_max),
+        ('TropicalDays_Mean', arrs.tropical_days_mean),
+
+        ('C1', arrs.C1),
+        ('C1_Min', arrs.C1_min),
+        ('C1_Max', arrs.C1_max),
+        ('C1_Mean', arrs.C1_mean),
+        ('C1Days', arrs.C1_days),
+        ('C1Days_Min', arrs.C1_days_min),
+        ('C1Days_Max', arrs.C1_days_max),
+        ('C1Days_Mean', arrs.C1_days_mean),
+
+        ('C2', arrs.C2),
+        ('C2_Min', arrs.C2_min),
+        ('C2_Max', arrs.C2_max),
+        ('C2_Mean', arrs.C2_mean),
+        ('C2Days', arrs.C2_days),
+        ('C2Days_Min', arrs.C2_days_min),
+        ('C2Days_Max', arrs.C2_days_max),
+        ('C2Days_Mean', arrs.C2_days_mean),
+
+        ('C3', arrs.C3),
+        ('C3_Min', arrs.C3_min),
+        ('C3_Max', arrs.C3_max),
+        ('C3_Mean', arrs.C3_mean),
+        ('C3Days', arrs.C3_days),
+        ('C3Days_Min', arrs.C3_days_min),
+        ('C3Days_Max', arrs.C3_days_max),
+        ('C3Days_Mean', arrs.C3_days_mean),
+
+        ('C4', arrs.C4),
+        ('C4_Min', arrs.C4_min),
+        ('C4_Max', arrs.C4_max),
+        ('C4_Mean', arrs.C4_mean),
+        ('C4Days', arrs.C4_days),
+        ('C4Days_Min', arrs.C4_days_min),
+        ('C4Days_Max', arrs.C4_days_max),
+        ('C4Days_Mean', arrs.C4_days_mean),
+
+        ('C5', arrs.C5),
+        ('C5_Min', arrs.C5_min),
+        ('C5_Max', arrs.C5_max),
+        ('C5_Mean', arrs.C5_mean),
+        ('C5Days', arrs.C5_days),
+        ('C5Days_Min', arrs.C5_days_min),
+        ('C5Days_Max', arrs.C5_days_max),
+        ('C5Days_Mean', arrs.C5_days_mean),
+
+        ('WaveHeight_Sum', arrs.waveHeightSum),
+        ('WaveHeight_Average', arrs.waveHeightAverage),
+        ('WaveHeight_Max', arrs.waveHeightMax),
+        ('WaveHeight_Min', arrs.waveHeightMin),
+    ]
+
+    return [(name, grid.astype(arrs.DTYPE, copy=False)) for name, grid in bands]
 
 
 def writeResultsToGeoTIFF(arrs, outputFolder, mask_path):
@@ -1066,66 +1103,65 @@ def writeResultsToGeoTIFF(arrs, outputFolder, mask_path):
     print('y: {}'.format(y))
     print(arrs.stormTotal.shape)
 
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'TotalStorms'), arrs.stormTotal, x, y, geotransform, projection, arrs.mask)
-
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'Tropical'), arrs.tropical, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'Tropical_Min'), arrs.tropical_min, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'Tropical_Max'), arrs.tropical_max, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'Tropical_Mean'), arrs.tropical_mean, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'TropicalDays'), arrs.tropical_days, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'TropicalDays_Min'), arrs.tropical_days_min, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'TropicalDays_Max'), arrs.tropical_days_max, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'TropicalDays_Mean'), arrs.tropical_days_mean, x, y, geotransform, projection, arrs.mask)
-
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C1'), arrs.C1, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C1_Min'), arrs.C1_min, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C1_Max'), arrs.C1_max, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C1_Mean'), arrs.C1_mean, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C1Days'), arrs.C1_days, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C1Days_Min'), arrs.C1_days_min, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C1Days_Max'), arrs.C1_days_max, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C1Days_Mean'), arrs.C1_days_mean, x, y, geotransform, projection, arrs.mask)
-
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C2'), arrs.C2, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C2_Min'), arrs.C2_min, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C2_Max'), arrs.C2_max, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C2_Mean'), arrs.C2_mean, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C2Days'), arrs.C2_days, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C2Days_Min'), arrs.C2_days_min, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C2Days_Max'), arrs.C2_days_max, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C2Days_Mean'), arrs.C2_days_mean, x, y, geotransform, projection, arrs.mask)
-
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C3'), arrs.C3, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C3_Min'), arrs.C3_min, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C3_Max'), arrs.C3_max, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C3_Mean'), arrs.C3_mean, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C3Days'), arrs.C3_days, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C3Days_Min'), arrs.C3_days_min, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C3Days_Max'), arrs.C3_days_max, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C3Days_Mean'), arrs.C3_days_mean, x, y, geotransform, projection, arrs.mask)
-
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C4'), arrs.C4, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C4_Min'), arrs.C4_min, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C4_Max'), arrs.C4_max, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C4_Mean'), arrs.C4_mean, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C4Days'), arrs.C4_days, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C4Days_Min'), arrs.C4_days_min, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C4Days_Max'), arrs.C4_days_max, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C4Days_Mean'), arrs.C4_days_mean, x, y, geotransform, projection, arrs.mask)
-
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C5'), arrs.C5, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C5_Min'), arrs.C5_min, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C5_Max'), arrs.C5_max, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C5_Mean'), arrs.C5_mean, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C5Days'), arrs.C5_days, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C5Days_Min'), arrs.C5_days_min, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C5Days_Max'), arrs.C5_days_max, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'C5Days_Mean'), arrs.C5_days_mean, x, y, geotransform, projection, arrs.mask)
-
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'WaveHeight_Sum'), arrs.waveHeightSum, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'WaveHeight_Average'), arrs.waveHeightAverage, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'WaveHeight_Max'), arrs.waveHeightMax, x, y, geotransform, projection, arrs.mask)
-    exportGdalRaster_wMask(os.path.join(outputFolder, 'WaveHeight_Min'), arrs.waveHeightMin, x, y, geotransform, projection, arrs.mask)
+    for name, array in StatisticBands(arrs):
+        exportGdalRaster_wMask(os.path.join(outputFolder, name), array, x, y, geotransform, projection, arrs.mask)
+
+
+def writeResultsToCOG(arrs, outputPath, mask_path, blocksize=512):
+
+    """
+    Write every hurricane statistic as a named band of one tiled, compressed Cloud-Optimized GeoTIFF
+    with overviews. Bands are written one at a time from the GridRecord grids (masked cells are set to
+    nan in place, as in exportGdalRaster_wMask) into a tiled scratch GeoTIFF, which is then copied to
+    the COG layout.
+
+    Args:
+        arrs: GridRecord
+        outputPath: path of the output .tif
+        mask_path: mask raster, gives the geotransform and projection
+        blocksize: tile size in pixels
+
+    Returns: N/A
+    """
+
+    if not outputPath.endswith('.tif'):
+        outputPath = outputPath + '.tif'
+
+    ds_grid = gdal.Open(mask_path)
+    bands = StatisticBands(arrs)
+    land = np.where(arrs.mask != 1)
+
+    # tiled scratch file, so no band has to be held in memory by gdal
+    tmpPath = outputPath + '.tmp.tif'
+    gtiff = gdal.GetDriverByName('GTiff')
+    tile_options = ['TILED=YES', 'BLOCKXSIZE={}'.format(blocksize), 'BLOCKYSIZE={}'.format(blocksize),
+                    'COMPRESS=DEFLATE', 'PREDICTOR=3', 'BIGTIFF=IF_SAFER']
+    out = gtiff.Create(tmpPath, arrs.y, arrs.x, len(bands), gdal.GDT_Float32, options=tile_options)
+    out.SetGeoTransform(ds_grid.GetGeoTransform())
+    out.SetProjection(ds_grid.GetProjection())
+
+    for b, (name, array) in enumerate(bands):
+        array[land] = np.nan
+        bandOut = out.GetRasterBand(b + 1)
+        bandOut.SetDescription(name)
+        bandOut.SetNoDataValue(float('nan'))
+        bandOut.WriteArray(array)
+        bandOut.FlushCache()
+
+    cog = gdal.GetDriverByName('COG')
+    if cog is not None:
+        # GDAL >= 3.1
+        cog.CreateCopy(outputPath, out, options=['BLOCKSIZE={}'.format(blocksize), 'COMPRESS=DEFLATE',
+                                                 'PREDICTOR=YES', 'OVERVIEWS=AUTO', 'RESAMPLING=AVERAGE',
+                                                 'BIGTIFF=IF_SAFER'])
+    else:
+        # classic recipe: internal overviews copied ahead of the full resolution tiles
+        out.BuildOverviews('AVERAGE', [2, 4, 8, 16, 32])
+        gtiff.CreateCopy(outputPath, out, options=tile_options + ['COPY_SRC_OVERVIEWS=YES'])
+
+    out = None
+    gtiff.Delete(tmpPath)
+
 
 if __name__ == "__main__":
     nc_dir = r'P:\01_DataOriginals\GOM\Metocean\StormData\1842-2021'
@@ -1138,27 +1174,41 @@ if __name__ == "__main__":
     # storm_points_name = 'IBTRACS_NA_Points_GomAlbers'
 
     prsr = ArgumentParser(description="Generate Stats for grid")
-    prsr.add_argument('input_grid', type=str,
+    prsr.add_argument('input_grid', type=str, nargs='?', default=input_grid,
                       help='grid to compute hurricane statistics for')
-    prsr.add_argument('input_mask', type=str, help='mask signifying land and ocean')
-    prsr.add_argument('nc_dir', type=str, help='path to directory containing netcdf data')
-    prsr.add_argument('outputs', type=str, help='path to output data')
+    prsr.add_argument('input_mask', type=str, nargs='?', default=input_mask, help='mask signifying land and ocean')
+    prsr.add_argument('nc_dir', type=str, nargs='?', default=nc_dir, help='path to directory containing netcdf data')
+    prsr.add_argument('outputs', type=str, nargs='?', default=output_folder, help='path to output data')
     # prsr.add_argument('--start_date', type=readPlatDateTime, default=FIRST_DATE, help='Start of querying period')
     # prsr.add_argument('--stop_date', type=readPlatDateTime, default=LAST_DATE, help='End of querying period')
     prsr.add_argument('--stats', '-s', nargs='+', help='statistics to run')
+    prsr.add_argument('--workers', type=int, default=1, help='processes reading the storm NetCDFs, 0 for one per core')
+    prsr.add_argument('--fixed_days', action='store_const', const=HIT_DAYS, default=None,
+                      help='add 0.24 days per hit as the earlier versions did, instead of the time between observations')
+    prsr.add_argument('--interval', type=float, default=None,
+                      help='interpolate the storm tracks to points at most this many minutes apart')
+    prsr.add_argument('--export', choices=['tifs', 'cog'], default='tifs',
+                      help='tifs: one GeoTIFF per statistic, cog: one multi-band Cloud-Optimized GeoTIFF')
+
+    args = prsr.parse_args()
 
-    args = prsr.parse_args([input_grid, input_mask, nc_dir, output_folder])
+    if args.interval is not None and args.fixed_days is not None:
+        prsr.error('--fixed_days would count every interpolated point as a whole observation, use it without --interval')
 
     # if args.start_date >= args.stop_date:
     # 	raise Exception('start_date must proceed stop_date')
 
     # open platform and storm points and get IDs and coordinates as a list
     # platform_coords_list = GetPlatformCoords(platform_points)
-    storm_coords_list = GetStormCoords(storm_points)
+    # storm_coords_list = GetStormCoords(storm_points)
 
     # load the platforms csv
     ds_grid, arrays = loadArrays(args.input_grid, args.input_mask)
 
-    arrays = runStatsForStorms(arrays, ds_grid, os.path.join(args.nc_dir, '*.nc'))
+    arrays = runStatsForStorms(arrays, ds_grid, os.path.join(args.nc_dir, '*.nc'), args.workers, args.fixed_days,
+                               None if args.interval is None else args.interval * 60)
 
-    writeResultsToGeoTIFF(arrays, output_folder, input_mask)
\ No newline at end of file
+    if args.export == 'cog':
+        writeResultsToCOG(arrays, os.path.join(args.outputs, 'HurricaneStats.tif'), args.input_mask)
+    else:
+        writeResultsToGeoTIFF(arrays, args.outputs, args.input_mask)
\ No newline at end of file
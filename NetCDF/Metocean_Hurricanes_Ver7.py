@@ -44,7 +44,7 @@ import os
 import scipy
 import time
 from osgeo import ogr
-#from wind_radii_nederhoff import wind_radii_nederhoff
+from wind_radii_nederhoff import wind_radii_nederhoff
 
 D_FORMAT = '%m/%d/%Y'
 DT_FORMAT = '%m/%d/%Y %H:%M:%S'
@@ -878,162 +878,6 @@ def GetDistanceBetweenPoints(platform_coords_list, storm_coords_list, id, iso_t,
 
     return dist
 
-def wind_radii_nederhoff(vmax=None, lat=None, region=None, probability=None, *args, **kwargs):
-    import numpy as np
-
-    # varargin = wind_radii_nederhoff.varargin
-    # nargin = wind_radii_nederhoff.nargin
-
-    # Function calculates RMW and R35 including RMSE needed for probablistic
-    # forecasting of tropical cyclones
-    # v1.0  Nederhoff   Jan-17
-    # v1.1  Nederhoff   Feb-17
-    # v1.2  Nederhoff   Jun-17
-    # v1.3  Nederhoff   Aug-18
-    # v1.4  Nederhoff   Mar-19
-    # v1.5  Nederhoff   Sep-20
-
-    ## Input
-    # vmax in m/s, 10 meter height and 1-minute averaged
-    # lat in degrees
-    # region, see below
-    # probablity if 1 script will generate 1000 realisations
-
-    ## Idea: lognormal distributions for RMW and delta R35 based on curve fitting of the coefficients determing their shape
-    # A-value is used for the standard deviation.
-    # B-value is used for the median
-
-    ## Area definitions                     METHOD 1 (-360 TO 0)                    METHOD 2 (-180 TO +180)
-    # region 0: North Indian Ocean          (x<-260) & (y >w 0);
-    # region 1: South West Indian Ocean     (x<-270) & (y < 0)
-    # region 2: South East Indian Ocean	    (x>-270) & (x<-225) & (y < 0);
-    # region 3: South Pacific Ocean'        (x>-225) & (AL < 0) & (y < 0);
-    # region 4: North West Pacific Ocean    (x>-260) & (x<-180) & (y > 0);
-    # region 5: North East Pacific Ocean    (x>-180) & (AL < 0) & (y > 0);
-    # region 6: Atlantic Ocean              (x>-140) & (AL> 0) & (y>0)
-    # region 7: all data points
-
-    ## Area definitions                     METHOD 2 (-180 TO +180)
-    # region 0: North Indian Ocean          (x > 0) & (x<+100) & (y > 0);
-    # region 1: South West Indian Ocean     (x > 0) & (x<+90)  & (y < 0)
-    # region 2: South East Indian Ocean	    (x>+90) & (x+135) & (y < 0);
-    # region 3: South Pacific Ocean'        ( (x>+135) | (x < 0) ) & (y < 0);
-    # region 4: North West Pacific Ocean    (x<+100) & (x>0) & (y > 0);
-    # region 5: North East Pacific Ocean    (AL < 0) & (x<0) &  & (y > 0);
-    # region 6: Atlantic Ocean              (AL > 0)
-    # region 7: all data points
-
-    # convert wind speed from knots to m/s
-    if not isinstance(vmax, list):
-        vmax = [vmax]
-
-    vmax = np.divide(vmax, 0.93)
-
-    vmax = np.multiply(vmax, 0.514)
-
-    ## Radius of maximum winds (RMW or Rmax) in km
-    # 1. Coefficients for A
-    coefficients_a = [0.30698254, 0.338409237, 0.34279145, 0.36354649, 0.358572938, 0.310729085, 0.395431764, 0.370190027]
-    # wind_radii_nederhoff.m:43
-    # 2. Coefficients for B
-    coefficients_b = [[132.4119062, 14.56403797, - 0.002597033, 20.38080365], [229.2458441, 9.538650691, 0.003988105, 28.44573672],
-         [85.25766551, 30.69208726, 0.00243248, 5.781165406], [127.8333007, 11.84747574, 0.015936312, 25.46820005],
-         [153.7332947, 11.47888854, 0.007471193, 28.94897887], [261.5288742, 7.011517854, 0.026191256, 29.20227871],
-         [19.08992428, 24.08855731, 0.10624034, 23.18020146], [44.82417433, 23.37171288, 0.030469057, 22.42820361]]
-
-    # wind_radii_nederhoff.m:53
-    # 3. Get the best guess for a and b given wind speed and latitude
-    a_value = np.dot(np.ones((1, len(vmax))), coefficients_a[region]).reshape(-1)
-    # wind_radii_nederhoff.m:63
-    # b_1 = np.dot(coefficients_b[0][region], np.exp(- vmax / coefficients_b[1][region]))
-    # b_2 = np.multiply(b_1, (1 + np.dot(coefficients_b[2][region], abs(lat))))
-    # b_3 = coefficients_b[3][region]
-    # b_value = b_2 + b_3
-    b_value = np.add(np.multiply(np.dot(coefficients_b[region][0], np.exp(-1*np.divide(vmax, coefficients_b[region][1]))),
-                          (np.add(1, np.dot(coefficients_b[region][2], np.absolute(lat))))), coefficients_b[region][3])
-    # wind_radii_nederhoff.m:64
-
-    rmax={}
-    rmax['mode'] = [None] * len(vmax)
-    rmax['mean'] = [None] * len(vmax)
-    rmax['median'] = [None] * len(vmax)
-    rmax['lowest'] = [None] * len(vmax)
-    rmax['highest'] = [None] * len(vmax)
-    rmax['numbers'] = [None] * len(vmax)
-
-    # 4. Compute 1000 delta R35 values
-    for ii in range(a_value.shape[0]): #.reshape(-1):
-        rmax['mode'][ii] = np.exp(np.log(b_value[ii]) - a_value[ii] ** 2)
-        # wind_radii_nederhoff.m:68
-        if probability == 1:
-            numbers = np.sort(np.exp(np.add(np.multiply(np.random.randn(100000, 1), a_value[ii]), np.log(b_value[ii]))), axis=None)
-            # wind_radii_nederhoff.m:70
-            rmax['mean'][ii] = np.mean(numbers)
-            # wind_radii_nederhoff.m:71
-            rmax['mean'][ii] = np.exp(np.log(b_value[ii]) + (a_value[ii] ** 2) / 2)
-            # wind_radii_nederhoff.m:72
-            rmax['median'][ii] = np.median(numbers)
-            # wind_radii_nederhoff.m:73
-            # wind_radii_nederhoff.m:74
-            rmax['median'][ii] = b_value[ii]
-            rmax['lowest'][ii] = numbers[int(np.multiply(0.05, len(numbers)))]
-            # wind_radii_nederhoff.m:75
-            rmax['highest'][ii] = numbers[int(np.multiply(0.95, len(numbers)))]
-            # wind_radii_nederhoff.m:76
-            rmax['numbers'][ii] = np.copy(np.sort(numbers))
-            # wind_radii_nederhoff.m:77
-
-    ## Delta radius of 35 knots (R35)
-    # 1. Coefficients for A
-    # coefficients_a = np.concatenate(
-    #     [0.121563729, - 0.052184289, 0.032953813, 0.131188105, - 0.044389473, 0.002253258, 0.122286754, - 0.045355772,
-    #      0.013286154, 0.120490659, - 0.035029431, - 0.005249445, 0.156059522, - 0.041685377, 0.004952978, - 0.251333213,
-    #      - 0.009072243, - 0.00506365, 0.131903526, - 0.042096876, 0.012443195, 0.190044585, - 0.044602083, 0.006117124])
-    # # wind_radii_nederhoff.m:83
-    # # 2. Coefficients for B
-    # coefficients_b = np.concatenate(
-    #     [30.92867473, 0.530681714, - 0.012001645, 30.21210133, 0.414897465, 0.021689596, 26.58686237, 0.425916004,
-    #      0.028547278, 23.88007085, 0.43109144, 0.038119083, 33.26829485, 0.42859578, 0.017209431, 18.11013691,
-    #      0.486399912, 0.02955688, 16.9973011, 0.453713419, 0.054643743, 29.61141102, 0.4132484, 0.024418947])
-    # # wind_radii_nederhoff.m:93
-    # # 3. Get the best guess for a and b given wind speed and latitude
-    # a_value = coefficients_a[region + 1, 1] + np.multiply(np.exp(np.dot(vmax, coefficients_a[region + 1, 2])),
-    #                                                       (1 + np.dot(coefficients_a[region + 1, 3], abs(lat))))
-    # # wind_radii_nederhoff.m:103
-    # b_value = np.multiply(np.multiply(coefficients_b[region + 1, 1], (vmax - 18) ** coefficients_b[region + 1, 2]),
-    #                       (1 + np.dot(coefficients_b[region + 1, 3], abs(lat))))
-    # # wind_radii_nederhoff.m:104
-    # dr35 = {}
-    # dr35['mode'] = list(range(1, len(a_value)))
-    # dr35['mean'] = list(range(1, len(a_value)))
-    # dr35['median'] = list(range(1, len(a_value)))
-    # dr35['lowest'] = list(range(1, len(a_value)))
-    # dr35['highest'] = list(range(1, len(a_value)))
-    # dr35['numbers'] = None
-    # # 4. Compute 1000 delta R35 values
-    # for ii in range(1, len(a_value)): #.reshape(-1):
-    #     if vmax > 20:
-    #         dr35['mode'][ii] = np.exp(np.log(b_value(ii)) - a_value(ii) ** 2)
-    #         # wind_radii_nederhoff.m:109
-    #         if probability == 1:
-    #             numbers = np.sort(np.exp(np.multiply(np.randn(100000, 1), a_value(ii)) + np.log(b_value(ii))))
-    #             # wind_radii_nederhoff.m:111
-    #             dr35['mean'][ii] = np.exp(np.log(b_value(ii)) + (a_value(ii) ** 2) / 2)
-    #             # wind_radii_nederhoff.m:112
-    #             dr35['median'][ii] = b_value(ii)
-    #             # wind_radii_nederhoff.m:113
-    #             dr35['lowest'][ii] = numbers[np.dot(0.05, len(numbers))]
-    #             # wind_radii_nederhoff.m:114
-    #             dr35['highest'][ii] = numbers[np.dot(0.95, len(numbers))]
-    #             # wind_radii_nederhoff.m:115
-    #             dr35['numbers'] = np.copy(np.sort(numbers))
-    #             # wind_radii_nederhoff.m:116
-    #     else:
-    #         dr35['mode'][ii] = np.NaN
-    #         # wind_radii_nederhoff.m:119
-
-    return rmax #, dr35
-
 def checkHurricaneEffect(platform, storm_lon, storm_lat, cat, wind_speed, wave, gust, lon_min, lat_min, mcp, sid, iso_t, platform_coords_list, storm_coords_list, basin, rmw):
 
     # Saffir-Simpson Scale Hurricane Category
@@ -1084,7 +928,7 @@ def checkHurricaneEffect(platform, storm_lon, storm_lat, cat, wind_speed, wave,
         if (basin == 'NA') or (basin == 'SA'):
             region = 6
 
-        rmw_results = wind_radii_nederhoff(vmax=wind_speed, lat=storm_lat, region=region, probability=1)
+        rmw_results = wind_radii_nederhoff(vmax=wind_speed, lat=storm_lat, region=region)
         radius = rmw_results['median'][0] * 1000 # convert km to m
         print('RMW results: {} m'.format(radius))
 
@@ -3,9 +3,10 @@ Script to calculate the number of times and duration a platform is hit by a cert
 Uses storm NetCDFs and determines the category based on wind speed, which determines the size of the
 buffer that the platform must be within to be 'hit' by the storm.
 
-The mean time between each storm observation is 0.23 days (approx. 5.5 hours). This number was used to
-calculate the duration of each storm impact on a platform. Each time a platorm was within the buffer
-of a storm, 0.23 days was added to the duration for the category of the type of storm.
+The duration of each storm impact is the time the hitting observations stand for: half the time to the previous
+and half the time to the next observation of the same storm (storm_observations.observationDays). Earlier
+versions added a fixed 0.24 days per hit instead, which overstates the 3-hourly v04 data by up to 2x;
+--fixed_days brings that back for comparison with old outputs.
 
 In order to determine if the platform is within the storm buffer, the platform and storm latitude and
 longitudes needed to be converted from degrees to a standard x/y distance in meters. The latitude and
@@ -37,23 +38,41 @@ alec.dyer@netl.doe.gov
 import netCDF4
 import csv
 from datetime import datetime
-from datetime import timedelta
 from argparse import ArgumentParser
-from glob import iglob
+import math
+from concurrent.futures import ProcessPoolExecutor
 import os
-import scipy
-from osgeo import ogr, osr
+import hashlib
+import time
+import numpy as np
+from osgeo import ogr
 import sys
+from wind_radii_nederhoff import wind_radii_nederhoff
+from storm_observations import StormChunks, interpolateTracks, loadStormObservations, observationDays
+from char_arrays import decodeChars
+from spatial_index import PointIndex
+from projection import ProjectPoints
+from run_profile import RunProfile
+from storm_category import CATEGORIES, NO_CATEGORY, categoryCode, categoryCodes
 
 D_FORMAT = '%m/%d/%Y'
-DT_FORMAT = '%m/%d/%Y %H:%M:%S'
-DT_ISO_FORMAT = '%Y-%m-%d %H:%M:%S'
 
 FIRST_DATE = datetime(1942,1,1)
 LAST_DATE = datetime(2021,9,2)
 
 FLD_NAME = 'Storms'
 
+# shapefile used only to borrow the GomAlbers projection
+GOM_ALBERS_SHP = r'C:\Users\dyera\Documents\Offshore Task 3\Shapefiles\All_Platforms_08042021_GomAlbers.shp'
+
+# number of storm observations tested against all platforms at once in the vectorized engine
+OBS_CHUNK_SIZE = 256
+
+# bump when the layout of the PlatformStats checkpoint changes
+CHECKPOINT_VERSION = 3
+# storm observation columns covered by the checkpoint digest
+CHECKPOINT_COLUMNS = ['sid', 'time', 'days', 'lat', 'lon', 'sshs', 'wind', 'gust', 'pres', 'seahgt']
+
 # NC_YEAR_FORMAT = f'Year.{year}.ibtracs_wmo.v03r10.nc'
 
 class PlatformRecord(object):
@@ -74,777 +93,289 @@ class PlatformRecord(object):
         self.x = None
         self.y = None
         self.incident_dates = (datetime.strptime(x, D_FORMAT) for x in IncidentDates.split(';') if len(x) > 0)
-        self.YearlyStats = YearlyRecord()
-        self.stormTotal = 0
-        self.cat_noneCount = 0
-        self.tropical_hitCheck = False
-        self.tropical = 0
-        self.tropical_min = float('inf')
-        self.tropical_max = float('-inf')
-        self.tropical_mean = 0
-        self.tropical_days = 0
-        self.tropical_days_min = float('inf')
-        self.tropical_days_max = float('-inf')
-        self.tropical_days_mean = 0
-        self.C1_hitCheck = False
-        self.C1 = 0
-        self.C1_min = float('inf')
-        self.C1_max = float('-inf')
-        self.C1_mean = 0
-        self.C1_days = 0
-        self.C1_days_min = float('inf')
-        self.C1_days_max = float('-inf')
-        self.C1_days_mean = 0
-        self.C2_hitCheck = False
-        self.C2 = 0
-        self.C2_min = float('inf')
-        self.C2_max = float('-inf')
-        self.C2_mean = 0
-        self.C2_days = 0
-        self.C2_days_min = float('inf')
-        self.C2_days_max = float('-inf')
-        self.C2_days_mean = 0
-        self.C3_hitCheck = False
-        self.C3 = 0
-        self.C3_min = float('inf')
-        self.C3_max = float('-inf')
-        self.C3_mean = 0
-        self.C3_days = 0
-        self.C3_days_min = float('inf')
-        self.C3_days_max = float('-inf')
-        self.C3_days_mean = 0
-        self.C4_hitCheck = False
-        self.C4 = 0
-        self.C4_min = float('inf')
-        self.C4_max = float('-inf')
-        self.C4_mean = 0
-        self.C4_days = 0
-        self.C4_days_min = float('inf')
-        self.C4_days_max = float('-inf')
-        self.C4_days_mean = 0
-        self.C5_hitCheck = False
-        self.C5 = 0
-        self.C5_min = float('inf')
-        self.C5_max = float('-inf')
-        self.C5_mean = 0
-        self.C5_days = 0
-        self.C5_days_min = float('inf')
-        self.C5_days_max = float('-inf')
-        self.C5_days_mean = 0
-        self.waveHeightCount = 0
-        self.waveHeightNoneCount = 0
-        self.waveHeightSum = 0
-        self.waveHeightAverage = 0
-        self.waveHeightMax = float('-inf')
-        self.waveHeightMin = float('inf')
-
-        self.windCount = 0
-        self.windNoneCount = 0
-        self.windSum = 0
-        self.windAverage = 0
-        self.windMax = float('-inf')
-        self.windMin = float('inf')
-        ###############################################
-        self.windYearlyMin_min = float('inf')
-        self.windYearlyMax_min = float('-inf')
-        self.windYearlySum_min = 0
-        self.windYearlyAvg_min = 0
-
-        self.windYearlyMin_max = float('inf')
-        self.windYearlyMax_max = float('-inf')
-        self.windYearlySum_max = 0
-        self.windYearlyAvg_max = 0
-
-        self.windYearlyMin_sum = float('inf')
-        self.windYearlyMax_sum = float('-inf')
-        self.windYearlySum_sum = 0
-        self.windYearlyAvg_sum = 0
-
-        self.windYearlyMin_avg = float('inf')
-        self.windYearlyMax_avg = float('-inf')
-        self.windYearlySum_avg = 0
-        self.windYearlyAvg_avg = 0
-        ##############################################
-
-        self.gustCount = 0
-        self.gustNoneCount = 0
-        self.gustSum = 0
-        self.gustAverage = 0
-        self.gustMax = float('-inf')
-        self.gustMin = float('inf')
-        ###############################################
-        self.gustYearlyMin_min = float('inf')
-        self.gustYearlyMax_min = float('-inf')
-        self.gustYearlySum_min = 0
-        self.gustYearlyAvg_min = 0
-
-        self.gustYearlyMin_max = float('inf')
-        self.gustYearlyMax_max = float('-inf')
-        self.gustYearlySum_max = 0
-        self.gustYearlyAvg_max = 0
-
-        self.gustYearlyMin_sum = float('inf')
-        self.gustYearlyMax_sum = float('-inf')
-        self.gustYearlySum_sum = 0
-        self.gustYearlyAvg_sum = 0
-
-        self.gustYearlyMin_avg = float('inf')
-        self.gustYearlyMax_avg = float('-inf')
-        self.gustYearlySum_avg = 0
-        self.gustYearlyAvg_avg = 0
-        ##############################################
-
-        self.yearCount = 0
-        self.MCPCount = 0
-        self.MCPNoneCount = 0
-        self.MCPSum = 0
-        self.MCPAverage = 0
-        self.MCPMax = float('-inf')
-        self.MCPMin = float('inf')
-        ###############################################
-        self.mcpYearlyMin_min = float('inf')
-        self.mcpYearlyMax_min = float('-inf')
-        self.mcpYearlySum_min = 0
-        self.mcpYearlyAvg_min = 0
-
-        self.mcpYearlyMin_max = float('inf')
-        self.mcpYearlyMax_max = float('-inf')
-        self.mcpYearlySum_max = 0
-        self.mcpYearlyAvg_max = 0
-
-        self.mcpYearlyMin_sum = float('inf')
-        self.mcpYearlyMax_sum = float('-inf')
-        self.mcpYearlySum_sum = 0
-        self.mcpYearlyAvg_sum = 0
-
-        self.mcpYearlyMin_avg = float('inf')
-        self.mcpYearlyMax_avg = float('-inf')
-        self.mcpYearlySum_avg = 0
-        self.mcpYearlyAvg_avg = 0
-
-        ##############################################
-
-    def addValue(self, cat, wave, wind, gust, mcp):
-
-        if wave is not None:
-            self.waveHeightCount += 1
-            self.waveHeightSum += wave
-            self.waveHeightAverage = (self.waveHeightSum/self.waveHeightCount)
-            if wave > self.waveHeightMax:
-                self.waveHeightMax = wave
-            if wave < self.waveHeightMin:
-                self.waveHeightMin = wave
-        if wave is None:
-            self.waveHeightNoneCount += 1
-
-        if wind is not None:
-            self.windCount += 1
-            self.windSum += wind
-            self.windAverage = (self.windSum / self.windCount)
-            if wind > self.windMax:
-                self.windMax = wind
-            if wind < self.windMin:
-                self.windMin = wind
-        if wind is None:
-            self.windNoneCount += 1
-
-        if gust is not None:
-            self.gustCount += 1
-            self.gustSum += gust
-            self.gustAverage = (self.gustSum / self.gustCount)
-            if gust > self.gustMax:
-                self.gustMax = gust
-            if gust < self.gustMin:
-                self.gustMin = gust
-        if gust is None:
-            self.gustNoneCount += 1
-
-        if mcp is not None:
-            self.MCPCount += 1
-            self.MCPSum += mcp
-            self.MCPAverage = (self.MCPSum / self.MCPCount)
-            if mcp > self.MCPMax:
-                self.MCPMax = mcp
-            if mcp < self.MCPMin:
-                self.MCPMin = mcp
-        if mcp is None:
-            self.gustNoneCount += 1
-
-        if cat is None:
-            self.cat_noneCount += 1
-            return
-        if cat == 'tropical':
-            if self.tropical_hitCheck is False:
-                self.stormTotal += 1
-                self.tropical += 1
-                self.tropical_hitCheck = True
-            self.tropical_days += 0.24
-        if cat == 'C1':
-            if self.C1_hitCheck is False:
-                self.stormTotal += 1
-                self.C1 += 1
-                self.C1_hitCheck = True
-            self.C1_days += 0.24
-        if cat == 'C2':
-            if self.C2_hitCheck is False:
-                self.stormTotal += 1
-                self.C2 += 1
-                self.C2_hitCheck = True
-            self.C2_days += 0.24
-        if cat == 'C3':
-            if self.C3_hitCheck is False:
-                self.stormTotal += 1
-                self.C3 += 1
-                self.C3_hitCheck = True
-            self.C3_days += 0.24
-        if cat == 'C4':
-            if self.C4_hitCheck is False:
-                self.stormTotal += 1
-                self.C4 += 1
-                self.C4_hitCheck = True
-            self.C4_days += 0.24
-        if cat == 'C5':
-            if self.C5_hitCheck is False:
-                self.stormTotal += 1
-                self.C5 += 1
-                self.C5_hitCheck = True
-            self.C5_days += 0.24
-
-    def ResetHitCheck(self):
-
-        self.tropical_hitCheck = False
-        self.C1_hitCheck = False
-        self.C2_hitCheck = False
-        self.C3_hitCheck = False
-        self.C4_hitCheck = False
-        self.C5_hitCheck = False
-
-    def UpdateYearlyStats(self):
-
-        YearStats = self.YearlyStats
-
-        self.yearCount += 1
-
-        if YearStats.tropical < self.tropical_min:
-            self.tropical_min = YearStats.tropical
-        if YearStats.tropical > self.tropical_max:
-            self.tropical_max = YearStats.tropical
-        self.tropical_mean = (self.tropical / self.yearCount)
-
-        if YearStats.tropical_days < self.tropical_days_min:
-            self.tropical_days_min = YearStats.tropical_days
-        if YearStats.tropical_days > self.tropical_days_max:
-            self.tropical_days_max = YearStats.tropical_days
-        self.tropical_days_mean = (self.tropical_days / self.yearCount)
-
-        if YearStats.C1 < self.C1_min:
-            self.C1_min = YearStats.C1
-        if YearStats.C1 > self.C1_max:
-            self.C1_max = YearStats.C1
-        self.C1_mean = (self.C1 / self.yearCount)
-
-        if YearStats.C1_days < self.C1_days_min:
-            self.C1_days_min = YearStats.C1_days
-        if YearStats.C1_days > self.C1_days_max:
-            self.C1_days_max = YearStats.C1_days
-        self.C1_days_mean = (self.C1_days / self.yearCount)
-
-        if YearStats.C2 < self.C2_min:
-            self.C2_min = YearStats.C2
-        if YearStats.C2 > self.C2_max:
-            self.C2_max = YearStats.C2
-        self.C2_mean = (self.C2 / self.yearCount)
-
-        if YearStats.C2_days < self.C2_days_min:
-            self.C2_days_min = YearStats.C2_days
-        if YearStats.C2_days > self.C2_days_max:
-            self.C2_days_max = YearStats.C2_days
-        self.C2_days_mean = (self.C2_days / self.yearCount)
-
-        if YearStats.C3 < self.C3_min:
-            self.C3_min = YearStats.C3
-        if YearStats.C3 > self.C3_max:
-            self.C3_max = YearStats.C3
-        self.C3_mean = (self.C3 / self.yearCount)
-
-        if YearStats.C3_days < self.C3_days_min:
-            self.C3_days_min = YearStats.C3_days
-        if YearStats.C3_days > self.C3_days_max:
-            self.C3_days_max = YearStats.C3_days
-        self.C3_days_mean = (self.C3_days / self.yearCount)
-
-        if YearStats.C4 < self.C4_min:
-            self.C4_min = YearStats.C4
-        if YearStats.C4 > self.C4_max:
-            self.C4_max = YearStats.C4
-        self.C4_mean = (self.C4 / self.yearCount)
-
-        if YearStats.C4_days < self.C4_days_min:
-            self.C4_days_min = YearStats.C4_days
-        if YearStats.C4_days > self.C4_days_max:
-            self.C4_days_max = YearStats.C4_days
-        self.C4_days_mean = (self.C4_days / self.yearCount)
-
-        if YearStats.C5 < self.C5_min:
-            self.C5_min = YearStats.C5
-        if YearStats.C5 > self.C5_max:
-            self.C5_max = YearStats.C5
-        self.C5_mean = (self.C5 / self.yearCount)
-
-        if YearStats.C5_days < self.C5_days_min:
-            self.C5_days_min = YearStats.C5_days
-        if YearStats.C5_days > self.C5_days_max:
-            self.C5_days_max = YearStats.C5_days
-        self.C5_days_mean = (self.C5_days / self.yearCount)
-
-        ######################################################
-
-        if YearStats.MSWS_hit > 0:
-
-            # if YearStats.MSWS_min < self.windYearlyMin_min:
-            # 	self.windYearlyMin_min = YearStats.MSWS_min
-            if YearStats.MSWS_min > self.windYearlyMax_min:
-                self.windYearlyMax_min = YearStats.MSWS_min
-            self.windYearlySum_min += YearStats.MSWS_min
-            self.windYearlyAvg_min = (self.windYearlySum_min / self.yearCount)
-
-            if YearStats.MSWS_max < self.windYearlyMin_max:
-                self.windYearlyMin_max = YearStats.MSWS_max
-            # if YearStats.MSWS_max > self.windYearlyMax_max:
-            # 	self.windYearlyMax_max = YearStats.MSWS_max
-            self.windYearlySum_max += YearStats.MSWS_max
-            self.windYearlyAvg_max = (self.windYearlySum_max / self.yearCount)
-
-            if YearStats.MSWS_sum < self.windYearlyMin_sum:
-                self.windYearlyMin_sum = YearStats.MSWS_sum
-            if YearStats.MSWS_sum > self.windYearlyMax_sum:
-                self.windYearlyMax_sum = YearStats.MSWS_sum
-            self.windYearlySum_sum += YearStats.MSWS_sum
-            self.windYearlyAvg_sum = (self.windYearlySum_sum / self.yearCount)
-
-            if YearStats.MSWS_avg < self.windYearlyMin_avg:
-                self.windYearlyMin_avg = YearStats.MSWS_avg
-            if YearStats.MSWS_avg > self.windYearlyMax_avg:
-                self.windYearlyMax_avg = YearStats.MSWS_avg
-            self.windYearlySum_avg += YearStats.MSWS_avg
-            self.windYearlyAvg_avg = (self.windYearlySum_avg / self.yearCount)
-
-        ######################################################
-
-        if YearStats.MRWG_hit > 0:
-
-            # if YearStats.MSWS_min < self.windYearlyMin_min:
-            # 	self.windYearlyMin_min = YearStats.MSWS_min
-            if YearStats.MRWG_min > self.gustYearlyMax_min:
-                self.gustYearlyMax_min = YearStats.MRWG_min
-            self.gustYearlySum_min += YearStats.MRWG_min
-            self.gustYearlyAvg_min = (self.gustYearlySum_min / self.yearCount)
-
-            if YearStats.MRWG_max < self.gustYearlyMin_max:
-                self.gustYearlyMin_max = YearStats.MRWG_max
-            # if YearStats.MSWS_max > self.windYearlyMax_max:
-            # 	self.windYearlyMax_max = YearStats.MSWS_max
-            self.gustYearlySum_max += YearStats.MRWG_max
-            self.gustYearlyAvg_max = (self.gustYearlySum_max / self.yearCount)
-
-            if YearStats.MRWG_sum < self.gustYearlyMin_sum:
-                self.gustYearlyMin_sum = YearStats.MRWG_sum
-            if YearStats.MRWG_sum > self.gustYearlyMax_sum:
-                self.gustYearlyMax_sum = YearStats.MRWG_sum
-            self.gustYearlySum_sum += YearStats.MSWS_sum
-            self.gustYearlyAvg_sum = (self.gustYearlySum_sum / self.yearCount)
-
-            if YearStats.MRWG_avg < self.gustYearlyMin_avg:
-                self.gustYearlyMin_avg = YearStats.MRWG_avg
-            if YearStats.MRWG_avg > self.gustYearlyMax_avg:
-                self.gustYearlyMax_avg = YearStats.MRWG_avg
-            self.gustYearlySum_avg += YearStats.MSWS_avg
-            self.gustYearlyAvg_avg = (self.gustYearlySum_avg / self.yearCount)
-
-        ######################################################
-
-        if YearStats.MCP_hit > 0:
-
-            # if YearStats.MSWS_min < self.windYearlyMin_min:
-            # 	self.windYearlyMin_min = YearStats.MSWS_min
-            if YearStats.MCP_min > self.mcpYearlyMax_min:
-                self.mcpYearlyMax_min = YearStats.MCP_min
-            self.mcpYearlySum_min += YearStats.MCP_min
-            self.mcpYearlyAvg_min = (self.mcpYearlySum_min / self.yearCount)
-
-            if YearStats.MCP_max < self.mcpYearlyMin_max:
-                self.mcpYearlyMin_max = YearStats.MCP_max
-            # if YearStats.MSWS_max > self.windYearlyMax_max:
-            # 	self.windYearlyMax_max = YearStats.MSWS_max
-            self.mcpYearlySum_max += YearStats.MCP_max
-            self.mcpYearlyAvg_max = (self.mcpYearlySum_max / self.yearCount)
-
-            if YearStats.MCP_sum < self.mcpYearlyMin_sum:
-                self.mcpYearlyMin_sum = YearStats.MCP_sum
-            if YearStats.MCP_sum > self.mcpYearlyMax_sum:
-                self.mcpYearlyMax_sum = YearStats.MCP_sum
-            self.mcpYearlySum_sum += YearStats.MSWS_sum
-            self.mcpYearlyAvg_sum = (self.mcpYearlySum_sum / self.yearCount)
-
-            if YearStats.MCP_avg < self.mcpYearlyMin_avg:
-                self.mcpYearlyMin_avg = YearStats.MCP_avg
-            if YearStats.MCP_avg > self.mcpYearlyMax_avg:
-                self.mcpYearlyMax_avg = YearStats.MCP_avg
-            self.mcpYearlySum_avg += YearStats.MSWS_avg
-            self.mcpYearlyAvg_avg = (self.mcpYearlySum_avg / self.yearCount)
+
+class PlatformStats(object):
+
+    # Hurricane statistics for every platform, stored as arrays indexed by platform row
+    # (and by category or variable) instead of one set of attributes per PlatformRecord.
+    #
+    # Per storm:  hit_check           one hit per category per storm counts towards the storm totals
+    # Per year:   year_*              one year of hits, rolled into the yearly stats by update_yearly_stats
+    # Totals:     count/sum/min/max   running totals of the observation values
+
+    CATEGORIES = CATEGORIES
+    VARIABLES = ['wave', 'wind', 'gust', 'mcp']
+    WAVE, WIND, GUST, MCP = range(4)
+    # days per hit of the earlier versions, kept for --fixed_days
+    HIT_DAYS = 0.24
+    # days are added up as whole half seconds (ticks): an observation stands for half of the whole-second
+    # gaps to its neighbours, so the day totals are exact in any order (0.24 days is 41472 ticks)
+    DAY_TICKS = 2 * 86400
+
+    def __init__(self, platforms):
+
+        n = len(platforms)
+        k = len(self.CATEGORIES)
+        v = len(self.VARIABLES)
+
+        self.ids = np.array([p.id for p in platforms])
+        self.install = np.array([p.install_date if p.install_date is not None else 'NaT' for p in platforms],
+                                dtype='datetime64[s]')
+        self.remove = np.array([p.remove_date if p.remove_date is not None else 'NaT' for p in platforms],
+                               dtype='datetime64[s]')
+        self.install_year = self.install.astype('datetime64[Y]').astype(np.int64) + 1970
+        self.remove_year = self.remove.astype('datetime64[Y]').astype(np.int64) + 1970
+
+        # storm category counts and durations
+        self.storm_total = np.zeros(n, dtype=np.int64)
+        self.cat_none_count = np.zeros(n, dtype=np.int64)
+        self.year_count = np.zeros(n, dtype=np.int64)
+        self.hit_check = np.zeros((n, k), dtype=bool)
+        self.cat_count = np.zeros((n, k), dtype=np.int64)
+        self.cat_min = np.full((n, k), np.inf)
+        self.cat_max = np.full((n, k), -np.inf)
+        # ticks of the days the hits per category stand for
+        self.cat_ticks = np.zeros((n, k), dtype=np.int64)
+        self.cat_days_min = np.full((n, k), np.inf)
+        self.cat_days_max = np.full((n, k), -np.inf)
+
+        # wave height, wind, gust and pressure of the observations hitting the platform
+        self.count = np.zeros((v, n), dtype=np.int64)
+        self.none_count = np.zeros((v, n), dtype=np.int64)
+        self.sum = np.zeros((v, n))
+        self.sumsq = np.zeros((v, n))
+        self.min = np.full((v, n), np.inf)
+        self.max = np.full((v, n), -np.inf)
+        # values are written back as integers when the netCDF variable holds integers
+        self.integral = [True] * v
+
+        # yearly stats of wind, gust and pressure (rows for wave are unused)
+        self.years = np.zeros((v, n), dtype=np.int64)
+        self.wind_years = np.zeros((v, n), dtype=np.int64)
+        self.max_of_min = np.full((v, n), -np.inf)
+        self.sum_of_min = np.zeros((v, n))
+        self.avg_of_min = np.zeros((v, n))
+        self.min_of_max = np.full((v, n), np.inf)
+        self.sum_of_max = np.zeros((v, n))
+        self.avg_of_max = np.zeros((v, n))
+        self.min_of_sum = np.full((v, n), np.inf)
+        self.max_of_sum = np.full((v, n), -np.inf)
+        self.sum_of_sum = np.zeros((v, n))
+        self.avg_of_sum = np.zeros((v, n))
+        self.min_of_avg = np.full((v, n), np.inf)
+        self.max_of_avg = np.full((v, n), -np.inf)
+        self.sum_of_avg = np.zeros((v, n))
+        self.avg_of_avg = np.zeros((v, n))
+
+        # current year
+        self.year_hit_check = np.zeros((n, k), dtype=bool)
+        self.year_cat = np.zeros((n, k), dtype=np.int64)
+        self.year_ticks = np.zeros((n, k), dtype=np.int64)
+        self.year_hit = np.zeros((v, n), dtype=np.int64)
+        self.year_min = np.full((v, n), np.inf)
+        self.year_max = np.full((v, n), -np.inf)
+        self.year_sum = np.zeros((v, n))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def ActiveRows(self, year):
+
+        # platforms installed during or before the year and not removed before it
+        active = (self.install_year <= year) & (np.isnat(self.remove) | (self.remove_year >= year))
+        active &= ~np.isnat(self.install)
+
+        return np.flatnonzero(active)
+
+    def InService(self, timeObs):
+
+        # mask of platforms standing at the time of the observation
+        t = np.datetime64(timeObs)
+
+        return (self.install <= t) & (np.isnat(self.remove) | (t <= self.remove))
+
+    def ResetHitCheck(self, rows=None):
+
+        if rows is None:
+            self.hit_check[:] = False
+        else:
+            self.hit_check[rows] = False
+
+    def AddHits(self, rows, cat, wave, wind, gust, mcp, days=HIT_DAYS):
+
+        # one storm observation of category code cat (see storm_category) hitting the platforms in rows,
+        # standing for days of the storm (see storm_observations.observationDays). None values are missing
+        rows = np.asarray(rows, dtype=np.intp)
+        n = len(rows)
+        values = [np.ma.masked_all(n) if value is None else np.full(n, value) for value in (wave, wind, gust, mcp)]
+        cat = NO_CATEGORY if cat is None else cat
+
+        self.AddHitBatch(rows, np.zeros(n, dtype=np.int64), np.full(n, cat), values, np.full(n, days), 0, 0)
+
+    def AddHitBatch(self, rows, storm, cat, values, days, open_storm, last_storm):
+
+        # hits of a run of observations of one year as (platform row, observation) pairs in observation
+        # order, with the storm and category code of the observation of every pair, its wave, wind, gust
+        # and mcp (masked where missing) and the days it stands for. open_storm is the storm whose hits are
+        # in hit_check before the run, last_storm the storm of the last observation of the run
+        rows = np.asarray(rows, dtype=np.intp)
+
+        for v, value in enumerate(values):
+            value = np.ma.asarray(value)
+            missing = np.ma.getmaskarray(value)
+            # missing pressure has always been counted as missing gust
+            np.add.at(self.none_count[self.GUST if v == self.MCP else v], rows[missing], 1)
+
+            r = rows[~missing]
+            x = np.ma.getdata(value)[~missing].astype(np.float64)
+            if len(r) > 0 and value.dtype.kind not in 'iub':
+                self.integral[v] = False
+            np.add.at(self.count[v], r, 1)
+            np.add.at(self.sum[v], r, x)
+            np.add.at(self.sumsq[v], r, x * x)
+            np.minimum.at(self.min[v], r, x)
+            np.maximum.at(self.max[v], r, x)
+
+            # yearly stats skip zero values as well as missing ones
+            if v != self.WAVE:
+                nonzero = x != 0
+                np.add.at(self.year_hit[v], r[nonzero], 1)
+                np.add.at(self.year_sum[v], r[nonzero], x[nonzero])
+                np.minimum.at(self.year_min[v], r[nonzero], x[nonzero])
+                np.maximum.at(self.year_max[v], r[nonzero], x[nonzero])
+
+        cat = np.asarray(cat)
+        none = cat == NO_CATEGORY
+        np.add.at(self.cat_none_count, rows[none], 1)
+        rows = rows[~none]
+        storm = np.asarray(storm)[~none]
+        cat = cat[~none].astype(np.intp)
+        ticks = self.DayTicks(np.asarray(days)[~none])
+
+        # first hit of each category per platform during the storm, the open storm may have hit before
+        k = len(self.CATEGORIES)
+        key = rows * k + cat
+        new = np.zeros(len(rows), dtype=bool)
+        new[np.unique((storm - storm.min(initial=0)) * len(self) * k + key, return_index=True)[1]] = True
+        new &= (storm != open_storm) | ~self.hit_check[rows, cat]
+        np.add.at(self.storm_total, rows[new], 1)
+        np.add.at(self.cat_count, (rows[new], cat[new]), 1)
+        if last_storm != open_storm:
+            self.ResetHitCheck()
+        last = storm == last_storm
+        self.hit_check[rows[last], cat[last]] = True
+        np.add.at(self.cat_ticks, (rows, cat), ticks)
+
+        # first hit of each category per platform during the year
+        new = np.zeros(len(rows), dtype=bool)
+        new[np.unique(key, return_index=True)[1]] = True
+        new &= ~self.year_hit_check[rows, cat]
+        np.add.at(self.year_cat, (rows[new], cat[new]), 1)
+        self.year_hit_check[rows, cat] = True
+        np.add.at(self.year_ticks, (rows, cat), ticks)
+
+    def UpdateYearlyStats(self, rows=None):
+
+        # roll the current year into the yearly stats of rows and start a new year for them
+        if rows is None:
+            rows = np.arange(len(self))
+        rows = np.asarray(rows, dtype=np.intp)
+
+        self.year_count[rows] += 1
+
+        self.cat_min[rows] = np.minimum(self.cat_min[rows], self.year_cat[rows])
+        self.cat_max[rows] = np.maximum(self.cat_max[rows], self.year_cat[rows])
+        year_days = self.year_ticks[rows] / self.DAY_TICKS
+        self.cat_days_min[rows] = np.minimum(self.cat_days_min[rows], year_days)
+        self.cat_days_max[rows] = np.maximum(self.cat_days_max[rows], year_days)
+
+        # mean per hit of the year, 0 when there were no hits
+        hit = self.year_hit[:, rows]
+        year_avg = np.divide(self.year_sum[:, rows], hit, out=np.zeros(hit.shape), where=hit > 0)
+
+        for v in (self.WIND, self.GUST, self.MCP):
+            sel = hit[v] > 0
+            r = rows[sel]
+            yc = self.year_count[r]
+
+            self.max_of_min[v, r] = np.maximum(self.max_of_min[v, r], self.year_min[v, r])
+            self.sum_of_min[v, r] += self.year_min[v, r]
+            self.avg_of_min[v, r] = self.sum_of_min[v, r] / yc
+
+            self.min_of_max[v, r] = np.minimum(self.min_of_max[v, r], self.year_max[v, r])
+            self.sum_of_max[v, r] += self.year_max[v, r]
+            self.avg_of_max[v, r] = self.sum_of_max[v, r] / yc
+
+            # the sums of the yearly sums and means have always been taken from the wind
+            self.min_of_sum[v, r] = np.minimum(self.min_of_sum[v, r], self.year_sum[v, r])
+            self.max_of_sum[v, r] = np.maximum(self.max_of_sum[v, r], self.year_sum[v, r])
+            self.sum_of_sum[v, r] += self.year_sum[self.WIND, r]
+            self.avg_of_sum[v, r] = self.sum_of_sum[v, r] / yc
+
+            self.min_of_avg[v, r] = np.minimum(self.min_of_avg[v, r], year_avg[v, sel])
+            self.max_of_avg[v, r] = np.maximum(self.max_of_avg[v, r], year_avg[v, sel])
+            self.sum_of_avg[v, r] += year_avg[self.WIND, sel]
+            self.avg_of_avg[v, r] = self.sum_of_avg[v, r] / yc
+
+            self.years[v, r] += 1
+            self.wind_years[v, r] += hit[self.WIND, sel] > 0
+
+        self.ResetYear(rows)
+
+    def ResetYear(self, rows):
 
         # reset yearly stat record
-        self.YearlyStats = YearlyRecord()
-
-    def Clean(self):
-
-        if self.waveHeightCount == 0:
-            self.waveHeightSum = None
-            self.waveHeightAverage = None
-            self.waveHeightMax = None
-            self.waveHeightMin = None
-
-        if self.windCount == 0:
-            self.windSum = None
-            self.windAverage = None
-            self.windMax = None
-            self.windMin = None
-
-            self.windYearlyMin_min = None
-            self.windYearlyMax_min = None
-            self.windYearlySum_min = None
-            self.windYearlyAvg_min = None
-
-            self.windYearlyMin_max = None
-            self.windYearlyMax_max = None
-            self.windYearlySum_max = None
-            self.windYearlyAvg_max = None
-
-            self.windYearlyMin_sum = None
-            self.windYearlyMax_sum = None
-            self.windYearlySum_sum = None
-            self.windYearlyAvg_sum = None
-
-            self.windYearlyMin_avg = None
-            self.windYearlyMax_avg = None
-            self.windYearlySum_avg = None
-            self.windYearlyAvg_avg = None
-
-        ##############################################
-
-        if self.gustCount == 0:
-            self.gustSum = None
-            self.gustAverage = None
-            self.gustMax = None
-            self.gustMin = None
-
-            self.gustYearlyMin_min = None
-            self.gustYearlyMax_min = None
-            self.gustYearlySum_min = None
-            self.gustYearlyAvg_min = None
-
-            self.gustYearlyMin_max = None
-            self.gustYearlyMax_max = None
-            self.gustYearlySum_max = None
-            self.gustYearlyAvg_max = None
-
-            self.gustYearlyMin_sum = None
-            self.gustYearlyMax_sum = None
-            self.gustYearlySum_sum = None
-            self.gustYearlyAvg_sum = None
-
-            self.gustYearlyMin_avg = None
-            self.gustYearlyMax_avg = None
-            self.gustYearlySum_avg = None
-            self.gustYearlyAvg_avg = None
-
-        #############################################
-
-        if self.MCPCount == 0:
-            self.MCPSum = None
-            self.MCPAverage = None
-            self.MCPMax = None
-            self.MCPMin = None
-
-            self.mcpYearlyMin_min = None
-            self.mcpYearlyMax_min = None
-            self.mcpYearlySum_min = None
-            self.mcpYearlyAvg_min = None
-
-            self.mcpYearlyMin_max = None
-            self.mcpYearlyMax_max = None
-            self.mcpYearlySum_max = None
-            self.mcpYearlyAvg_max = None
-
-            self.mcpYearlyMin_sum = None
-            self.mcpYearlyMax_sum = None
-            self.mcpYearlySum_sum = None
-            self.mcpYearlyAvg_sum = None
-
-            self.mcpYearlyMin_avg = None
-            self.mcpYearlyMax_avg = None
-            self.mcpYearlySum_avg = None
-            self.mcpYearlyAvg_avg = None
-
-        if self.install_date is None:
-            self.stormTotal = None
-            self.cat_noneCount = None
-            self.tropical_hitCheck = False
-            self.tropical = None
-            self.tropical_min = None
-            self.tropical_max = None
-            self.tropical_mean = None
-            self.tropical_days = None
-            self.tropical_days_min = None
-            self.tropical_days_max = None
-            self.tropical_days_mean = None
-            self.C1_hitCheck = False
-            self.C1 = None
-            self.C1_min = None
-            self.C1_max = None
-            self.C1_mean = None
-            self.C1_days = None
-            self.C1_days_min = None
-            self.C1_days_max = None
-            self.C1_days_mean = None
-            self.C2_hitCheck = False
-            self.C2 = None
-            self.C2_min = None
-            self.C2_max = None
-            self.C2_mean = None
-            self.C2_days = None
-            self.C2_days_min = None
-            self.C2_days_max = None
-            self.C2_days_mean = None
-            self.C3_hitCheck = False
-            self.C3 = None
-            self.C3_min = None
-            self.C3_max = None
-            self.C3_mean = None
-            self.C3_days = None
-            self.C3_days_min = None
-            self.C3_days_max = None
-            self.C3_days_mean = None
-            self.C4_hitCheck = False
-            self.C4 = None
-            self.C4_min = None
-            self.C4_max = None
-            self.C4_mean = None
-            self.C4_days = None
-            self.C4_days_min = None
-            self.C4_days_max = None
-            self.C4_days_mean = None
-            self.C5_hitCheck = None
-            self.C5 = None
-            self.C5_min = None
-            self.C5_max = None
-            self.C5_mean = None
-            self.C5_days = None
-            self.C5_days_min = None
-            self.C5_days_max = None
-            self.C5_days_mean = None
-            self.waveHeightCount = None
-            self.waveHeightNoneCount = None
-            self.waveHeightSum = None
-            self.waveHeightAverage = None
-            self.waveHeightMax = None
-            self.waveHeightMin = None
-
-            self.windCount = None
-            self.windNoneCount = None
-            self.windSum = None
-            self.windAverage = None
-            self.windMax = None
-            self.windMin = None
-            ###############################################
-            self.windYearlyMin_min = None
-            self.windYearlyMax_min = None
-            self.windYearlySum_min = None
-            self.windYearlyAvg_min = None
-
-            self.windYearlyMin_max = None
-            self.windYearlyMax_max = None
-            self.windYearlySum_max = None
-            self.windYearlyAvg_max = None
-
-            self.windYearlyMin_sum = None
-            self.windYearlyMax_sum = None
-            self.windYearlySum_sum = None
-            self.windYearlyAvg_sum = None
-
-            self.windYearlyMin_avg = None
-            self.windYearlyMax_avg = None
-            self.windYearlySum_avg = None
-            self.windYearlyAvg_avg = None
-            ##############################################
-
-            self.gustCount = None
-            self.gustNoneCount = None
-            self.gustSum = None
-            self.gustAverage = None
-            self.gustMax = None
-            self.gustMin = None
-            ###############################################
-            self.gustYearlyMin_min = None
-            self.gustYearlyMax_min = None
-            self.gustYearlySum_min = None
-            self.gustYearlyAvg_min = None
-
-            self.gustYearlyMin_max = None
-            self.gustYearlyMax_max = None
-            self.gustYearlySum_max = None
-            self.gustYearlyAvg_max = None
-
-            self.gustYearlyMin_sum = None
-            self.gustYearlyMax_sum = None
-            self.gustYearlySum_sum = None
-            self.gustYearlyAvg_sum = None
-
-            self.gustYearlyMin_avg = None
-            self.gustYearlyMax_avg = None
-            self.gustYearlySum_avg = None
-            self.gustYearlyAvg_avg = None
-            ##############################################
-
-            self.yearCount = None
-            self.MCPCount = None
-            self.MCPNoneCount = None
-            self.MCPSum = None
-            self.MCPAverage = None
-            self.MCPMax = None
-            self.MCPMin = None
-            ###############################################
-            self.mcpYearlyMin_min = None
-            self.mcpYearlyMax_min = None
-            self.mcpYearlySum_min = None
-            self.mcpYearlyAvg_min = None
-
-            self.mcpYearlyMin_max = None
-            self.mcpYearlyMax_max = None
-            self.mcpYearlySum_max = None
-            self.mcpYearlyAvg_max = None
-
-            self.mcpYearlyMin_sum = None
-            self.mcpYearlyMax_sum = None
-            self.mcpYearlySum_sum = None
-            self.mcpYearlyAvg_sum = None
-
-            self.mcpYearlyMin_avg = None
-            self.mcpYearlyMax_avg = None
-            self.mcpYearlySum_avg = None
-            self.mcpYearlyAvg_avg = None
-
-class YearlyRecord(object):
-
-    # This class is used to keep the stats per platform on a yearly basis
-    # and will be used to update the stats for the PlatformRecord class
-
-    def __init__(self):
-        self.tropical_hitCheck = False
-        self.tropical = 0
-        self.tropical_days = 0
-        self.C1_hitCheck = False
-        self.C1 = 0
-        self.C1_days = 0
-        self.C2_hitCheck = False
-        self.C2 = 0
-        self.C2_days = 0
-        self.C3_hitCheck = False
-        self.C3 = 0
-        self.C3_days = 0
-        self.C4_hitCheck = False
-        self.C4 = 0
-        self.C4_days = 0
-        self.C5_hitCheck = False
-        self.C5 = 0
-        self.C5_days = 0
-        self.MSWS_hitCheck = False
-        self.MSWS_hit = 0
-        self.MSWS_min = float('inf')
-        self.MSWS_max = float('-inf')
-        self.MSWS_sum = 0
-        self.MSWS_avg = 0
-        self.MRWG_hitCheck = False
-        self.MRWG_hit = 0
-        self.MRWG_min = float('inf')
-        self.MRWG_max = float('-inf')
-        self.MRWG_sum = 0
-        self.MRWG_avg = 0
-        self.MCP_hitCheck = False
-        self.MCP_hit = 0
-        self.MCP_min = float('inf')
-        self.MCP_max = float('-inf')
-        self.MCP_sum = 0
-        self.MCP_avg = 0
-
-    def AddHit(self, cat, msws, mrwg, mcp):
-
-        if cat == 'tropical':
-            if self.tropical_hitCheck == False:
-                self.tropical += 1
-                self.tropical_hitCheck = True
-            self.tropical_days += 0.24
-        if cat == 'C1':
-            if self.C1_hitCheck == False:
-                self.C1 += 1
-                self.C1_hitCheck = True
-            self.C1_days += 0.24
-        if cat == 'C2':
-            if self.C2_hitCheck is False:
-                self.C2 += 1
-                self.C2_hitCheck = True
-            self.C2_days += 0.24
-        if cat == 'C3':
-            if self.C3_hitCheck is False:
-                self.C3 += 1
-                self.C3_hitCheck = True
-            self.C3_days += 0.24
-        if cat == 'C4':
-            if self.C4_hitCheck is False:
-                self.C4 += 1
-                self.C4_hitCheck = True
-            self.C4_days += 0.24
-        if cat == 'C5':
-            if self.C5_hitCheck is False:
-                self.C5 += 1
-                self.C5_hitCheck = True
-            self.C5_days += 0.24
-
-        if msws:
-            self.MSWS_hit += 1
-            if msws < self.MSWS_min:
-                self.MSWS_min = msws
-            if msws > self.MSWS_max:
-                self.MSWS_max = msws
-            self.MSWS_sum += msws
-            self.MSWS_avg = (self.MSWS_sum / self.MSWS_hit)
-
-        if mrwg:
-            self.MRWG_hit += 1
-            if mrwg < self.MRWG_min:
-                self.MRWG_min = mrwg
-            if mrwg > self.MRWG_max:
-                self.MRWG_max = mrwg
-            self.MRWG_sum += mrwg
-            self.MRWG_avg = (self.MRWG_sum / self.MRWG_hit)
-
-        if mcp:
-            self.MCP_hit += 1
-            if mcp < self.MCP_min:
-                self.MCP_min = mcp
-            if mcp > self.MCP_max:
-                self.MCP_max = mcp
-            self.MCP_sum += mcp
-            self.MCP_avg = (self.MCP_sum / self.MCP_hit)
-
-    def ResetHitCheck(self):
-
-        self.tropical_hitCheck = False
-        self.C1_hitCheck = False
-        self.C2_hitCheck = False
-        self.C3_hitCheck = False
-        self.C4_hitCheck = False
-        self.C5_hitCheck = False
+        self.year_hit_check[rows] = False
+        self.year_cat[rows] = 0
+        self.year_ticks[rows] = 0
+        self.year_hit[:, rows] = 0
+        self.year_min[:, rows] = np.inf
+        self.year_max[:, rows] = -np.inf
+        self.year_sum[:, rows] = 0
+
+    def Save(self, path, **meta):
+
+        # every array of the stats and the meta values (checkpoint key) in one .npz
+        arrays = {'_meta_' + k: np.asarray(v) for k, v in meta.items()}
+        for k, v in vars(self).items():
+            if isinstance(v, np.ndarray):
+                arrays[k] = v
+        arrays['integral'] = np.array(self.integral, dtype=bool)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def Load(cls, path):
+
+        stats = cls.__new__(cls)
+        meta = {}
+        with np.load(path) as npz:
+            for k in npz.files:
+                if k.startswith('_meta_'):
+                    meta[k[len('_meta_'):]] = npz[k].item()
+                else:
+                    setattr(stats, k, npz[k])
+        stats.integral = [bool(x) for x in stats.integral]
+
+        return stats, meta
+
+    def DayTicks(self, days):
+
+        # days as whole ticks
+        return np.rint(np.asarray(days, dtype=np.float64) * self.DAY_TICKS).astype(np.int64)
+
+    def CatDays(self):
+
+        # days per category
+        return self.cat_ticks / self.DAY_TICKS
+
+    def Std(self, v):
+
+        # population standard deviation of variable v per platform, nan without values
+        count = self.count[v]
+        mean = np.divide(self.sum[v], count, out=np.full(len(count), np.nan), where=count > 0)
+        var = np.divide(self.sumsq[v], count, out=np.full(len(count), np.nan), where=count > 0) - mean * mean
+
+        return np.sqrt(np.maximum(var, 0))
 
 def OpenShp(path):
     # open the inShapefile as the driver type
@@ -854,19 +385,6 @@ def OpenShp(path):
 
     return inDataSource, inLayer
 
-def readStormDateTime(instr):
-    start_date = datetime.strptime('11/17/1858 00:00:00', DT_FORMAT)
-    delta = timedelta(days=instr)
-    new_date = start_date + delta
-
-    return new_date
-
-def readStormDateTime_ISO(instr):
-
-    iso_date = datetime.strptime(instr, DT_ISO_FORMAT)
-
-    return iso_date
-
 def readPlatDateTime(instr):
     return datetime.strptime(instr, D_FORMAT)
 
@@ -880,195 +398,13 @@ def loadPlatformCsv(path, cls=PlatformRecord):
 
         return ret
 
-def wind_radii_nederhoff(vmax=None, lat=None, region=None, probability=None, *args, **kwargs):
-    import numpy as np
-
-    # varargin = wind_radii_nederhoff.varargin
-    # nargin = wind_radii_nederhoff.nargin
-
-    # Function calculates RMW and R35 including RMSE needed for probablistic
-    # forecasting of tropical cyclones
-    # v1.0  Nederhoff   Jan-17
-    # v1.1  Nederhoff   Feb-17
-    # v1.2  Nederhoff   Jun-17
-    # v1.3  Nederhoff   Aug-18
-    # v1.4  Nederhoff   Mar-19
-    # v1.5  Nederhoff   Sep-20
-
-    ## Input
-    # vmax in m/s, 10 meter height and 1-minute averaged
-    # lat in degrees
-    # region, see below
-    # probablity if 1 script will generate 1000 realisations
-
-    ## Idea: lognormal distributions for RMW and delta R35 based on curve fitting of the coefficients determing their shape
-    # A-value is used for the standard deviation.
-    # B-value is used for the median
-
-    ## Area definitions                     METHOD 1 (-360 TO 0)                    METHOD 2 (-180 TO +180)
-    # region 0: North Indian Ocean          (x<-260) & (y >w 0);
-    # region 1: South West Indian Ocean     (x<-270) & (y < 0)
-    # region 2: South East Indian Ocean	    (x>-270) & (x<-225) & (y < 0);
-    # region 3: South Pacific Ocean'        (x>-225) & (AL < 0) & (y < 0);
-    # region 4: North West Pacific Ocean    (x>-260) & (x<-180) & (y > 0);
-    # region 5: North East Pacific Ocean    (x>-180) & (AL < 0) & (y > 0);
-    # region 6: Atlantic Ocean              (x>-140) & (AL> 0) & (y>0)
-    # region 7: all data points
-
-    ## Area definitions                     METHOD 2 (-180 TO +180)
-    # region 0: North Indian Ocean          (x > 0) & (x<+100) & (y > 0);
-    # region 1: South West Indian Ocean     (x > 0) & (x<+90)  & (y < 0)
-    # region 2: South East Indian Ocean	    (x>+90) & (x+135) & (y < 0);
-    # region 3: South Pacific Ocean'        ( (x>+135) | (x < 0) ) & (y < 0);
-    # region 4: North West Pacific Ocean    (x<+100) & (x>0) & (y > 0);
-    # region 5: North East Pacific Ocean    (AL < 0) & (x<0) &  & (y > 0);
-    # region 6: Atlantic Ocean              (AL > 0)
-    # region 7: all data points
-
-    if not isinstance(vmax, list):
-        vmax = [vmax]
-
-    # change from 10 min average to a 1 min average (in paper. Section 2.4: Data Conversion)
-    vmax = np.divide(vmax, 0.93)
-
-    # convert wind speed from knots to m/s
-    vmax = np.multiply(vmax, 0.514)
-
-    ## Radius of maximum winds (RMW or Rmax) in km
-    # 1. Coefficients for A
-    coefficients_a = [0.30698254, 0.338409237, 0.34279145, 0.36354649, 0.358572938, 0.310729085, 0.395431764, 0.370190027]
-    # wind_radii_nederhoff.m:43
-    # 2. Coefficients for B
-    coefficients_b = [[132.4119062, 14.56403797, - 0.002597033, 20.38080365], [229.2458441, 9.538650691, 0.003988105, 28.44573672],
-                      [85.25766551, 30.69208726, 0.00243248, 5.781165406], [127.8333007, 11.84747574, 0.015936312, 25.46820005],
-                      [153.7332947, 11.47888854, 0.007471193, 28.94897887], [261.5288742, 7.011517854, 0.026191256, 29.20227871],
-                      [19.08992428, 24.08855731, 0.10624034, 23.18020146], [44.82417433, 23.37171288, 0.030469057, 22.42820361]]
-
-    # wind_radii_nederhoff.m:53
-    # 3. Get the best guess for a and b given wind speed and latitude
-    a_value = np.dot(np.ones((1, len(vmax))), coefficients_a[region]).reshape(-1)
-    # wind_radii_nederhoff.m:63
-    b_value = np.add(np.multiply(np.dot(coefficients_b[region][0], np.exp(-1*np.divide(vmax, coefficients_b[region][1]))),
-                                 (np.add(1, np.dot(coefficients_b[region][2], np.absolute(lat))))), coefficients_b[region][3])
-    # wind_radii_nederhoff.m:64
-
-    rmax={}
-    rmax['mode'] = [None] * len(vmax)
-    rmax['mean'] = [None] * len(vmax)
-    rmax['median'] = [None] * len(vmax)
-    rmax['lowest'] = [None] * len(vmax)
-    rmax['highest'] = [None] * len(vmax)
-    rmax['numbers'] = [None] * len(vmax)
-
-    # 4. Compute 1000 delta R35 values
-    for ii in range(a_value.shape[0]):
-        rmax['mode'][ii] = np.exp(np.log(b_value[ii]) - a_value[ii] ** 2)
-        # wind_radii_nederhoff.m:68
-        if probability == 1:
-            numbers = np.sort(np.exp(np.add(np.multiply(np.random.randn(100000, 1), a_value[ii]), np.log(b_value[ii]))), axis=None)
-            # wind_radii_nederhoff.m:70
-            rmax['mean'][ii] = np.mean(numbers)
-            # wind_radii_nederhoff.m:71
-            rmax['mean'][ii] = np.exp(np.log(b_value[ii]) + (a_value[ii] ** 2) / 2)
-            # wind_radii_nederhoff.m:72
-            rmax['median'][ii] = np.median(numbers)
-            # wind_radii_nederhoff.m:73
-            # wind_radii_nederhoff.m:74
-            rmax['median'][ii] = b_value[ii]
-            rmax['lowest'][ii] = numbers[int(np.multiply(0.05, len(numbers)))]
-            # wind_radii_nederhoff.m:75
-            rmax['highest'][ii] = numbers[int(np.multiply(0.95, len(numbers)))]
-            # wind_radii_nederhoff.m:76
-            rmax['numbers'][ii] = np.copy(np.sort(numbers))
-            # wind_radii_nederhoff.m:77
-
-    return rmax
-
-def CheckCategory(cat, wind):
-
-    # Saffir-Simpson Scale Hurricane Category
-    #Category  mph		m/s		kts
-    # 1		  74-95	   33-42   64-82
-    # 2		  96-110   43-49   83-95
-    # 3 	 111-130   50-58   96-113
-    # 4		 131-155   59-69   114-135
-    # 5		   156+     70+		136+
-
-    # Hurricane radius based on category
-    #	Category		Radius (km)
-    # tropical storm 	 100,000
-    # 	  1-2			 300,000
-    # 	  3-5			 450,000
-
-    # region 0: North Indian Ocean
-    # region 1: South West Indian Ocean
-    # region 2: South East Indian Ocean
-    # region 3: South Pacific Ocean
-    # region 4: North West Pacific Ocean
-    # region 5: North East Pacific Ocean
-    # region 6: Atlantic Ocean
-    # region 7: all data points
-
-    # if category is -1 or below, return None
-    if cat < 0:
-        return None
-
-    category = None
-
-    if cat is not None:
-        if cat == 0:
-            #radius = 100000
-            category = 'tropical'
-        if cat == 1:
-            #radius = 300000
-            category = 'C1'
-        if cat == 2:
-            #radius = 300000
-            category = 'C2'
-        if cat == 3:
-            #radius = 450000
-            category = 'C3'
-        if cat == 4:
-            # radius = 450000
-            category = 'C4'
-        if cat == 5:
-            # radius = 450000
-            category = 'C5'
-    else:
-        # if there is no category given, use the wind speed to approximate radius
-        if wind is not None:
-            wind_speed = float(wind)
-            if (wind_speed >= 34) and (wind_speed < 64):
-                # radius = 100000
-                category = 'tropical'
-            if (wind_speed >= 64) and (wind_speed < 83):
-                # radius = 300000
-                category = 'C1'
-            if (wind_speed >= 83) and (wind_speed < 96):
-                # radius = 300000
-                category = 'C2'
-            if (wind_speed >= 96) and (wind_speed < 113):
-                # radius = 450000
-                category = 'C3'
-            if (wind_speed >= 113) and (wind_speed < 137):
-                # radius = 450000
-                category = 'C4'
-            if wind_speed >= 137:
-                # radius = 450000
-                 category = 'C5'
-
-    return category
-
 def CreatePointsObject_Memory(platforms, outSRS):
 
     driver = ogr.GetDriverByName('MEMORY')
     ds = driver.CreateDataSource('Platforms')
-    # create srs in NAD 1927
-    inSRS = osr.SpatialReference()
-    inSRS.ImportFromEPSG(4326) # WGS 1984
 
-    # create the CoordinateTransformation
-    coordTrans = osr.CoordinateTransformation(inSRS, outSRS)
+    # project all platforms from WGS 1984 in one call
+    plat_x, plat_y = ProjectPoints([p.lon for p in platforms], [p.lat for p in platforms], outSRS)
     # create layer
     lyr = ds.CreateLayer('Platforms', outSRS, ogr.wkbPoint)
     # create fields
@@ -1086,11 +422,10 @@ def CreatePointsObject_Memory(platforms, outSRS):
     lyr_defn = lyr.GetLayerDefn()
 
     # write platform records to memory layer
-    for p in platforms:
+    for p, x, y in zip(platforms, plat_x, plat_y):
         outFeat = ogr.Feature(lyr_defn)
         point = ogr.Geometry(ogr.wkbPoint)
-        point.AddPoint(p.lon, p.lat)
-        point.Transform(coordTrans)
+        point.AddPoint(x, y)
         outFeat.SetGeometry(point)
         outFeat.SetField('id', p.id)
         outFeat.SetField('lon', p.lon)
@@ -1102,20 +437,13 @@ def CreatePointsObject_Memory(platforms, outSRS):
 
     return ds
 
-def AddToPolygonBuffer(inDS, lon, lat, radius, stormDate, cat):
+def AddToPolygonBuffer(inDS, x, y, radius, stormDate, cat):
 
+    # x, y are the storm position already projected to the layer's spatial reference
     lyr = inDS.GetLayer()
-    outSRS = lyr.GetSpatialRef()
-
-    inSRS = osr.SpatialReference()
-    inSRS.ImportFromEPSG(4326)
 
-    # create the CoordinateTransformation
-    coordTrans = osr.CoordinateTransformation(inSRS, outSRS)
-
-    wkt = "POINT ({} {})".format(lon, lat)
-    pt = ogr.CreateGeometryFromWkt(wkt)
-    pt.Transform(coordTrans)
+    pt = ogr.Geometry(ogr.wkbPoint)
+    pt.AddPoint(x, y)
     poly = pt.Buffer(radius)
 
     layerDefn = lyr.GetLayerDefn()
@@ -1151,17 +479,33 @@ def CheckPlatformIntersection(platforms_ds, storm_ds, storm_feat_num):
 
     return platforms_ds, storm_ds, id_list
 
-def runStatsForStorms(platforms, storm_netcdf, start_date, stop_date):
+def GetGomAlbersSpatialRef(shp_path=None):
 
-    # get GomAlbers projection from an old shapefile
-    shp_path = r'C:\Users\dyera\Documents\Offshore Task 3\Shapefiles\All_Platforms_08042021_GomAlbers.shp'
+    # get GomAlbers projection from an old shapefile, GOM_ALBERS_SHP unless given
+    if shp_path is None:
+        shp_path = GOM_ALBERS_SHP
     d = ogr.GetDriverByName('ESRI Shapefile')
     shp_ds = d.Open(shp_path)
     shp_lyr = shp_ds.GetLayer()
-    outSpatialRef = shp_lyr.GetSpatialRef()
+    outSpatialRef = shp_lyr.GetSpatialRef().Clone()
+
+    return outSpatialRef
+
+def runStatsForStorms(platforms, storm_netcdf, start_date, stop_date, profile=None, hit_days=None):
+
+    # Every hit adds the days its observation stands for (storm_observations.observationDays), or a
+    # fixed hit_days per hit as the earlier versions did
+
+    # stage timers, counters and the progress line of the run
+    if profile is None:
+        profile = RunProfile('ogr')
+
+    # get GomAlbers projection from an old shapefile
+    outSpatialRef = GetGomAlbersSpatialRef()
 
     # create ogr memory of platform points with the GomAlbers projection
-    platforms_ds = CreatePointsObject_Memory(platforms, outSpatialRef)
+    with profile.Stage('projection'):
+        platforms_ds = CreatePointsObject_Memory(platforms, outSpatialRef)
 
     # create ogr memory for storm radii
     driver = ogr.GetDriverByName('Memory')
@@ -1204,134 +548,471 @@ def runStatsForStorms(platforms, storm_netcdf, start_date, stop_date):
 
     # note number of storms in netCDF
     num_storms = len(ds.dimensions['storm'])
-    # keeping track of platform records
-    n = 1
+    # statistics of every platform
+    stats = PlatformStats(platforms)
     year = None
 
     # loop over each storm observation
     for i in range(0, num_storms):
 
-        for p in platforms:
-            p.ResetHitCheck()
-
-        print('Completing storm {} out of {}.'.format(i, num_storms))
+        stats.ResetHitCheck()
+        profile.Progress(i + 1, num_storms)
+        profile.Count('storms')
 
         try:
-            # grab variables for that one storm
-            lat_storm = c_lat[i:i + 1].tolist()[0]
-            lon_storm = c_lon[i:i + 1].tolist()[0]
-            time_storm = c_time[i:i + 1].tolist()[0]
-            cat_storm = c_cat[i:i + 1].tolist()[0]
-            msw_storm = c_msw[i:i + 1].tolist()[0]
-            wave_storm = c_wave[i:i + 1].tolist()[0]
-            gust_storm = c_gust[i:i + 1].tolist()[0]
-            mcp_storm = c_mcp[i:i + 1].tolist()[0]
-            # basin_storm = c_basin[i:i + 1].tolist()[0]
-            subbasin_storm = c_subbasin[i:i + 1].tolist()[0]
-            # sid_storm = c_sid[i:i + 1].tolist()[0]
-            iso_time_storm = c_time_iso[i:i + 1].tolist()[0]
-            # rmw_storm = c_rmw[i:i + 1].tolist()[0]
-            sid_storm = c_sid[i:i + 1].tolist()[0]
+            with profile.Stage('read'):
+                # grab variables for that one storm
+                lat_storm = c_lat[i:i + 1].tolist()[0]
+                lon_storm = c_lon[i:i + 1].tolist()[0]
+                time_storm = c_time[i:i + 1].tolist()[0]
+                cat_storm = c_cat[i:i + 1].tolist()[0]
+                msw_storm = c_msw[i:i + 1].tolist()[0]
+                wave_storm = c_wave[i:i + 1].tolist()[0]
+                gust_storm = c_gust[i:i + 1].tolist()[0]
+                mcp_storm = c_mcp[i:i + 1].tolist()[0]
+                # basin_storm = c_basin[i:i + 1].tolist()[0]
+                # char variables decoded for the whole track, '' where there is no observation
+                subbasin_storm = decodeChars(c_subbasin[i])
+                # sid_storm = c_sid[i:i + 1].tolist()[0]
+                iso_time_storm = decodeChars(c_time_iso[i])
+                # rmw_storm = c_rmw[i:i + 1].tolist()[0]
+                sid_storm = decodeChars(c_sid[i]).item()
         except:
             error_count += 1
+            profile.Count('read_failures')
             print("Read failed, storm # " + format(i))
             continue
 
+        # project the whole track of the storm in one call
+        with profile.Stage('projection'):
+            x_storm, y_storm = ProjectPoints(lon_storm, lat_storm, outSpatialRef)
+
+        with profile.Stage('decode'):
+            # datetime of every observation of the track, None where the time is missing
+            track_time = iso_time_storm.astype('datetime64[s]')
+            time_obs_storm = track_time.tolist()
+
+            # days each observation of the track stands for
+            if hit_days is None:
+                days_storm = observationDays(np.zeros(len(track_time)), track_time)
+            else:
+                days_storm = np.full(len(time_storm), hit_days)
+
         # for each storm loop through all observations
         # for lat_s, lon_s, time_s, msw_s in zip(lat_storm,lon_storm,time_storm,msw_storm):
         for t in range(0, len(time_storm)):
 
-            # turn iso time into datetime object
-            try:
-                iso_t = b"".join(iso_time_storm[t]).decode("utf-8")
-                # YYYY/MM/DD HH:MM:SS[.sss]
-                timeObs = readStormDateTime_ISO(iso_t)
-                if (timeObs < start_date) or (timeObs > stop_date):
-                    continue
-            except TypeError:
-                # occurs when the time variable is missing because there is no storm observation
-                continue
+            iso_t = iso_time_storm[t]
+            timeObs = time_obs_storm[t]
+
+            subbasin = None
+            if (timeObs is not None) and (start_date <= timeObs <= stop_date):
+                subbasin = subbasin_storm[t]
+                # get storm sid
+                sid = sid_storm
 
-            subbasin = b''.join(subbasin_storm[t]).decode('utf-8')
+            if timeObs is None:
+                continue
+            profile.Count('observations')
 
             # check if subbasin is GM (Gulf of Mexico)
             if subbasin == 'GM':
 
-                # get storm sid
-                sid = b"".join(sid_storm).decode("utf-8")
+                profile.Count('gm_observations')
 
                 # keep track of the year for processing stats per year
                 if year is None:
                     year = timeObs.year
 
-                # if the year has changed, update the PlatformRecord with
-                # the yearly stats and start new YearlyRecord
+                # if the year has changed, roll the yearly stats of the
+                # platforms standing that year into their totals
                 if timeObs.year != year:
-                    # update platform yearly stats with YearRecord
-                    for p in platforms:
-                        if p.install_date is None:
-                            continue
-                        if (p.remove_date is None) and (p.install_date.year <= year):
-                            p.UpdateYearlyStats()
-                        elif (p.install_date.year <= year) and (p.remove_date.year >= year):
-                            p.UpdateYearlyStats()
+                    with profile.Stage('accumulate'):
+                        stats.UpdateYearlyStats(stats.ActiveRows(year))
                     # reset year
                     year = timeObs.year
 
                 # get storm category
-                cat = CheckCategory(cat_storm[t], msw_storm[t])
-                if cat == None:
+                cat = categoryCode(cat_storm[t], msw_storm[t])
+                if cat == NO_CATEGORY:
                     continue
 
                 # get hurricane radius
-                rmw = wind_radii_nederhoff(vmax=msw_storm[t], lat=lat_storm[t], region=6, probability=1)
-                radius = rmw['mode'][0] * 1000
+                with profile.Stage('radius'):
+                    rmw = wind_radii_nederhoff(vmax=msw_storm[t], lat=lat_storm[t], region=6)
+                    radius = rmw['mode'][0] * 1000
                 if (radius is None) or (radius == 0):
                     print('radius is not valid: {}, {}'.format(radius, type(radius)))
                     sys.exit(1)
                 # create gdal polygon based off of lat, lon, and radius of storm
-                storm_ds = AddToPolygonBuffer(storm_ds, lon_storm[t], lat_storm[t], radius, iso_t, cat)
+                with profile.Stage('buffer'):
+                    storm_ds = AddToPolygonBuffer(storm_ds, x_storm[t], y_storm[t], radius, iso_t, CATEGORIES[cat])
                 storm_feats += 1
+                profile.Count('buffers')
                 # get platform id's that are within the polygon
-                platforms_ds, storm_ds, plat_ids = CheckPlatformIntersection(platforms_ds, storm_ds, storm_feats)
+                with profile.Stage('intersection'):
+                    platforms_ds, storm_ds, plat_ids = CheckPlatformIntersection(platforms_ds, storm_ds, storm_feats)
 
                 if plat_ids is not None:
 
-                    print('{} Platform(s) hit!'.format(len(plat_ids)))
+                    profile.Count('hit_observations')
+                    profile.Count('platform_hits', len(plat_ids))
+
+                    # platforms hit that were standing at the time of the observation
+                    with profile.Stage('accumulate'):
+                        rows = np.flatnonzero(np.isin(stats.ids, plat_ids) & stats.InService(timeObs))
+                        stats.AddHits(rows, cat, wave_storm[t], msw_storm[t], gust_storm[t], mcp_storm[t],
+                                      days_storm[t])
 
-                    for p in platforms:
+    # update yearly stats
+    with profile.Stage('accumulate'):
+        stats.UpdateYearlyStats()
 
-                        if p.id in plat_ids:
+    storm_ds = None
+    platform_ds = None
 
-                            if p.install_date is None:
-                                continue
+    print(format(error_count) + ' number of storms failed to read')
 
-                            if (p.remove_date is None) and (timeObs >= p.install_date):
-                                p.addValue(cat, wave_storm[t], msw_storm[t], gust_storm[t], mcp_storm[t])
-                                # if the platform was "hit" by the hurricane, update the yearly stats
-                                p.YearlyStats.AddHit(cat, msw_storm[t], gust_storm[t], mcp_storm[t])
+    return stats
+
+def QueryHits(plat_index, id_codes, block, chunk_size=OBS_CHUNK_SIZE, profile=None):
+
+    # platform rows inside the buffer of every categorized observation of a block of GM observations,
+    # as (observation, row) pairs ordered by observation then row. Hits are matched on platform id, so
+    # rows sharing an id are hit together
+    if profile is None:
+        profile = RunProfile(progress=False)
+    cat_idx = np.flatnonzero(block['has_cat'])
+
+    with profile.Stage('intersection'):
+        hit_obs, hit_plat = plat_index.QueryRadius(block['x'][cat_idx], block['y'][cat_idx],
+                                                   block['radius'][cat_idx], chunk_size)
+        num_ids = int(id_codes.max()) + 1 if len(id_codes) > 0 else 0
+
+        # one pair per observation and platform id, then every row of the id
+        key = np.unique(cat_idx[hit_obs] * num_ids + id_codes[hit_plat])
+        obs, codes = np.divmod(key, max(num_ids, 1))
+        id_rows = np.argsort(id_codes, kind='stable')
+        id_count = np.bincount(id_codes, minlength=num_ids)
+        id_first = np.cumsum(id_count) - id_count
+        n = id_count[codes]
+        offset = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        obs = np.repeat(obs, n)
+        rows = id_rows[np.repeat(id_first[codes], n) + offset]
+        order = np.lexsort((rows, obs))
+
+    profile.Count('buffers', len(cat_idx))
+    profile.Count('platform_hits', len(hit_obs))
+    profile.Count('hit_observations', len(np.unique(hit_obs)))
+
+    return obs[order], rows[order]
+
+def queryBlock(plat_index, id_codes, block, chunk_size=OBS_CHUNK_SIZE):
+
+    # QueryHits of one block of observations and its profile, run in a worker process by
+    # runStatsForStorms_Vectorized
+    profile = RunProfile(progress=False)
+    hits = QueryHits(plat_index, id_codes, block, chunk_size, profile)
+
+    return hits, profile
+
+def AccumulateHits(stats, block, hits, year=None, storm=None, profile=None, progress=True):
+
+    # apply the hits (QueryHits) of a block of GM observations to stats in observation order, one batch
+    # per run of observations of the same year, so the yearly roll-over and every sum match the ogr engine
+    # whatever the number of workers. year and storm are the ones still open in stats when it continues an
+    # earlier run. Returns the year still open at the end of the block
+    if profile is None:
+        profile = RunProfile(progress=False)
+    years = block['year']
+    if len(years) == 0:
+        return year
+
+    t = time.perf_counter()
+    # platforms hit that were standing at the time of the observation
+    hit_obs, hit_rows = hits
+    hit_time = block['time'][hit_obs]
+    standing = (stats.install[hit_rows] <= hit_time) & \
+               (np.isnat(stats.remove[hit_rows]) | (hit_time <= stats.remove[hit_rows]))
+    hit_obs = hit_obs[standing]
+    hit_rows = hit_rows[standing]
+
+    bounds = np.concatenate(([0], np.flatnonzero(years[1:] != years[:-1]) + 1, [len(years)]))
+    hit_bounds = np.searchsorted(hit_obs, bounds)
+    for n in range(len(bounds) - 1):
+        start, stop = bounds[n], bounds[n + 1]
+
+        if year is not None and years[start] != year:
+            stats.UpdateYearlyStats(stats.ActiveRows(year))
+        year = years[start]
+
+        obs = hit_obs[hit_bounds[n]:hit_bounds[n + 1]]
+        stats.AddHitBatch(hit_rows[hit_bounds[n]:hit_bounds[n + 1]], block['storm'][obs], block['cat'][obs],
+                          [block[name][obs] for name in ('wave', 'wind', 'gust', 'mcp')], block['days'][obs],
+                          storm, block['storm'][stop - 1])
+        storm = block['storm'][stop - 1]
+
+        if progress:
+            profile.Progress(stop, len(years), 'observations')
+
+    profile.AddTime('accumulate', time.perf_counter() - t)
+
+    return year
+
+def DecodeObservations(obs, idx, outSpatialRef, profile, hit_days=None):
+
+    # block of the observations idx of obs for AccumulateHits: year, category code, days, and the
+    # hurricane radius (m) and projected position of every categorized observation. The days come
+    # from the observation times unless a fixed hit_days is given
+    t = time.perf_counter()
+    gm_time = obs['time'][idx]
+    gm_days = obs['days'][idx] if hit_days is None else np.full(len(idx), hit_days)
+    gm_year = gm_time.astype('datetime64[Y]').astype(np.int64) + 1970
+    gm_storm = obs['storm'][idx]
+    gm_lat = obs['lat'][idx].tolist()
+    gm_lon = obs['lon'][idx].tolist()
+    gm_wind = obs['wind'][idx]
+    gm_wave = obs['seahgt'][idx]
+    gm_gust = obs['gust'][idx]
+    gm_mcp = obs['pres'][idx]
+
+    # storm category of each GM observation, observations without one never hit
+    cats = categoryCodes(obs['sshs'][idx], obs['wind'][idx])
+    has_cat = cats != NO_CATEGORY
+    cat_idx = np.flatnonzero(has_cat)
+    profile.AddTime('decode', time.perf_counter() - t)
+
+    # hurricane radius (m) of every categorized observation in one call
+    radius = np.full(len(idx), np.nan)
+    if len(cat_idx) > 0:
+        with profile.Stage('radius'):
+            rmw = wind_radii_nederhoff(vmax=gm_wind[cat_idx].tolist(),
+                                       lat=np.array([gm_lat[k] for k in cat_idx]), region=6)
+            radius[cat_idx] = np.array(rmw['mode'], dtype=np.float64) * 1000
+        if np.any(~np.isfinite(radius[cat_idx])) or np.any(radius[cat_idx] == 0):
+            bad = radius[cat_idx][~np.isfinite(radius[cat_idx]) | (radius[cat_idx] == 0)][0]
+            print('radius is not valid: {}, {}'.format(bad, type(bad)))
+            sys.exit(1)
+
+    obs_x = np.full(len(idx), np.nan)
+    obs_y = np.full(len(idx), np.nan)
+    with profile.Stage('projection'):
+        obs_x[cat_idx], obs_y[cat_idx] = ProjectPoints([gm_lon[k] for k in cat_idx], [gm_lat[k] for k in cat_idx],
+                                                       outSpatialRef)
+
+    return {'time': gm_time, 'year': gm_year, 'storm': gm_storm, 'has_cat': has_cat, 'x': obs_x, 'y': obs_y,
+            'radius': radius, 'cat': cats, 'wave': gm_wave, 'wind': gm_wind, 'gust': gm_gust, 'mcp': gm_mcp,
+            'days': gm_days}
+
+def SliceBlock(block, start, stop):
+
+    # observations start..stop-1 of a block
+    return {k: v[start:stop] for k, v in block.items()}
+
+def platformsDigest(platforms):
+
+    # sha1 of the platform list, a checkpoint is only used for the same platforms
+    sha = hashlib.sha1()
+    for p in platforms:
+        sha.update(repr((p.id, p.lat, p.lon, p.install_str, p.remove_str)).encode())
+
+    return sha.hexdigest()
+
+def loadCheckpoint(checkpoint, platforms, start_date, obs, gm_idx, hit_days=None, interval=None):
+
+    # stats saved by an earlier run and the number of GM observations they cover, or (None, 0)
+    # when the checkpoint is missing or does not match the platforms or the observations
+    if checkpoint is None or not os.path.exists(checkpoint):
+        return None, 0
+
+    try:
+        stats, meta = PlatformStats.Load(checkpoint)
+    except (OSError, ValueError, KeyError):
+        print('Could not read checkpoint {}, running all storms'.format(checkpoint))
+        return None, 0
+
+    if meta.get('version') != CHECKPOINT_VERSION or meta.get('platforms') != platformsDigest(platforms) \
+            or meta.get('start_date') != str(np.datetime64(start_date, 's')) \
+            or meta.get('hit_days') != (hit_days or 0.0) or meta.get('interval') != (interval or 0.0):
+        print('Platforms, start date, days per hit or track interval changed since the checkpoint, '
+              'running all storms')
+        return None, 0
+
+    # the observations covered by the checkpoint must come first and be unchanged in this NetCDF
+    count = int(meta['count'])
+    last_time = str(obs['time'][gm_idx[count - 1]]) if 0 < count <= len(gm_idx) else ''
+    if count > len(gm_idx) or last_time != meta['last_time'] or \
+            obs.Digest(gm_idx[:count], CHECKPOINT_COLUMNS) != meta['digest']:
+        print('Storm observations changed since the checkpoint, running all storms')
+        return None, 0
+
+    print('Resuming after {} ({} GM observations)'.format(last_time, count))
+
+    return stats, count
+
+def saveCheckpoint(checkpoint, stats, platforms, start_date, obs, gm_idx, hit_days=None, interval=None):
+
+    # stats before the final roll-up, keyed by the last processed ISO time. hit_days is stored as 0
+    # for days taken from the observation times and interval as 0 for tracks that are not interpolated
+    count = len(gm_idx)
+    try:
+        tmp = checkpoint + '.tmp.npz'
+        stats.Save(tmp, version=CHECKPOINT_VERSION, platforms=platformsDigest(platforms),
+                   start_date=str(np.datetime64(start_date, 's')), hit_days=hit_days or 0.0,
+                   interval=interval or 0.0, count=count,
+                   last_time=str(obs['time'][gm_idx[-1]]) if count > 0 else '',
+                   digest=obs.Digest(gm_idx, CHECKPOINT_COLUMNS))
+        os.replace(tmp, checkpoint)
+    except OSError:
+        print('Could not write checkpoint: {}'.format(checkpoint))
+
+def AccumulateStream(stats, plat_index, id_codes, storm_netcdf, start_date, stop_date, max_memory, outSpatialRef,
+                     chunk_size=OBS_CHUNK_SIZE, profile=None, hit_days=None, interval=None):
+
+    # AccumulateHits over the GM observations of a NetCDF read in chunks of whole storms, each chunk
+    # taking at most about max_memory bytes. Chunks come in storm order, so the open storm and year
+    # carry over from one chunk to the next. Returns the year still open at the end
+    if profile is None:
+        profile = RunProfile(progress=False)
+
+    chunks = StormChunks(storm_netcdf, max_memory)
+    print('Streaming {} storms in {} chunks of {} storms'.format(chunks.num_storms, len(chunks),
+                                                               chunks.storms_per_chunk))
 
-                            # check if the time is between the platform install and removal date or no removal date
-                            elif (timeObs >= p.install_date) and (timeObs <= p.remove_date):
-                                p.addValue(cat, wave_storm[t], msw_storm[t], gust_storm[t], mcp_storm[t])
-                                # if the platform was "hit" by the hurricane, update the yearly stats
-                                p.YearlyStats.AddHit(cat, msw_storm[t], gust_storm[t], mcp_storm[t])
+    year = None
+    storm = None
+    t = time.perf_counter()
+    for start, stop, obs in chunks:
+        profile.AddTime('read', time.perf_counter() - t)
+
+        if interval is not None:
+            with profile.Stage('interpolate'):
+                obs = interpolateTracks(obs, interval)
+
+        # observations in the querying period that fall in the Gulf of Mexico subbasin
+        with profile.Stage('query'):
+            gm_idx = obs.Query(subbasins=['GM'], start=start_date, stop=stop_date)
+        profile.Count('storms', len(np.unique(obs['storm'])))
+        profile.Count('observations', len(obs))
+        profile.Count('gm_observations', len(gm_idx))
+
+        if len(gm_idx) > 0:
+            block = DecodeObservations(obs, gm_idx, outSpatialRef, profile, hit_days)
+            hits = QueryHits(plat_index, id_codes, block, chunk_size, profile)
+            year = AccumulateHits(stats, block, hits, year, storm, profile, False)
+            storm = block['storm'][-1]
+
+        profile.Progress(stop, chunks.num_storms, 'storms')
+        t = time.perf_counter()
+
+    return year
+
+def runStatsForStorms_Vectorized(platforms, storm_netcdf, start_date, stop_date, chunk_size=OBS_CHUNK_SIZE,
+                                 workers=1, checkpoint=None, profile=None, max_memory=None, hit_days=None,
+                                 interval=None):
+
+    # Same statistics as runStatsForStorms, but the platforms and the GM observations are projected
+    # once and the hits are found through a KD-tree over the platforms instead of an ogr buffer per observation.
+    # With workers > 1 the buffer queries of blocks of observations run in a process pool, and the hits
+    # are applied in observation order in this process, so the stats are the same as with one worker.
+    # With a checkpoint path, the stats of the run are saved there and the next run against a newer
+    # NetCDF only processes the observations appended after them.
+    # With max_memory (bytes) the NetCDF is streamed in chunks of whole storms instead of loaded as one
+    # table, for archives like IBTrACS.ALL. Streaming runs in one process and without a checkpoint.
+    # Every hit adds the days its observation stands for (storm_observations.observationDays), or a
+    # fixed hit_days per hit as the earlier versions did.
+    # With an interval (seconds) the storm tracks are interpolated to points at most that far apart
+    # (storm_observations.interpolateTracks) before the GM observations are picked
+
+    # stage timers, counters and the progress line of the run
+    if profile is None:
+        profile = RunProfile('vector')
+
+    outSpatialRef = GetGomAlbersSpatialRef()
+
+    # project platforms once
+    with profile.Stage('projection'):
+        plat_x, plat_y = ProjectPoints([p.lon for p in platforms], [p.lat for p in platforms], outSpatialRef)
+    with profile.Stage('index'):
+        plat_index = PointIndex(plat_x, plat_y)
+
+    stats = PlatformStats(platforms)
+
+    # hits are matched on platform id, so records sharing an id are hit together
+    plat_ids, id_codes = np.unique(stats.ids, return_inverse=True)
+    id_codes = id_codes.reshape(-1)
+
+    if max_memory is not None:
+        if checkpoint is not None:
+            print('Checkpoints are not used when streaming, running all storms')
+        AccumulateStream(stats, plat_index, id_codes, storm_netcdf, start_date, stop_date, max_memory,
+                         outSpatialRef, chunk_size, profile, hit_days, interval)
+        with profile.Stage('accumulate'):
+            stats.UpdateYearlyStats()
+        return stats
+
+    # observation table of the whole NetCDF, cached next to it after the first run
+    with profile.Stage('read'):
+        obs = loadStormObservations(storm_netcdf)
+    if interval is not None:
+        with profile.Stage('interpolate'):
+            obs = interpolateTracks(obs, interval)
+
+    # observations in the querying period that fall in the Gulf of Mexico subbasin
+    with profile.Stage('query'):
+        all_idx = obs.Query(subbasins=['GM'], start=start_date, stop=stop_date)
+    profile.Count('storms', len(np.unique(obs['storm'])))
+    profile.Count('observations', len(obs))
+
+    # skip the observations already in the checkpoint, keeping their open storm and year
+    year = None
+    storm = None
+    with profile.Stage('checkpoint'):
+        saved, first = loadCheckpoint(checkpoint, platforms, start_date, obs, all_idx, hit_days, interval)
+    if saved is not None:
+        stats = saved
+        if first > 0:
+            year = obs.Years()[all_idx[first - 1]]
+            storm = obs['storm'][all_idx[first - 1]]
+    gm_idx = all_idx[first:]
+    profile.Count('gm_observations', len(gm_idx))
+
+    gm = DecodeObservations(obs, gm_idx, outSpatialRef, profile, hit_days)
+
+    print('{} GM observations'.format(len(gm_idx)))
+
+    if workers > 1 and len(gm_idx) > 1:
+        # buffer queries of blocks of observations in a process pool, the hits applied in observation order
+        bounds = np.unique(np.linspace(0, len(gm_idx), 4 * workers + 1).astype(np.int64))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(queryBlock, plat_index, id_codes, SliceBlock(gm, start, stop), chunk_size)
+                       for start, stop in zip(bounds[:-1], bounds[1:])]
+            hit_obs = []
+            hit_rows = []
+            for n, (start, future) in enumerate(zip(bounds[:-1], futures)):
+                (obs_k, rows), block_profile = future.result()
+                hit_obs.append(obs_k + start)
+                hit_rows.append(rows)
+                profile.Merge(block_profile)
+                profile.Progress(n + 1, len(futures), 'blocks')
+        hits = np.concatenate(hit_obs), np.concatenate(hit_rows)
+    else:
+        hits = QueryHits(plat_index, id_codes, gm, chunk_size, profile)
 
-                            n += 1
+    AccumulateHits(stats, gm, hits, year, storm, profile)
 
-    for p in platforms:
-        # update yearly stats
-        p.UpdateYearlyStats()
-        # clean platform record
-        p.Clean()
+    if checkpoint is not None:
+        with profile.Stage('checkpoint'):
+            saveCheckpoint(checkpoint, stats, platforms, start_date, obs, all_idx, hit_days, interval)
 
-    storm_ds = None
-    platform_ds = None
+    # update yearly stats
+    with profile.Stage('accumulate'):
+        stats.UpdateYearlyStats()
 
-    print(format(error_count) + ' number of storms failed to read')
+    return stats
 
 
-def writeResultsToCSV(platforms, outpath):
+def writeResultsToCSV(stats, outpath):
 
     with open(outpath, 'w', newline='') as outfile:
 
@@ -1364,66 +1045,145 @@ def writeResultsToCSV(platforms, outpath):
         wtr.writerow(hdr)
 
         # sort platforms by ID
-        sPlats = sorted(platforms, key=lambda x: x.id)
-        for p in sPlats:
-            row = [p.id] + [p.stormTotal] + [p.cat_noneCount] + \
-                  [p.tropical] + [p.tropical_min] + [p.tropical_max] + [p.tropical_mean] + \
-                  [p.tropical_days] + [p.tropical_days_min] + [p.tropical_days_max] + [p.tropical_days_mean] + \
-                  [p.C1] + [p.C1_min] + [p.C1_max] + [p.C1_mean] + \
-                  [p.C1_days] + [p.C1_days_min] + [p.C1_days_max] + [p.C1_days_mean] + \
-                  [p.C2] + [p.C2_min] + [p.C2_max] + [p.C2_mean] + \
-                  [p.C2_days] + [p.C2_days_min] + [p.C2_days_max] + [p.C2_days_mean] + \
-                  [p.C3] + [p.C3_min] + [p.C3_max] + [p.C3_mean] + \
-                  [p.C3_days] + [p.C3_days_min] + [p.C3_days_max] + [p.C3_days_mean] + \
-                  [p.C4] + [p.C4_min] + [p.C4_max] + [p.C4_mean] + \
-                  [p.C4_days] + [p.C4_days_min] + [p.C4_days_max] + [p.C4_days_mean] + \
-                  [p.C5] + [p.C5_min] + [p.C5_max] + [p.C5_mean] + \
-                  [p.C5_days] + [p.C5_days_min] + [p.C5_days_max] + [p.C5_days_mean] + \
-                  [p.waveHeightCount] + [p.waveHeightNoneCount] + [p.waveHeightSum] + [p.waveHeightMin] + [p.waveHeightMax] + [p.waveHeightAverage] + \
-                  [p.windCount] + [p.windNoneCount] + [p.windSum] + [p.windMin] + [p.windMax] + [p.windAverage] + \
-                  [p.windYearlyMax_min] + [p.windYearlySum_min] + [p.windYearlyAvg_min] + \
-                  [p.windYearlyMin_max] + [p.windYearlySum_max] + [p.windYearlyAvg_max] + \
-                  [p.windYearlyMin_sum] + [p.windYearlyMax_sum] + [p.windYearlyAvg_sum] + \
-                  [p.windYearlyMin_avg] + [p.windYearlyMax_avg] + [p.windYearlySum_avg] + [p.windYearlyAvg_avg] + \
-                  [p.gustCount] + [p.gustNoneCount] + [p.gustSum] + [p.gustMin] + [p.gustMax] + [p.gustAverage] + \
-                  [p.gustYearlyMax_min] + [p.gustYearlySum_min] + [p.gustYearlyAvg_min] + \
-                  [p.gustYearlyMin_max] + [p.gustYearlySum_max] + [p.gustYearlyAvg_max] + \
-                  [p.gustYearlyMin_sum] + [p.gustYearlyMax_sum] + [p.gustYearlyAvg_sum] + \
-                  [p.gustYearlyMin_avg] + [p.gustYearlyMax_avg] + [p.gustYearlySum_avg] + [p.gustYearlyAvg_avg] + \
-                  [p.MCPCount] + [p.MCPNoneCount] + [p.MCPSum] + [p.MCPMin] + [p.MCPMax] + [p.MCPAverage] + \
-                  [p.mcpYearlyMax_min] + [p.mcpYearlySum_min] + [p.mcpYearlyAvg_min] + \
-                  [p.mcpYearlyMin_max] + [p.mcpYearlySum_max] + [p.mcpYearlyAvg_max] + \
-                  [p.mcpYearlyMin_sum] + [p.mcpYearlyMax_sum] + [p.mcpYearlyAvg_sum] + \
-                  [p.mcpYearlyMin_avg] + [p.mcpYearlyMax_avg] + [p.mcpYearlySum_avg] + [p.mcpYearlyAvg_avg]
+        order = np.argsort(stats.ids, kind='stable')
+        installed = ~np.isnat(stats.install[order])
+        year_count = stats.year_count[order]
+
+        def numbers(arr, integral=False, zero_int=None):
+            # python numbers the way the per-platform records used to hold them: integers
+            # for integer data and for sums that never received a value
+            vals = arr.tolist()
+            if integral:
+                vals = [int(x) if math.isfinite(x) else x for x in vals]
+            if zero_int is not None:
+                vals = [0 if z else x for x, z in zip(vals, zero_int.tolist())]
+            return vals
+
+        def per_year(arr):
+            return numbers(np.divide(arr, year_count, out=np.zeros(len(arr)), where=year_count > 0),
+                           zero_int=year_count == 0)
+
+        def clean(column, keep):
+            return [x if k else None for x, k in zip(column, keep.tolist())]
+
+        columns = [numbers(stats.storm_total[order]), numbers(stats.cat_none_count[order])]
+
+        cat_days = stats.CatDays()
+
+        for k in range(len(stats.CATEGORIES)):
+            count = stats.cat_count[order, k]
+            days = cat_days[order, k]
+            days_min = stats.cat_days_min[order, k]
+            days_max = stats.cat_days_max[order, k]
+            columns += [numbers(count), numbers(stats.cat_min[order, k], True), numbers(stats.cat_max[order, k], True),
+                        per_year(count.astype(np.float64)),
+                        numbers(days, zero_int=days == 0), numbers(days_min, zero_int=days_min == 0),
+                        numbers(days_max, zero_int=days_max == 0), per_year(days)]
+
+        for v in range(len(stats.VARIABLES)):
+            integral = stats.integral[v]
+            count = stats.count[v, order]
+            has_values = installed & (count > 0)
+            average = np.divide(stats.sum[v, order], count, out=np.zeros(len(count)), where=count > 0)
+            var_columns = [clean(numbers(stats.sum[v, order], integral), has_values),
+                           clean(numbers(stats.min[v, order], integral), has_values),
+                           clean(numbers(stats.max[v, order], integral), has_values),
+                           clean(numbers(average), has_values)]
+            columns += [numbers(count), numbers(stats.none_count[v, order])] + var_columns
+
+            if v == stats.WAVE:
+                continue
 
+            no_years = stats.years[v, order] == 0
+            no_wind_years = stats.wind_years[v, order] == 0
+            yearly = [numbers(stats.max_of_min[v, order], integral),
+                      numbers(stats.sum_of_min[v, order], integral, no_years),
+                      numbers(stats.avg_of_min[v, order], zero_int=no_years),
+                      numbers(stats.min_of_max[v, order], integral),
+                      numbers(stats.sum_of_max[v, order], integral, no_years),
+                      numbers(stats.avg_of_max[v, order], zero_int=no_years),
+                      numbers(stats.min_of_sum[v, order], integral),
+                      numbers(stats.max_of_sum[v, order], integral),
+                      numbers(stats.avg_of_sum[v, order], zero_int=no_years),
+                      numbers(stats.min_of_avg[v, order]),
+                      numbers(stats.max_of_avg[v, order]),
+                      numbers(stats.sum_of_avg[v, order], zero_int=no_wind_years),
+                      numbers(stats.avg_of_avg[v, order], zero_int=no_years)]
+            columns += [clean(c, has_values) for c in yearly]
+
+        # platforms without an install date have no stats at all
+        columns = [clean(c, installed) for c in columns]
+
+        for row in zip(stats.ids[order].tolist(), *columns):
             wtr.writerow(row)
 
 if __name__ == "__main__":
 
     ##### SET THESE PATHS ####
     main_dir = r'P:\05_AnalysisProjects_Working\Offshore Infrastructure and Incidents REORG\03_Analysis\Metocean\Hurricane Processing'
-    os.chdir(main_dir)
+    if os.path.isdir(main_dir):
+        os.chdir(main_dir)
     storm_netcdf = r"P:\01_DataOriginals\GOM\Metocean\StormData\1842-Dec2021\IBTrACS.NA.v04r00.nc"
     platform_csv = r"P:\05_AnalysisProjects_Working\Offshore Infrastructure and Incidents REORG\03_Analysis\Metocean\Metocean Processing\Platform Records for Processing\Platforms_ForMetocean.csv"
     output_path = r"C:\Users\dyera\Downloads\HurricaneProcessing_Ver8_RadiiMode_AllPlatforms.csv"
     ##########################
 
     prsr = ArgumentParser(description="Generate Stats per platform")
-    prsr.add_argument('platform_csv', type=str,
+    prsr.add_argument('platform_csv', type=str, nargs='?', default=platform_csv,
                       help='csv with platform data')
-    prsr.add_argument('storm_netcdf', type=str, help='path to storm netcdf file')
-    prsr.add_argument('outputs', type=str, help='path to output data')
+    prsr.add_argument('storm_netcdf', type=str, nargs='?', default=storm_netcdf, help='path to storm netcdf file')
+    prsr.add_argument('outputs', type=str, nargs='?', default=output_path, help='path to output data')
     prsr.add_argument('--start_date', type=readPlatDateTime, default=FIRST_DATE, help='Start of querying period')
     prsr.add_argument('--stop_date', type=readPlatDateTime, default=LAST_DATE, help='End of querying period')
-
-    args = prsr.parse_args([platform_csv, storm_netcdf, output_path])
+    prsr.add_argument('--engine', choices=['vector', 'ogr'], default='vector',
+                      help='vector: numpy distance engine, ogr: buffer polygon per observation')
+    prsr.add_argument('--workers', type=int, default=1,
+                      help='processes for the vector engine, 0 for one per core')
+    prsr.add_argument('--checkpoint', type=str, default=None,
+                      help='vector engine: resume from and save the stats to this .npz, none by default')
+    prsr.add_argument('--full', action='store_true', help='ignore the --checkpoint given and run all storms')
+    prsr.add_argument('--fixed_days', action='store_const', const=PlatformStats.HIT_DAYS, default=None,
+                      help='add 0.24 days per hit as the earlier versions did, instead of the time between observations')
+    prsr.add_argument('--interval', type=float, default=None,
+                      help='vector engine: interpolate the storm tracks to points at most this many minutes apart')
+    prsr.add_argument('--max_memory', type=float, default=None,
+                      help='stream the storm netcdf in chunks of about this many MB instead of loading it whole')
+    prsr.add_argument('--profile', type=str, default=None,
+                      help='write stage timings and counters of the run to this JSON file')
+    prsr.add_argument('--no_progress', action='store_true', help='do not draw the progress bar')
+
+    args = prsr.parse_args()
 
     if args.start_date >= args.stop_date:
         raise Exception('start_date must proceed stop_date')
+    if args.interval is not None and args.engine == 'ogr':
+        prsr.error('--interval needs the vector engine')
+    if args.interval is not None and args.fixed_days is not None:
+        prsr.error('--fixed_days would count every interpolated point as a whole observation, use it without --interval')
 
-    # load the platforms csv
-    platforms = loadPlatformCsv(args.platform_csv)
+    profile = RunProfile(args.engine, progress=not args.no_progress)
 
-    runStatsForStorms(platforms, storm_netcdf, args.start_date, args.stop_date)
+    # load the platforms csv
+    with profile.Stage('platforms'):
+        platforms = loadPlatformCsv(args.platform_csv)
 
-    writeResultsToCSV(platforms, output_path)
\ No newline at end of file
+    if args.engine == 'ogr':
+        stats = runStatsForStorms(platforms, args.storm_netcdf, args.start_date, args.stop_date, profile, args.fixed_days)
+    else:
+        workers = args.workers if args.workers > 0 else os.cpu_count()
+        max_memory = None if args.max_memory is None else int(args.max_memory * 2 ** 20)
+        # checkpoints are only read and written when asked for
+        checkpoint = args.checkpoint
+        if args.full and checkpoint is not None and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        stats = runStatsForStorms_Vectorized(platforms, args.storm_netcdf, args.start_date, args.stop_date,
+                                             workers=workers, checkpoint=checkpoint, profile=profile,
+                                             max_memory=max_memory, hit_days=args.fixed_days,
+                                             interval=None if args.interval is None else args.interval * 60)
+
+    with profile.Stage('write'):
+        writeResultsToCSV(stats, args.outputs)
+
+    print(profile.Report())
+    if args.profile is not None:
+        profile.WriteJSON(args.profile)
\ No newline at end of file
@@ -1,17 +1,30 @@
 """
 This script will take in a set of net CDFs and using a time variable calculate statistics on the temporal range.
+
+Every file is read with one call of its time variable and the interval between consecutive observations of
+each storm is taken with one subtraction over the whole (storm, time) array. Missing times are masked, so the
+intervals at the end of a track drop out without any per-value try/except. The files are read in a process
+pool and the report gives the min, max, mean, median and a histogram of all intervals (days):
+
+    python NetCDF_Temporal_Res_Report.py <ncDir> --time_var time_wmo --workers 0 --bins 50 --plot
+
+The time variable is either numeric days since 17 Nov 1858 (time_wmo, time) or an ISO char array (iso_time).
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
 """
 
 import netCDF4
-from glob import iglob
-from datetime import datetime
-from datetime import timedelta
+from glob import glob
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
 import os
 import matplotlib.pyplot as plt
 import numpy as np
-from statistics import mean, median
+from char_arrays import decodeTimes
 
-D_FORMAT = '%m/%d/%Y'
+# origin of the numeric IBTrACS time variables
+TIME_EPOCH = np.datetime64('1858-11-17T00:00:00', 's')
 
 class StatRecord(object):
 	
@@ -19,13 +32,93 @@ class StatRecord(object):
 		
 		self.minTimeDelta = None
 		self.maxTimeDelta = None
+		self.meanTimeDelta = None
+		self.medianTimeDelta = None
+		self.count = 0
+		self.histogram = None
+		self.bin_edges = None
 		
-def readStormDateTime(instr):
-	start_date = datetime.strptime('11/17/1858', D_FORMAT)
-	delta = timedelta(days=instr)
-	new_date = start_date + delta
+	def Update(self, deltas, n_bins):
+		
+		# statistics of all intervals (days) at once
+		self.count = len(deltas)
+		if self.count == 0:
+			return
+		self.minTimeDelta = float(deltas.min())
+		self.maxTimeDelta = float(deltas.max())
+		self.meanTimeDelta = float(deltas.mean())
+		self.medianTimeDelta = float(np.median(deltas))
+		self.histogram, self.bin_edges = np.histogram(deltas, n_bins)
+		
+def readTimeDays(ds, time_var_name):
+	
+	# whole time variable as masked days since TIME_EPOCH, (storm, time)
+	var = ds.variables[time_var_name]
+	if var.dtype.kind == 'S':
+		times = decodeTimes(var[:])
+		days = (times - TIME_EPOCH) / np.timedelta64(1, 'D')
+		days = np.ma.masked_invalid(days)
+	else:
+		days = np.ma.asarray(var[:]).astype(np.float64)
+	
+	if days.ndim == 1:
+		days = days.reshape(1, -1)
+	
+	return days
+
+def fileTimeDeltas(path, time_var_name):
+	"""
+	Intervals between consecutive observations of every storm of one NetCDF.
+	
+	Args:
+		path: NetCDF path
+		time_var_name: time variable, (storm, time)
+	
+	Returns: 1-D float array of intervals (days), pairs with a missing time left out
+	"""
+	
+	with netCDF4.Dataset(path, 'r') as ds:
+		days = readTimeDays(ds, time_var_name)
+	
+	deltas = days[:, 1:] - days[:, :-1]
+	
+	return np.ma.compressed(deltas)
+
+def collectTimeDeltas(paths, time_var_name, workers=1):
+	
+	# intervals of all files in one array, one file per task of the process pool
+	workers = workers if workers > 0 else os.cpu_count()
+	if workers > 1 and len(paths) > 1:
+		with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+			parts = list(executor.map(fileTimeDeltas, paths, [time_var_name] * len(paths)))
+	else:
+		parts = [fileTimeDeltas(p, time_var_name) for p in paths]
+	
+	return np.concatenate(parts + [np.empty(0)])
+
+def temporalReport(paths, time_var_name, workers=1, n_bins=50):
+	
+	Stats = StatRecord()
+	deltas = collectTimeDeltas(paths, time_var_name, workers)
+	Stats.Update(np.abs(deltas), n_bins)
+	
+	return Stats, deltas
 
-	return new_date
+def printReport(Stats, num_files):
+	
+	print('\nNetCDF Temporal Resolution Report:')
+	print('Files = ' + format(num_files))
+	print('Intervals = ' + format(Stats.count))
+	if Stats.count == 0:
+		return
+	print('Min range = ' + format(Stats.minTimeDelta))
+	print('Max range = ' + format(Stats.maxTimeDelta))
+	print('Average = ' + format(Stats.meanTimeDelta))
+	print('Median = ' + format(Stats.medianTimeDelta))
+	print('\nHistogram (days):')
+	for lo, hi, n in zip(Stats.bin_edges[:-1], Stats.bin_edges[1:], Stats.histogram):
+		if n > 0:
+			print('{:>10.4f} - {:<10.4f}{:>10}'.format(lo, hi, n))
 
 def PlotHist(x, n_bins):
 	
@@ -35,61 +128,18 @@ def PlotHist(x, n_bins):
 		
 if __name__ == '__main__':
 	
-	ncDir = r'P:\01_DataOriginals\GOM\Metocean\StormData\storm_test'
-	time_var_name = 'time_wmo'
-	# iterator of nc paths
-	ncFiles = iglob(os.path.join(ncDir, '*.nc'))
-	# create stat variables
-	Stats = StatRecord()
-	# keep track of all deltas for histogram later
-	delta_days_list = []
-	# loop through all nc in the directory
-	for nc in ncFiles:
-		# open nc
-		ds = netCDF4.Dataset(nc, 'r')
-		# grab time variable
-		time_var = ds.variables[time_var_name]
-		# grab length
-		dsLen = ds.dimensions['storm'].size
-		# loop through all the dimensions (in this case number of storms)
-		for i in range(0,dsLen):
-		
-			time = time_var[i:i+1].tolist()[0]
-			
-			l = len(time)
-			
-			for t in range(0,len(time)):
-				print(time[t])
-				
-				try:
-					time_a = readStormDateTime(time[t])
-					time_b = readStormDateTime(time[t+1])
-					
-					delta = time_a - time_b
-					
-					delta_days = delta.total_seconds() / timedelta(days=1).total_seconds()
-					
-					delta_days_list.append(delta_days)
-					
-					if (Stats.minTimeDelta == None) and (Stats.maxTimeDelta == None):
-						Stats.minTimeDelta = abs(delta_days)
-						Stats.maxTimeDelta = abs(delta_days)
-						continue
-					
-					if abs(delta_days) < Stats.minTimeDelta:
-						Stats.minTimeDelta = abs(delta_days)
-					if abs(delta_days) > Stats.maxTimeDelta:
-						Stats.maxTimeDelta = abs(delta_days)
-					
-				except IndexError:
-					continue
-				except TypeError:
-					continue
-					
-	print('\nNetCDF Temporal Resolution Report:')
-	print('Min range = ' + format(Stats.minTimeDelta))
-	print('Max range = ' + format(Stats.maxTimeDelta))
-	print('Average = ' + format(mean(delta_days_list)))
-	print('Median = ' + format(median(delta_days_list)))
+	prsr = ArgumentParser(description='Temporal resolution of the storms of a directory of NetCDFs')
+	prsr.add_argument('ncDir', nargs='?', default=r'P:\01_DataOriginals\GOM\Metocean\StormData\storm_test',
+					  help='directory of the NetCDFs')
+	prsr.add_argument('--time_var', default='time_wmo', help='time variable, numeric days or ISO chars')
+	prsr.add_argument('--workers', type=int, default=1, help='processes reading files, 0 for one per core')
+	prsr.add_argument('--bins', type=int, default=50, help='bins of the histogram')
+	prsr.add_argument('--plot', action='store_true', help='show the histogram')
+	args = prsr.parse_args()
+	
+	ncFiles = sorted(glob(os.path.join(args.ncDir, '*.nc')))
+	Stats, delta_days = temporalReport(ncFiles, args.time_var, args.workers, args.bins)
+	printReport(Stats, len(ncFiles))
 	
-	PlotHist(delta_days_list, n_bins= 50)
\ No newline at end of file
+	if args.plot and Stats.count > 0:
+		PlotHist(np.abs(delta_days), n_bins=args.bins)
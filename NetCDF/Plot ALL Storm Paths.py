@@ -1,6 +1,9 @@
 """
 code to take a storm netCDF and plot all of the storms that are in the Gulf of Mexico
 for one year, all on one plot.
+
+For many seasons, or to render PNGs without a display, use storm_track_plot.py, which draws all tracks of
+an observation table with one LineCollection.
 """
 import os
 
@@ -1,10 +1,31 @@
 """
 This script can be used to read a list of NetCDF files, count the number of observations
 of each variable, and write out to CSV with name or file and the variable count.
+
+The census only reads the header of each file (dimensions, dtype and size of every variable), so a
+delivery can be audited without reading its data. Files are opened in a process pool, one file per task;
+the netCDF/HDF5 libraries are not thread-safe, so threads sharing them crash on concurrent opens.
+With --valid_counts the number of valid (non-fill) values of every variable is added as well, read in
+slabs along the first dimension of at most --chunk_mb each, so large variables never sit in memory whole.
+
+The output is one tidy table, a row per file and variable:
+
+	file, variable, dims, size, valid_count, dtype
+
+written as CSV, or as Parquet (needs pyarrow) when the output ends with .parquet:
+
+	python VarCountsToCSV.py counts.csv --recipe example_recipe.json --workers 8 --valid_counts
+	python VarCountsToCSV.py counts.parquet --glob "D:\\waves\\*.nc"
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
 """
 
 from netCDF4 import Dataset
 from glob import iglob
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import csv
 import json
 import os
@@ -15,36 +36,156 @@ recipe_file = r'P:\01_DataOriginals\GOM\Metocean\NewMetoceanData_11_26_19\exampl
 # specify output csv location
 output_csv = r'metoceanWaves_obs_counts.csv'
 
-# open JSON recipe
-with open(recipe_file, 'r') as f:
-	recipe = json.load(f)
-
-# create list of result to write to csv at the end
-results = []
-
-dirs = recipe['directives'][0]['files']
-
-for glob in dirs:
-	iter_filenames = iglob(glob)
-	for path in iter_filenames:
-
-		result = []
-		result.append(path.split('/',1)[0])
-		result.append(path.split('\\',1)[1])
-		
-		nc = Dataset(path)
-		
-		var_list = nc.variables
-		
-		for var in var_list:
-			
+CENSUS_COLUMNS = ['file', 'variable', 'dims', 'size', 'valid_count', 'dtype']
+
+# largest slab (bytes) read at once when counting valid values
+CHUNK_BYTES = 64 * 1024 ** 2
+
+
+def recipeGlobs(path):
+
+	# glob format of all netcdf file paths of a JSON recipe
+	with open(path, 'r') as f:
+		recipe = json.load(f)
+
+	return recipe['directives'][0]['files']
+
+
+def expandGlobs(globs):
+
+	# file paths of every glob, each path once in the order found
+	paths = []
+	seen = set()
+	for glob in globs:
+		for path in iglob(glob):
+			if path not in seen:
+				seen.add(path)
+				paths.append(path)
+
+	return paths
+
+
+def validCount(v, chunk_bytes=CHUNK_BYTES):
+	"""
+	Number of valid values of a variable, read in slabs along its first dimension.
+
+	Args:
+		v: netCDF4 variable, auto masking on so fill and missing values come back masked
+		chunk_bytes: largest slab read at once
+
+	Returns: int count of values that are not masked
+	"""
+
+	if v.ndim == 0:
+		return int(np.ma.count(v[...]))
+	if v.size == 0:
+		return 0
+
+	# rows of the first dimension per slab, variable-length strings taken as 8 bytes a value
+	itemsize = v.dtype.itemsize if isinstance(v.dtype, np.dtype) else 8
+	rows = max(1, chunk_bytes // max(1, v.size // v.shape[0] * itemsize))
+
+	count = 0
+	for start in range(0, v.shape[0], rows):
+		count += int(np.ma.count(v[start:start + rows]))
+
+	return count
+
+
+def censusFile(path, valid_counts=False, chunk_bytes=CHUNK_BYTES):
+	"""
+	Census rows of one NetCDF.
+
+	Args:
+		path: NetCDF path
+		valid_counts: also count the valid values of every variable, otherwise only the header is read
+		chunk_bytes: largest slab read at once when counting
+
+	Returns: list of dicts with CENSUS_COLUMNS as keys, valid_count None when not counted
+	"""
+
+	rows = []
+	with Dataset(path, 'r') as nc:
+		for var in nc.variables:
+
 			v = nc.variables[var]
-			
-			result.extend([var, v.size])
-			
-		results.append(result)
-		
-with open(output_csv,'w', newline='') as out:
-	writer = csv.writer(out)
-	for record in results:
-		writer.writerow(record)
\ No newline at end of file
+
+			rows.append({'file': path,
+						 'variable': var,
+						 'dims': ','.join(v.dimensions),
+						 'size': int(v.size),
+						 'valid_count': validCount(v, chunk_bytes) if valid_counts else None,
+						 'dtype': str(v.dtype)})
+
+	return rows
+
+
+def census(paths, workers=1, valid_counts=False, chunk_bytes=CHUNK_BYTES):
+
+	# census rows of all files in the order of paths, one file per task of the process pool
+	workers = workers if workers > 0 else os.cpu_count()
+	args = ([valid_counts] * len(paths), [chunk_bytes] * len(paths))
+	if workers > 1 and len(paths) > 1:
+		with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+			parts = list(executor.map(censusFile, paths, *args))
+	else:
+		parts = [censusFile(p, valid_counts, chunk_bytes) for p in paths]
+
+	return [row for part in parts for row in part]
+
+
+def writeCensusCSV(rows, path):
+
+	with open(path, 'w', newline='') as out:
+		writer = csv.DictWriter(out, fieldnames=CENSUS_COLUMNS)
+		writer.writeheader()
+		for record in rows:
+			writer.writerow(record)
+
+
+def writeCensusParquet(rows, path):
+
+	# optional dependency, only needed for Parquet output
+	import pyarrow as pa
+	import pyarrow.parquet as pq
+
+	columns = {c: [r[c] for r in rows] for c in CENSUS_COLUMNS}
+	table = pa.table({'file': pa.array(columns['file'], pa.string()),
+					  'variable': pa.array(columns['variable'], pa.string()),
+					  'dims': pa.array(columns['dims'], pa.string()),
+					  'size': pa.array(columns['size'], pa.int64()),
+					  'valid_count': pa.array(columns['valid_count'], pa.int64()),
+					  'dtype': pa.array(columns['dtype'], pa.string())})
+	pq.write_table(table, path)
+
+
+def writeCensus(rows, path):
+
+	if path.lower().endswith('.parquet'):
+		writeCensusParquet(rows, path)
+	else:
+		writeCensusCSV(rows, path)
+
+
+if __name__ == '__main__':
+
+	prsr = ArgumentParser(description='Census of the variables of a set of NetCDF files')
+	prsr.add_argument('output', nargs='?', default=output_csv, help='output .csv or .parquet')
+	prsr.add_argument('--recipe', default=None, help='JSON recipe with the file globs, default ' + recipe_file)
+	prsr.add_argument('--glob', action='append', default=[], help='file glob, may be repeated, used instead of a recipe')
+	prsr.add_argument('--workers', type=int, default=8, help='processes opening files, 0 for one per core')
+	prsr.add_argument('--valid_counts', action='store_true', help='also count the valid (non-fill) values')
+	prsr.add_argument('--chunk_mb', type=float, default=CHUNK_BYTES / 1024 ** 2,
+					  help='largest slab (MB) read at once when counting')
+	args = prsr.parse_args()
+
+	if args.glob and args.recipe is None:
+		globs = args.glob
+	else:
+		globs = recipeGlobs(args.recipe or recipe_file) + args.glob
+
+	paths = expandGlobs(globs)
+	results = census(paths, args.workers, args.valid_counts, int(args.chunk_mb * 1024 ** 2))
+	writeCensus(results, args.output)
+
+	print('{} variables of {} files written to {}'.format(len(results), len(paths), args.output))
@@ -0,0 +1,33 @@
+"""
+Small array helpers shared by the storm modules.
+
+Values reach the vectorized code as masked arrays from netCDF4, as plain arrays, or as the lists the older
+scripts build with variable[i:i + 1].tolist()[0], where a missing value is None. asFloatArray turns all of
+them into one flat float64 array with NaN for missing values.
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
+"""
+
+import numpy as np
+
+
+def asFloatArray(values):
+    """
+    Flat float64 array of values, NaN where a value is missing.
+
+    Args:
+        values: masked array, array, list (None for missing) or scalar
+
+    Returns: 1-D float64 array
+    """
+
+    if isinstance(values, np.ma.MaskedArray):
+        return np.ma.filled(values.astype(np.float64), np.nan).reshape(-1)
+    if isinstance(values, np.ndarray) and values.dtype != object:
+        return values.astype(np.float64).reshape(-1)
+    if np.isscalar(values) or values is None:
+        values = [values]
+
+    # lists coming from masked netCDF variables hold None for missing values
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64).reshape(-1)
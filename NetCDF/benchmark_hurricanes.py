@@ -0,0 +1,457 @@
+"""
+Benchmarks of the hurricane exposure pipeline on synthetic IBTrACS data.
+
+The production inputs (the IBTrACS NetCDF and the platform CSV on P:\\) are too large and too private to
+benchmark against on every change. This script writes look-alike inputs at a configurable size:
+
+    storms.nc       IBTrACS v04 layout, storm x date_time dims, S1 char iso_time/sid/subbasin and the usa_*
+                    variables read by the scripts. Tracks start in the Caribbean and drift north-west through
+                    the Gulf of Mexico, so a realistic share of observations is GM and categorized.
+    platforms.csv   Master_ID, Lat, Lon, InstallDate, RemovalDate inside the GoM lease area
+    grid.tif        blank GomAlbers grid and land mask for the gridded (Ver5_ToGeoTIFFs) path
+    mask.tif
+
+and times the pieces of the pipeline on them:
+
+    wind_radii      wind_radii_nederhoff, one batched call over all observations
+    category        categoryCodes over all observations
+    ogr             runStatsForStorms (Ver8, ogr buffer per observation)
+    vector          runStatsForStorms_Vectorized (Ver8), with --workers processes
+    stream          runStatsForStorms_Vectorized (Ver8) streaming the NetCDF in chunks of --max_memory MB
+    grid            runStatsForStorms of Ver5_ToGeoTIFFs on the synthetic grid
+
+Every benchmark is run --repeat times and the fastest run is kept. Peak memory comes from one extra run
+under tracemalloc, so tracing does not slow the timed runs. The results (seconds, observations/s,
+platform-checks/s, peak MB) are printed and, with --json, written to a file tagged with the commit they ran on.
+
+    python benchmark_hurricanes.py bench_out --storms 2000 --platforms 5000 --json HEAD.json
+
+--check runs the vector engine with one process and with --workers processes on the same inputs (days from
+the observation times, --fixed_days and --interval) and exits with 1 unless the CSVs are byte-identical:
+
+    python benchmark_hurricanes.py bench_out --storms 600 --platforms 3000 --workers 4 --check
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
+"""
+
+import os
+import io
+import csv
+import sys
+import json
+import time
+import platform
+import subprocess
+import tracemalloc
+import contextlib
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+import numpy as np
+import netCDF4
+
+from run_profile import RunProfile
+
+# NAD 1983 Albers for the Gulf of Mexico, the projection of the platform shapefile and the grids
+GOM_ALBERS_PROJ4 = '+proj=aea +lat_1=24 +lat_2=31.5 +lat_0=23 +lon_0=-84 +x_0=0 +y_0=0 +datum=NAD83 +units=m +no_defs'
+
+# reference date of the IBTrACS time variable
+TIME_ORIGIN = datetime(1858, 11, 17)
+
+# GM subbasin box used by the synthetic tracks (degrees)
+GM_BOX = (-98.0, 18.0, -81.0, 31.0)
+
+BENCHMARKS = ['wind_radii', 'category', 'ogr', 'vector', 'stream', 'grid']
+
+
+def charArray(strings, width):
+
+    # list of str -> S1 array with a trailing character dimension, as netCDF4 stores char variables
+    return np.array(strings, dtype='S{}'.format(width)).view('S1').reshape(-1, width)
+
+
+def writeSyntheticIBTrACS(path, num_storms=500, num_steps=120, first_year=1980, last_year=2020, seed=0):
+    """
+    Write an IBTrACS v04 shaped NetCDF with random storm tracks.
+
+    Args:
+        path: output .nc
+        num_storms: size of the storm dimension
+        num_steps: size of the date_time dimension, tracks use 10 to num_steps observations
+        first_year: first storm season
+        last_year: last storm season
+        seed: seed of the random generator
+
+    Returns: number of observations written
+    """
+
+    rng = np.random.default_rng(seed)
+
+    with netCDF4.Dataset(path, 'w') as ds:
+
+        ds.createDimension('storm', num_storms)
+        ds.createDimension('date_time', num_steps)
+        ds.createDimension('char2', 2)
+        ds.createDimension('char13', 13)
+        ds.createDimension('char19', 19)
+
+        dims = ('storm', 'date_time')
+        lat = ds.createVariable('usa_lat', 'f4', dims, fill_value=-9999.)
+        lon = ds.createVariable('usa_lon', 'f4', dims, fill_value=-9999.)
+        tm = ds.createVariable('time', 'f8', dims, fill_value=-9999.)
+        tm.units = 'days since {}'.format(TIME_ORIGIN.strftime('%Y-%m-%d %H:%M:%S'))
+        iso = ds.createVariable('iso_time', 'S1', dims + ('char19',))
+        sshs = ds.createVariable('usa_sshs', 'i2', dims, fill_value=-9999)
+        wind = ds.createVariable('usa_wind', 'i2', dims, fill_value=-9999)
+        gust = ds.createVariable('usa_gust', 'i2', dims, fill_value=-9999)
+        pres = ds.createVariable('usa_pres', 'i2', dims, fill_value=-9999)
+        seahgt = ds.createVariable('usa_seahgt', 'i2', dims, fill_value=-9999)
+        subbasin = ds.createVariable('subbasin', 'S1', dims + ('char2',))
+        basin = ds.createVariable('basin', 'S1', dims + ('char2',))
+        sid = ds.createVariable('sid', 'S1', ('storm', 'char13'))
+
+        # storms start between June and November of every season, in time order like IBTrACS
+        years = rng.integers(first_year, last_year + 1, num_storms)
+        starts = sorted(datetime(int(y), 6, 1) + timedelta(days=int(rng.integers(0, 150)),
+                                                           hours=6 * int(rng.integers(0, 4))) for y in years)
+
+        total = 0
+        for i, start in enumerate(starts):
+            n = int(rng.integers(10, num_steps + 1))
+            total += n
+            steps = np.arange(n)
+
+            lat0, lon0 = rng.uniform(15, 28), rng.uniform(-95, -75)
+            la = lat0 + rng.normal(0.15, 0.1) * steps + rng.normal(0, 0.05, n)
+            lo = lon0 + rng.normal(-0.2, 0.2) * steps + rng.normal(0, 0.05, n)
+            w = 25 + 60 * np.sin(np.linspace(0, np.pi, n)) * rng.uniform(0.5, 2.0) + rng.normal(0, 5, n)
+            w = np.clip(w, 10, 170).astype(np.int16)
+            times = [start + timedelta(hours=6 * int(k)) for k in steps]
+
+            lat[i, :n] = la
+            lon[i, :n] = lo
+            tm[i, :n] = [(t - TIME_ORIGIN).total_seconds() / 86400 for t in times]
+            iso[i, :n] = charArray([t.strftime('%Y-%m-%d %H:%M:%S') for t in times], 19)
+
+            cat = np.select([w < 34, w < 64, w < 83, w < 96, w < 113, w < 137], [-1, 0, 1, 2, 3, 4], 5)
+            # IBTrACS marks observations without a category as -15
+            cat[rng.random(n) < 0.1] = -15
+            sshs[i, :n] = cat
+            wind[i, :n] = w
+            gust[i, :n] = np.ma.masked_array(w + 15, mask=rng.random(n) < 0.3)
+            pres[i, :n] = np.ma.masked_array(1010 - w // 2, mask=rng.random(n) < 0.2)
+            seahgt[i, :n] = np.ma.masked_array(w // 10, mask=rng.random(n) < 0.5)
+
+            west, south, east, north = GM_BOX
+            in_gm = (lo > west) & (lo < east) & (la > south) & (la < north)
+            subbasin[i, :n] = charArray(np.where(in_gm, 'GM', np.where(rng.random(n) < 0.5, 'CS', 'MM')), 2)
+            basin[i, :n] = charArray(['NA'] * n, 2)
+            sid[i] = charArray(['{}{:03d}N{:02d}{:03d}'.format(start.year, start.timetuple().tm_yday, int(lat0),
+                                                                 int(360 + lon0))], 13)[0]
+
+    return total
+
+
+def writeSyntheticPlatforms(path, num_platforms=2000, seed=1):
+    """
+    Write a platform CSV in the layout of loadPlatformCsv.
+
+    Args:
+        path: output .csv
+        num_platforms: number of rows
+        seed: seed of the random generator
+
+    Returns: N/A
+    """
+
+    rng = np.random.default_rng(seed)
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Master_ID', 'Lat', 'Lon', 'InstallDate', 'RemovalDate'])
+        for k in range(num_platforms):
+            install_year = int(rng.integers(1960, 2015))
+            install = '{:02d}/{:02d}/{}'.format(int(rng.integers(1, 13)), int(rng.integers(1, 29)), install_year)
+            removal = ''
+            if rng.random() < 0.4:
+                removal = '{:02d}/{:02d}/{}'.format(int(rng.integers(1, 13)), int(rng.integers(1, 29)),
+                                                    install_year + int(rng.integers(1, 30)))
+            writer.writerow(['P{:06d}'.format(k), rng.uniform(25, 30.5), rng.uniform(-97, -85), install, removal])
+
+
+def writeSyntheticGrid(grid_path, mask_path, cell_size=5000):
+    """
+    Write a blank GomAlbers grid over the Gulf of Mexico and an all-ocean mask (1) with gdal.
+
+    Args:
+        grid_path: output grid .tif
+        mask_path: output mask .tif
+        cell_size: cell size in meters
+
+    Returns: N/A
+    """
+
+    from osgeo import gdal, osr
+
+    srs = osr.SpatialReference()
+    srs.ImportFromProj4(GOM_ALBERS_PROJ4)
+
+    # about 98W-81W, 18N-31N in GomAlbers meters
+    xmin, xmax, ymin, ymax = -1500000, 400000, -600000, 950000
+    cols = int((xmax - xmin) / cell_size)
+    rows = int((ymax - ymin) / cell_size)
+
+    driver = gdal.GetDriverByName('GTiff')
+    for path, value in ((grid_path, 0), (mask_path, 1)):
+        ds = driver.Create(path, cols, rows, 1, gdal.GDT_Float32)
+        ds.SetGeoTransform((xmin, cell_size, 0, ymax, 0, -cell_size))
+        ds.SetProjection(srs.ExportToWkt())
+        ds.GetRasterBand(1).Fill(value)
+        ds = None
+
+
+def writeGomAlbersShapefile(path):
+
+    # empty point shapefile carrying the GomAlbers projection, read by GetGomAlbersSpatialRef
+    from osgeo import ogr, osr
+
+    srs = osr.SpatialReference()
+    srs.ImportFromProj4(GOM_ALBERS_PROJ4)
+    driver = ogr.GetDriverByName('ESRI Shapefile')
+    if os.path.exists(path):
+        driver.DeleteDataSource(path)
+    ds = driver.CreateDataSource(path)
+    ds.CreateLayer('GomAlbers', srs, ogr.wkbPoint)
+    ds = None
+
+
+def peakMemory(fn):
+
+    # peak traced allocation (MB) of one call of fn
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def timeBenchmark(fn, repeat=3, memory=True):
+    """
+    Time fn.
+
+    Args:
+        fn: callable without arguments, returns an optional dictionary of counts (e.g. a RunProfile's counters)
+        repeat: number of timed runs, the fastest is kept
+        memory: also measure the peak memory in one extra traced run
+
+    Returns: dictionary with seconds, runs, peak_memory_mb and the counts of the fastest run
+    """
+
+    best = None
+    counts = {}
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            t = time.perf_counter()
+            out = fn()
+            seconds = time.perf_counter() - t
+        if best is None or seconds < best:
+            best = seconds
+            counts = out or {}
+
+    result = {'seconds': round(best, 6), 'runs': repeat}
+    if memory:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result['peak_memory_mb'] = round(peakMemory(fn), 3)
+    result.update(counts)
+
+    return result
+
+
+def addThroughput(result, num_platforms=None):
+
+    seconds = result['seconds']
+    if seconds <= 0:
+        return result
+    if 'observations' in result:
+        result['observations_per_s'] = round(result['observations'] / seconds, 1)
+    if num_platforms is not None and 'buffers' in result:
+        # every buffered (categorized GM) observation is checked against every platform
+        result['platform_checks'] = result['buffers'] * num_platforms
+        result['platform_checks_per_s'] = round(result['platform_checks'] / seconds, 1)
+
+    return result
+
+
+def gitCommit():
+
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(__file__) or '.',
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def runBenchmarks(work_dir, benchmarks=BENCHMARKS, num_storms=500, num_steps=120, num_platforms=2000,
+                  cell_size=5000, workers=1, repeat=3, memory=True, seed=0, max_memory=16 * 2 ** 20):
+    """
+    Write the synthetic inputs to work_dir and run the requested benchmarks.
+
+    Returns: dictionary ready to be written as JSON
+    """
+
+    os.makedirs(work_dir, exist_ok=True)
+    nc_path = os.path.join(work_dir, 'storms.nc')
+    csv_path = os.path.join(work_dir, 'platforms.csv')
+
+    num_obs = writeSyntheticIBTrACS(nc_path, num_storms, num_steps, seed=seed)
+    writeSyntheticPlatforms(csv_path, num_platforms, seed=seed + 1)
+
+    report = {'created': datetime.now().isoformat(timespec='seconds'), 'commit': gitCommit(),
+              'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+              'cpus': os.cpu_count(),
+              'config': {'storms': num_storms, 'date_time': num_steps, 'observations': num_obs,
+                         'platforms': num_platforms, 'cell_size': cell_size, 'workers': workers,
+                         'repeat': repeat, 'seed': seed, 'max_memory': max_memory},
+              'results': {}}
+    results = report['results']
+    first, last = datetime(1842, 1, 1), datetime(2100, 1, 1)
+
+    if 'wind_radii' in benchmarks or 'category' in benchmarks:
+        with netCDF4.Dataset(nc_path) as ds:
+            vmax = ds.variables['usa_wind'][:].compressed()
+            lat = np.ma.masked_array(ds.variables['usa_lat'][:], np.ma.getmaskarray(ds.variables['usa_wind'][:]))
+            lat = lat.compressed()
+            # every observation slot, masked sshs fall back on the wind
+            valid = ~np.ma.getmaskarray(ds.variables['iso_time'][:]).all(axis=-1)
+            cats = ds.variables['usa_sshs'][:][valid]
+            winds = ds.variables['usa_wind'][:][valid]
+
+    if 'wind_radii' in benchmarks:
+        from wind_radii_nederhoff import wind_radii_nederhoff
+        results['wind_radii'] = addThroughput(timeBenchmark(
+            lambda: (wind_radii_nederhoff(vmax=vmax, lat=lat, region=6), {'observations': len(vmax)})[1],
+            repeat, memory))
+
+    if 'category' in benchmarks:
+        from storm_category import categoryCodes
+        results['category'] = addThroughput(timeBenchmark(
+            lambda: (categoryCodes(cats, winds), {'observations': len(cats)})[1], repeat, memory))
+
+    if 'ogr' in benchmarks or 'vector' in benchmarks or 'stream' in benchmarks:
+        import Metocean_Hurricanes_Ver8 as ver8
+
+        # the engines borrow the GomAlbers projection from a shapefile
+        ver8.GOM_ALBERS_SHP = os.path.join(work_dir, 'GomAlbers.shp')
+        writeGomAlbersShapefile(ver8.GOM_ALBERS_SHP)
+        platforms = ver8.loadPlatformCsv(csv_path)
+
+        def engine(fn, **kwargs):
+            def run():
+                profile = RunProfile(progress=False)
+                fn(platforms, nc_path, first, last, profile=profile, **kwargs)
+                return profile.counters
+            return run
+
+        if 'ogr' in benchmarks:
+            results['ogr'] = addThroughput(timeBenchmark(engine(ver8.runStatsForStorms), repeat, memory),
+                                           num_platforms)
+        if 'vector' in benchmarks:
+            # no checkpoint and a warm observation cache, so every run does the full work
+            ver8.loadStormObservations(nc_path)
+            results['vector'] = addThroughput(timeBenchmark(
+                engine(ver8.runStatsForStorms_Vectorized, workers=workers), repeat, memory), num_platforms)
+        if 'stream' in benchmarks:
+            results['stream'] = addThroughput(timeBenchmark(
+                engine(ver8.runStatsForStorms_Vectorized, max_memory=max_memory), repeat, memory), num_platforms)
+
+    if 'grid' in benchmarks:
+        import Metocean_Hurricanes_Ver5_ToGeoTIFFs as ver5
+
+        grid_path = os.path.join(work_dir, 'grid.tif')
+        mask_path = os.path.join(work_dir, 'mask.tif')
+        writeSyntheticGrid(grid_path, mask_path, cell_size)
+
+        def grid():
+            ds_grid, arrays = ver5.loadArrays(grid_path, mask_path)
+            ver5.runStatsForStorms(arrays, ds_grid, nc_path)
+            return {'observations': num_obs, 'cells': int(np.prod(arrays.stormTotal.shape))}
+
+        results['grid'] = addThroughput(timeBenchmark(grid, repeat, memory))
+
+    return report
+
+
+def checkWorkers(work_dir, num_storms=500, num_steps=120, num_platforms=2000, workers=4, seed=0):
+    """
+    Write the synthetic inputs to work_dir and compare the Ver8 vector engine CSVs of one and of workers processes.
+
+    Returns: dictionary of configuration -> True when the two CSVs are byte-identical
+    """
+
+    import Metocean_Hurricanes_Ver8 as ver8
+
+    os.makedirs(work_dir, exist_ok=True)
+    nc_path = os.path.join(work_dir, 'storms.nc')
+    csv_path = os.path.join(work_dir, 'platforms.csv')
+    writeSyntheticIBTrACS(nc_path, num_storms, num_steps, seed=seed)
+    writeSyntheticPlatforms(csv_path, num_platforms, seed=seed + 1)
+
+    ver8.GOM_ALBERS_SHP = os.path.join(work_dir, 'GomAlbers.shp')
+    writeGomAlbersShapefile(ver8.GOM_ALBERS_SHP)
+    platforms = ver8.loadPlatformCsv(csv_path)
+    first, last = datetime(1842, 1, 1), datetime(2100, 1, 1)
+
+    configs = {'days': {}, 'fixed_days': {'hit_days': ver8.PlatformStats.HIT_DAYS}, 'interval': {'interval': 1800}}
+    identical = {}
+    for name, kwargs in configs.items():
+        outputs = []
+        for n in (1, workers):
+            path = os.path.join(work_dir, 'check_{}_{}.csv'.format(name, n))
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = ver8.runStatsForStorms_Vectorized(platforms, nc_path, first, last, workers=n,
+                                                          profile=RunProfile(progress=False), **kwargs)
+            ver8.writeResultsToCSV(stats, path)
+            with open(path, 'rb') as f:
+                outputs.append(f.read())
+        identical[name] = outputs[0] == outputs[1]
+
+    return identical
+
+
+if __name__ == "__main__":
+
+    prsr = ArgumentParser(description="Benchmark the hurricane scripts on synthetic IBTrACS data")
+    prsr.add_argument('work_dir', type=str, help='folder for the synthetic inputs')
+    prsr.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS, default=BENCHMARKS, help='benchmarks to run')
+    prsr.add_argument('--storms', type=int, default=500, help='size of the storm dimension')
+    prsr.add_argument('--steps', type=int, default=120, help='size of the date_time dimension')
+    prsr.add_argument('--platforms', type=int, default=2000, help='number of synthetic platforms')
+    prsr.add_argument('--cell_size', type=float, default=5000, help='cell size (m) of the synthetic grid')
+    prsr.add_argument('--workers', type=int, default=1, help='processes for the vector engine')
+    prsr.add_argument('--max_memory', type=float, default=16, help='chunk size (MB) of the stream benchmark')
+    prsr.add_argument('--repeat', type=int, default=3, help='timed runs per benchmark, the fastest is kept')
+    prsr.add_argument('--no_memory', action='store_true', help='skip the traced run for peak memory')
+    prsr.add_argument('--seed', type=int, default=0, help='seed of the synthetic data')
+    prsr.add_argument('--json', type=str, default=None, help='write the results to this JSON file')
+    prsr.add_argument('--check', action='store_true',
+                      help='compare the vector engine results of 1 and --workers processes instead of timing')
+
+    args = prsr.parse_args()
+
+    if args.check:
+        if args.workers < 2:
+            prsr.error('--check needs --workers 2 or more')
+        identical = checkWorkers(args.work_dir, args.storms, args.steps, args.platforms, args.workers, args.seed)
+        for name, same in identical.items():
+            print('{:<12}{}'.format(name, 'identical' if same else 'DIFFERENT'))
+        sys.exit(0 if all(identical.values()) else 1)
+
+    report = runBenchmarks(args.work_dir, args.benchmarks, args.storms, args.steps, args.platforms, args.cell_size,
+                           args.workers, args.repeat, not args.no_memory, args.seed, int(args.max_memory * 2 ** 20))
+
+    json.dump(report['results'], sys.stdout, indent=2)
+    print()
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
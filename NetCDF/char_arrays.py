@@ -0,0 +1,66 @@
+"""
+Decoding of netCDF char variables (dtype S1 with a trailing character dimension) in one call.
+
+IBTrACS stores iso_time, sid, subbasin, basin, name, ... as S1 arrays, e.g. iso_time is (storm, date_time, 19).
+The scripts used to turn them into strings one row at a time inside the observation loop:
+
+    iso_t = b"".join(iso_time_storm[t]).decode("utf-8")
+
+which is a Python call per row. Here the last dimension of an array of any rank is joined with a single view:
+
+    decodeChars(ds.variables['iso_time'][:])        (storm, date_time) str array
+    decodeTimes(ds.variables['iso_time'][i])        (date_time,) datetime64[s] array of storm i
+    decodeChars(ds.variables['sid'][i])             0-d str array, use .item() for the str
+
+Masked characters, e.g. the date_time slots after the end of a track, give '' (NaT for decodeTimes).
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
+"""
+
+import numpy as np
+
+
+def decodeChars(arr, as_bytes=False):
+    """
+    Join the last (character) dimension of a netCDF S1 array into strings in one call.
+
+    Args:
+        arr: masked or plain array of dtype S1, any rank
+        as_bytes: keep the strings as fixed-width bytes (dtype S) instead of str
+
+    Returns: array of str (or bytes) with one less dimension, '' where any character was masked
+    """
+
+    data = np.ascontiguousarray(np.ma.filled(arr, b''))
+    strings = data.view('S{}'.format(data.shape[-1])).reshape(data.shape[:-1])
+    mask = np.ma.getmaskarray(arr).any(axis=-1)
+    if not as_bytes:
+        strings = strings.astype('U')
+    strings[mask] = ''
+
+    return strings
+
+
+def decodeTimes(arr, unit='s'):
+    """
+    ISO 8601 date times ('YYYY-MM-DD HH:MM:SS', e.g. IBTrACS iso_time) of a netCDF S1 array.
+
+    Args:
+        arr: masked or plain array of dtype S1, any rank
+        unit: numpy datetime unit of the result
+
+    Returns: datetime64 array with one less dimension, NaT where the time is missing
+    """
+
+    return decodeChars(arr).astype('datetime64[{}]'.format(unit))
+
+
+def encodeChars(strings, width):
+
+    # str array -> S1 array with a trailing character dimension, masked where the string is ''
+    strings = np.asarray(strings)
+    chars = strings.astype('S{}'.format(width)).view('S1').reshape(strings.shape + (width,))
+    mask = np.repeat((strings == '')[..., np.newaxis], width, axis=-1)
+
+    return np.ma.masked_array(chars, mask=mask)
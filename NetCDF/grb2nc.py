@@ -1,11 +1,288 @@
 """
+Convert GRIB2 wave model files (NOAA WAVEWATCH III multi_1 at_10m wind) to NetCDF, cut to a lat/lon box.
 
+The scripts used to run ncks and cdo through os.system, one file at a time, never looking at the exit
+status. Here every file is a job of a bounded process pool and a failure is reported with its error
+instead of leaving a half written file behind:
+
+	jobs = monthlyJobs([2005], MONTHS, THREDDS_URL, 'at_10m_wind')
+	records = convertAll(jobs, box=GOM_BOX, workers=4)
+	printReport(records)
+
+A source is either read in-process with netCDF4 (an OPeNDAP URL such as the THREDDS dodsC endpoint, or a
+local NetCDF), slicing the box out of the lat/lon dimensions so only the box is transferred and written,
+or, for a local .grb2, converted by cdo with the box cut in the same pass (-sellonlatbox). A local folder
+laid out like the THREDDS paths can stand in for the server, e.g. for testing:
+
+	monthlyJobs([2005], MONTHS, '/data/nww3/{year}/{month}/gribs/multi_1.at_10m.wind.{year}{month}.nc', out_dir)
+
+Outputs that are already up to date (same box, newer than a local source) are skipped.
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
 """
 
 import os
+import sys
+import csv
+import time
+import subprocess
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import netCDF4
 
 folder = 'at_10m_wind/'
 
-for file in os.listdir(folder):
-	if file.endswith('.grb2'):
-		os.system("cdo -f nc -copy {} {}".format(os.path.join(folder,file), os.path.join(folder,file.replace('.grb2','.nc'))))
\ No newline at end of file
+THREDDS_URL = 'https://data.nodc.noaa.gov/thredds/dodsC/ncep/nww3/{year}/{month}/gribs/multi_1.at_10m.wind.{year}{month}.grb2'
+
+MONTHS = ['01', '02', '03', '04', '05', '06', '07', '08', '09', '10', '11', '12']
+
+# (lon_min, lon_max, lat_min, lat_max) of the Gulf of Mexico, longitudes 0 - 360 as in the GRIB2 files
+GOM_BOX = (262.0, 282.0, 18.0, 30.8)
+
+# names the latitude and longitude dimensions go by
+LAT_NAMES = ['lat', 'latitude', 'Latitude']
+LON_NAMES = ['lon', 'longitude', 'Longitude']
+
+GRIB_SUFFIXES = ('.grb2', '.grib2', '.grb')
+
+# global attribute recording the box an output was cut to
+BOX_ATTRIBUTE = 'subset_box'
+
+
+def boxText(box):
+	return 'none' if box is None else ','.join(format(v, 'g') for v in box)
+
+
+def isRemote(src):
+	return '://' in src
+
+
+def findName(names, candidates):
+
+	for name in candidates:
+		if name in names:
+			return name
+	raise KeyError('none of {} found'.format(', '.join(candidates)))
+
+
+def coordSlice(values, lo, hi):
+
+	# slice of the (sorted) coordinate values within [lo, hi]
+	values = np.asarray(values)
+	inside = np.nonzero((values >= lo) & (values <= hi))[0]
+	if len(inside) == 0:
+		raise ValueError('no coordinates within {} - {}'.format(lo, hi))
+
+	return slice(int(inside[0]), int(inside[-1]) + 1)
+
+
+def subsetToNetCDF(src, out_path, box=None):
+	"""
+	Copy a NetCDF or OPeNDAP dataset to a local NetCDF, cut to box.
+
+	Args:
+		src: OPeNDAP URL or local NetCDF
+		out_path: output NetCDF
+		box: (lon_min, lon_max, lat_min, lat_max), None for the whole grid
+	"""
+
+	with netCDF4.Dataset(src, 'r') as ds, netCDF4.Dataset(out_path, 'w') as out:
+
+		slices = {}
+		if box is not None:
+			lat = findName(ds.dimensions, LAT_NAMES)
+			lon = findName(ds.dimensions, LON_NAMES)
+			slices[lon] = coordSlice(ds.variables[lon][:], box[0], box[1])
+			slices[lat] = coordSlice(ds.variables[lat][:], box[2], box[3])
+
+		out.setncatts({k: ds.getncattr(k) for k in ds.ncattrs()})
+		for name, dim in ds.dimensions.items():
+			size = None if dim.isunlimited() else len(range(len(dim))[slices.get(name, slice(None))])
+			out.createDimension(name, size)
+
+		for name, var in ds.variables.items():
+			attrs = {k: var.getncattr(k) for k in var.ncattrs()}
+			v = out.createVariable(name, var.dtype, var.dimensions, fill_value=attrs.pop('_FillValue', None),
+								   zlib=isinstance(var.dtype, np.dtype))
+			v.setncatts(attrs)
+			# only the box is read, for an OPeNDAP source only the box is transferred
+			index = tuple(slices.get(d, slice(None)) for d in var.dimensions)
+			v[:] = var[index] if index else var[...]
+
+		out.setncattr(BOX_ATTRIBUTE, boxText(box))
+
+
+def cdoToNetCDF(src, out_path, box=None):
+
+	# local GRIB2 -> NetCDF with cdo, the box cut in the same pass
+	cmd = ['cdo', '-f', 'nc', 'copy']
+	if box is not None:
+		cmd.append('-sellonlatbox,{}'.format(boxText(box)))
+	cmd += [src, out_path]
+
+	result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+	if result.returncode != 0:
+		raise RuntimeError('cdo failed ({}): {}'.format(result.returncode, result.stderr.strip()))
+
+	with netCDF4.Dataset(out_path, 'a') as out:
+		out.setncattr(BOX_ATTRIBUTE, boxText(box))
+
+
+def isUpToDate(src, out_path, box=None):
+
+	# output exists, was cut to the same box and is newer than a local source
+	if not os.path.exists(out_path):
+		return False
+	if not isRemote(src) and os.path.getmtime(out_path) < os.path.getmtime(src):
+		return False
+	try:
+		with netCDF4.Dataset(out_path, 'r') as out:
+			return getattr(out, BOX_ATTRIBUTE, None) == boxText(box)
+	except OSError:
+		return False
+
+
+def convertFile(src, out_path, box=None, force=False):
+	"""
+	Convert one source, skipping it when its output is up to date.
+
+	Args:
+		src: OPeNDAP URL, local NetCDF or local GRIB2
+		out_path: output NetCDF
+		box: (lon_min, lon_max, lat_min, lat_max), None for the whole grid
+		force: convert even when the output is up to date
+
+	Returns: dict with src, out, status ('converted', 'skipped' or 'failed'), seconds and error
+	"""
+
+	t = time.perf_counter()
+	record = {'src': src, 'out': out_path, 'status': 'converted', 'seconds': 0.0, 'error': ''}
+
+	if not force and isUpToDate(src, out_path, box):
+		record['status'] = 'skipped'
+		return record
+
+	# write to a temporary name first so a failed conversion never leaves a half written output
+	tmp = out_path + '.tmp'
+	try:
+		if not isRemote(src) and src.lower().endswith(GRIB_SUFFIXES):
+			cdoToNetCDF(src, tmp, box)
+		else:
+			subsetToNetCDF(src, tmp, box)
+		os.replace(tmp, out_path)
+	except Exception as e:
+		record['status'] = 'failed'
+		record['error'] = '{}: {}'.format(type(e).__name__, e)
+		if os.path.exists(tmp):
+			os.remove(tmp)
+
+	record['seconds'] = round(time.perf_counter() - t, 3)
+
+	return record
+
+
+def convertAll(jobs, box=None, workers=1, force=False):
+	"""
+	Convert (src, out_path) jobs in a bounded process pool.
+
+	Args:
+		jobs: list of (src, out_path)
+		box: (lon_min, lon_max, lat_min, lat_max), None for the whole grid
+		workers: processes, 0 for one per core
+		force: convert even when the outputs are up to date
+
+	Returns: records of convertFile in the order of jobs
+	"""
+
+	workers = workers if workers > 0 else os.cpu_count()
+	if workers <= 1 or len(jobs) <= 1:
+		records = []
+		for src, out_path in jobs:
+			records.append(convertFile(src, out_path, box, force))
+			printRecord(records[-1])
+		return records
+
+	records = [None] * len(jobs)
+	with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+		futures = {executor.submit(convertFile, src, out_path, box, force): i for i, (src, out_path) in enumerate(jobs)}
+		for future in as_completed(futures):
+			records[futures[future]] = future.result()
+			printRecord(records[futures[future]])
+
+	return records
+
+
+def folderJobs(folder, out_dir=None):
+
+	# every GRIB2 of a folder -> NetCDF of the same name
+	out_dir = folder if out_dir is None else out_dir
+	jobs = []
+	for file in sorted(os.listdir(folder)):
+		if file.endswith(GRIB_SUFFIXES):
+			out = os.path.splitext(file)[0] + '.nc'
+			jobs.append((os.path.join(folder, file), os.path.join(out_dir, out)))
+
+	return jobs
+
+
+def monthlyJobs(years, months, source, out_dir, skip=()):
+
+	# one job per month, source formatted with {year} and {month}, e.g. THREDDS_URL or a local stand-in,
+	# months in skip ('YYYYMM') left out
+	jobs = []
+	for y in years:
+		for m in months:
+			if str(y) + m in skip:
+				continue
+			src = source.format(year=y, month=m)
+			file = 'at_10m_{}.nc'.format(m + str(y))
+			jobs.append((src, os.path.join(out_dir, file)))
+
+	return jobs
+
+
+def printRecord(record):
+	print('{:<10}{:>9.2f}s  {}{}'.format(record['status'], record['seconds'], record['out'],
+										 '  ' + record['error'] if record['error'] else ''))
+
+
+def printReport(records):
+
+	counts = {s: sum(r['status'] == s for r in records) for s in ['converted', 'skipped', 'failed']}
+	total = sum(r['seconds'] for r in records)
+	print('{converted} converted, {skipped} skipped, {failed} failed'.format(**counts) +
+		  ', {:.2f}s of conversion'.format(total))
+
+
+def writeReportCSV(records, path):
+
+	with open(path, 'w', newline='') as out:
+		writer = csv.DictWriter(out, fieldnames=['src', 'out', 'status', 'seconds', 'error'])
+		writer.writeheader()
+		for record in records:
+			writer.writerow(record)
+
+
+if __name__ == '__main__':
+
+	prsr = ArgumentParser(description='Convert the GRIB2 files of a folder to NetCDF')
+	prsr.add_argument('folder', nargs='?', default=folder, help='folder of .grb2 files')
+	prsr.add_argument('--out_dir', default=None, help='folder of the NetCDFs, default the input folder')
+	prsr.add_argument('--box', type=float, nargs=4, default=None, metavar=('LON_MIN', 'LON_MAX', 'LAT_MIN', 'LAT_MAX'),
+					  help='lat/lon box to cut, default the whole grid')
+	prsr.add_argument('--gom', action='store_const', const=GOM_BOX, dest='box', help='Gulf of Mexico box')
+	prsr.add_argument('--workers', type=int, default=4, help='conversion processes, 0 for one per core')
+	prsr.add_argument('--force', action='store_true', help='convert even when the output is up to date')
+	prsr.add_argument('--report', default=None, help='CSV of the per-file status and timings')
+	args = prsr.parse_args()
+
+	if args.out_dir is not None:
+		os.makedirs(args.out_dir, exist_ok=True)
+	records = convertAll(folderJobs(args.folder, args.out_dir), args.box, args.workers, args.force)
+	printReport(records)
+	if args.report is not None:
+		writeReportCSV(records, args.report)
+	if any(r['status'] == 'failed' for r in records):
+		sys.exit(1)
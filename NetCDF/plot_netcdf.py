@@ -2,37 +2,243 @@
 Simple script to plot mean values of a netCDF using matplotlib.
 
 https://www.afahadabdullah.com/blog/plotting-climate-data-in-python-matplotlib
+
+The mean over time is taken in one pass over the time dimension, a chunk of time steps at a time, so a
+year-long 3-hourly HYCOM file never has to fit in memory. RunningStats keeps a running sum and count per
+cell, and with stats=True also the min, max and standard deviation (Welford, with chunks merged by the
+Chan et al. pairwise update). Missing values (fill values and NaN) are left out per cell. The mean field is
+written as a GeoTIFF (one band per statistic) or a NetCDF:
+
+    python plot_netcdf.py hycom_uv_2018_3hr.nc u_mean.tif --var u --level 0 --stats --plot u_mean.png
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
 """
 
 from netCDF4 import Dataset
+from argparse import ArgumentParser
 import numpy as np
-import matplotlib.pyplot as plt
-from mpl_toolkits.basemap import Basemap
 
 nc_file = r"P:\01_DataOriginals\GOM\Metocean\NewMetoceanData_11_26_19\Surface Current Velocity\hycom_uv_2018_3hr.nc"
-nc = Dataset(nc_file, mode='r')
-
-lat = nc.variables['Latitude'][:]
-lon = nc.variables['Longitude'][:]
-time = nc.variables['MT'][:]
-u = nc.variables['u'][:]
-nc.close()
-
-big_array=[]
-for i in u:
-	big_array.append(i)
-	big_array=np.array(big_array)
-	Mean=np.mean(big_array, axis=0)
-
-#plot output summary stats
-map = Basemap(projection='merc',llcrnrlat=-40,urcrnrlat=-33,llcrnrlon=139.0,urcrnrlon=151.0,lat_ts=0,resolution='i')
-map.drawcoastlines()
-map.drawstates()
-x,y=map(*np.meshgrid(lon,lat))
-plt.title('Total Mean at 3pm')
-ticks=[-5,0,5,10,15,20,25,30,35,40,45,50]
-CS = map.contourf(x,y,Mean,ticks, cmap=plt.cm.jet)
-l,b,w,h =0.1,0.1,0.8,0.8
-cax = plt.axes([l+w+0.025, b, 0.025, h])
-plt.colorbar(CS,cax=cax, drawedges=True)
-plt.show()
\ No newline at end of file
+
+LAT_VARIABLE = 'Latitude'
+LON_VARIABLE = 'Longitude'
+
+# largest chunk (bytes) of the variable read at once
+CHUNK_BYTES = 256 * 2 ** 20
+
+NODATA = -9999.0
+
+
+class RunningStats(object):
+
+	def __init__(self, shape, stats=False):
+		"""
+		Args:
+			shape: shape of one time step
+			stats: also keep min, max and the sum of squared deviations for the standard deviation
+		"""
+
+		self.stats = stats
+		self.count = np.zeros(shape, dtype=np.int64)
+		self.sum = np.zeros(shape, dtype=np.float64)
+		if stats:
+			self.mean = np.zeros(shape, dtype=np.float64)
+			self.m2 = np.zeros(shape, dtype=np.float64)
+			self.min = np.full(shape, np.inf)
+			self.max = np.full(shape, -np.inf)
+
+	def Update(self, chunk):
+
+		# add a chunk of time steps, (time,) + shape, masked or NaN values are left out
+		chunk = np.ma.masked_invalid(np.ma.asarray(chunk, dtype=np.float64))
+		values = np.ma.filled(chunk, 0.0)
+		n = chunk.count(axis=0)
+		s = values.sum(axis=0)
+
+		if self.stats:
+			# mean and squared deviations of the chunk, merged into the running ones
+			valid = n > 0
+			mean_b = np.divide(s, n, out=np.zeros_like(s), where=valid)
+			m2_b = np.ma.filled((chunk - mean_b) ** 2, 0.0).sum(axis=0)
+			total = self.count + n
+			delta = mean_b - self.mean
+			self.mean += np.divide(delta * n, total, out=np.zeros_like(s), where=valid)
+			self.m2 += m2_b + np.divide(delta ** 2 * self.count * n, total, out=np.zeros_like(s), where=valid)
+			self.min = np.minimum(self.min, np.ma.filled(chunk.min(axis=0), np.inf))
+			self.max = np.maximum(self.max, np.ma.filled(chunk.max(axis=0), -np.inf))
+
+		self.count += n
+		self.sum += s
+
+	def Mean(self):
+		return np.ma.masked_where(self.count == 0, self.sum / np.maximum(self.count, 1))
+
+	def Std(self):
+
+		# population standard deviation
+		return np.ma.masked_where(self.count == 0, np.sqrt(self.m2 / np.maximum(self.count, 1)))
+
+	def Min(self):
+		return np.ma.masked_where(self.count == 0, self.min)
+
+	def Max(self):
+		return np.ma.masked_where(self.count == 0, self.max)
+
+	def Fields(self):
+
+		# name -> masked field of every statistic kept
+		fields = {'mean': self.Mean()}
+		if self.stats:
+			fields.update({'std': self.Std(), 'min': self.Min(), 'max': self.Max()})
+		fields['count'] = np.ma.masked_array(self.count)
+
+		return fields
+
+
+def timeChunks(num_steps, step_bytes, max_bytes=CHUNK_BYTES):
+
+	# (start, stop) of the chunks of time steps, at least one step each
+	steps = max(1, int(max_bytes // max(1, step_bytes)))
+	for start in range(0, num_steps, steps):
+		yield start, min(start + steps, num_steps)
+
+
+def temporalStats(nc_path, var_name, level=None, stats=False, max_bytes=CHUNK_BYTES):
+	"""
+	Statistics over the first (time) dimension of a variable, read a chunk of time steps at a time.
+
+	Args:
+		nc_path: NetCDF path
+		var_name: variable with time as its first dimension, e.g. u (MT, Depth, Y, X)
+		level: index into the second dimension (e.g. depth), None to keep all of it
+		stats: also min, max and standard deviation
+		max_bytes: largest chunk read at once
+
+	Returns: RunningStats
+	"""
+
+	with Dataset(nc_path, mode='r') as nc:
+		var = nc.variables[var_name]
+		shape = var.shape[1:] if level is None else var.shape[2:]
+		step_bytes = int(np.prod(shape)) * max(var.dtype.itemsize, 8)
+
+		running = RunningStats(shape, stats)
+		for start, stop in timeChunks(var.shape[0], step_bytes, max_bytes):
+			running.Update(var[start:stop] if level is None else var[start:stop, level])
+
+	return running
+
+
+def readLatLon(nc_path, lat_name=LAT_VARIABLE, lon_name=LON_VARIABLE):
+
+	# 1-D latitude and longitude of the grid, taken from the first row and column when stored as 2-D
+	with Dataset(nc_path, mode='r') as nc:
+		lat = np.ma.getdata(nc.variables[lat_name][:]).astype(np.float64)
+		lon = np.ma.getdata(nc.variables[lon_name][:]).astype(np.float64)
+
+	if lat.ndim == 2:
+		lat = lat[:, 0]
+	if lon.ndim == 2:
+		lon = lon[0, :]
+
+	return lat, lon
+
+
+def writeStatsGeoTIFF(fields, lat, lon, out_path):
+
+	# one Float32 band per statistic, in the order of fields, on a regular lat/lon grid (EPSG:4326)
+	from osgeo import gdal, osr
+
+	names = list(fields)
+	rows, cols = fields[names[0]].shape
+	dx = (lon[-1] - lon[0]) / (cols - 1) if cols > 1 else 1.0
+	dy = (lat[-1] - lat[0]) / (rows - 1) if rows > 1 else 1.0
+
+	# north up: flip the rows when the latitudes go south to north
+	flip = dy > 0
+	top = lat[-1] if flip else lat[0]
+
+	driver = gdal.GetDriverByName('GTiff')
+	out = driver.Create(out_path, cols, rows, len(names), gdal.GDT_Float32)
+	out.SetGeoTransform((lon[0] - dx / 2, dx, 0, top + abs(dy) / 2, 0, -abs(dy)))
+	srs = osr.SpatialReference()
+	srs.ImportFromEPSG(4326)
+	out.SetProjection(srs.ExportToWkt())
+
+	for b, name in enumerate(names, start=1):
+		band = out.GetRasterBand(b)
+		data = np.ma.filled(fields[name].astype(np.float64), NODATA)
+		band.WriteArray(data[::-1] if flip else data)
+		band.SetNoDataValue(NODATA)
+		band.SetDescription(name)
+	out.FlushCache()
+	out = None
+
+
+def writeStatsNetCDF(fields, lat, lon, out_path, var_name='u'):
+
+	# one variable per statistic, named <var>_<statistic>, on the lat/lon of the input
+	with Dataset(out_path, mode='w') as nc:
+		nc.createDimension('lat', len(lat))
+		nc.createDimension('lon', len(lon))
+		nc.createVariable('lat', 'f8', ('lat',))[:] = lat
+		nc.createVariable('lon', 'f8', ('lon',))[:] = lon
+		for name, field in fields.items():
+			dtype = 'i8' if name == 'count' else 'f8'
+			v = nc.createVariable('{}_{}'.format(var_name, name), dtype, ('lat', 'lon'),
+								  fill_value=None if name == 'count' else NODATA)
+			v[:] = field
+
+
+def writeStats(fields, lat, lon, out_path, var_name='u'):
+
+	if out_path.lower().endswith('.nc'):
+		writeStatsNetCDF(fields, lat, lon, out_path, var_name)
+	else:
+		writeStatsGeoTIFF(fields, lat, lon, out_path)
+
+
+def plotMean(lat, lon, Mean, png_path=None, title='Total Mean'):
+
+	# filled contours of the mean field, shown, or written to png_path without a display
+	import matplotlib
+	if png_path is not None:
+		matplotlib.use('Agg')
+	import matplotlib.pyplot as plt
+
+	x, y = np.meshgrid(lon, lat)
+	plt.title(title)
+	CS = plt.contourf(x, y, Mean, 20, cmap=plt.cm.jet)
+	plt.colorbar(CS, drawedges=True)
+	if png_path is None:
+		plt.show()
+	else:
+		plt.savefig(png_path, dpi=150, bbox_inches='tight')
+		plt.close()
+
+
+if __name__ == '__main__':
+
+	prsr = ArgumentParser(description='Mean over time of a gridded NetCDF variable in constant memory')
+	prsr.add_argument('nc_path', nargs='?', default=nc_file, help='gridded NetCDF with time as first dimension')
+	prsr.add_argument('output', nargs='?', default=None, help='output GeoTIFF (.tif) or NetCDF (.nc)')
+	prsr.add_argument('--var', default='u', help='variable to summarize')
+	prsr.add_argument('--level', type=int, default=None, help='index into the second (depth) dimension')
+	prsr.add_argument('--stats', action='store_true', help='also min, max and standard deviation')
+	prsr.add_argument('--chunk_mb', type=float, default=CHUNK_BYTES / 2 ** 20, help='largest chunk (MB) read at once')
+	prsr.add_argument('--plot', nargs='?', const='', default=None, help='plot the mean, to a PNG when a path is given')
+	args = prsr.parse_args()
+
+	running = temporalStats(args.nc_path, args.var, args.level, args.stats, int(args.chunk_mb * 2 ** 20))
+	fields = running.Fields()
+	lat, lon = readLatLon(args.nc_path)
+
+	if fields['mean'].ndim != 2 and (args.output is not None or args.plot is not None):
+		prsr.error('{} has shape {} per time step, select a level with --level'.format(args.var, fields['mean'].shape))
+
+	if args.output is not None:
+		writeStats(fields, lat, lon, args.output, args.var)
+
+	if args.plot is not None:
+		plotMean(lat, lon, fields['mean'], args.plot or None)
@@ -0,0 +1,93 @@
+"""
+Cached coordinate transformations and batch projection for the hurricane scripts.
+
+The scripts used to build a new osr.SpatialReference and CoordinateTransformation for every storm observation,
+format the position as WKT, parse it back into a geometry and transform that one point. Here the transformation
+of every (source, destination) pair is built once per process and whole lon/lat arrays go through a single
+TransformPoints call.
+
+Spatial references can be given as an osr.SpatialReference, a WKT string or an EPSG code.
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
+"""
+
+import numpy as np
+from osgeo import osr
+from arrays import asFloatArray
+
+WGS84_EPSG = 4326
+
+# (source key, destination key) -> osr.CoordinateTransformation
+_TRANSFORMS = {}
+
+
+def GetSpatialRef(srs):
+
+    # osr.SpatialReference from a SpatialReference, WKT string or EPSG code
+    if isinstance(srs, osr.SpatialReference):
+        return srs
+
+    ref = osr.SpatialReference()
+    if isinstance(srs, str):
+        ref.ImportFromWkt(srs)
+    else:
+        ref.ImportFromEPSG(int(srs))
+
+    return ref
+
+
+def _srsKey(srs):
+
+    if isinstance(srs, osr.SpatialReference):
+        return srs.ExportToWkt()
+    if isinstance(srs, str):
+        return srs
+
+    return int(srs)
+
+
+def GetTransform(dst, src=WGS84_EPSG):
+
+    # CoordinateTransformation from src to dst, built on the first request for the pair
+    key = (_srsKey(src), _srsKey(dst))
+    if key not in _TRANSFORMS:
+        _TRANSFORMS[key] = osr.CoordinateTransformation(GetSpatialRef(src), GetSpatialRef(dst))
+
+    return _TRANSFORMS[key]
+
+
+def ProjectPoints(lon, lat, dst, src=WGS84_EPSG):
+    """
+    Project arrays of coordinates in a single TransformPoints call.
+
+    Args:
+        lon: x coordinates in src (longitudes for WGS 1984), list (None for missing) or array
+        lat: y coordinates in src (latitudes for WGS 1984), same length as lon
+        dst: destination spatial reference
+        src: source spatial reference, WGS 1984 by default
+
+    Returns: x, y arrays in dst, nan where lon or lat is missing
+    """
+
+    lon = asFloatArray(lon)
+    lat = asFloatArray(lat)
+    x = np.full(len(lon), np.nan)
+    y = np.full(len(lon), np.nan)
+
+    valid = np.isfinite(lon) & np.isfinite(lat)
+    if valid.any():
+        pts = GetTransform(dst, src).TransformPoints(np.column_stack((lon[valid], lat[valid])).tolist())
+        pts = np.array(pts, dtype=np.float64)
+        x[valid] = pts[:, 0]
+        y[valid] = pts[:, 1]
+
+    return x, y
+
+
+def ProjectPoint(lon, lat, dst, src=WGS84_EPSG):
+
+    # single point through the cached transformation
+    x, y = GetTransform(dst, src).TransformPoint(lon, lat)[:2]
+
+    return x, y
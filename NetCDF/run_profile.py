@@ -0,0 +1,128 @@
+"""
+Counters, stage timers and a throttled progress line for the hurricane runs.
+
+runStatsForStorms used to print a line per storm and per hit, which flooded stdout, slowed the loop and
+measured nothing. A RunProfile is passed through the run instead:
+
+    profile = RunProfile('ver8-ogr')
+    with profile.Stage('read'):
+        ...
+    profile.Count('observations')
+    profile.Progress(i + 1, num_storms)
+    profile.WriteJSON('run_profile.json')
+
+Stage times are wall-clock seconds (time.perf_counter) summed over every entry of the stage. Profiles of
+worker processes are plain data, so they can be returned from a process pool and merged into the parent.
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
+"""
+
+import sys
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# seconds between two updates of the progress line
+PROGRESS_INTERVAL = 1.0
+# characters in the progress bar
+PROGRESS_WIDTH = 30
+
+
+class RunProfile(object):
+
+    def __init__(self, name='', progress=True, stream=None):
+
+        self.name = name
+        self.started = datetime.now()
+        self.stages = {}
+        self.calls = {}
+        self.counters = {}
+        self.progress = progress
+        self.stream = stream
+        self._t0 = time.perf_counter()
+        self._last_progress = None
+
+    def __getstate__(self):
+
+        # the output stream stays in the process that made the profile
+        state = self.__dict__.copy()
+        state['stream'] = None
+        return state
+
+    @contextmanager
+    def Stage(self, name):
+
+        # wall-clock time of the enclosed block, added to the stage
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.AddTime(name, time.perf_counter() - t)
+
+    def AddTime(self, name, seconds, calls=1):
+
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    def Count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def Merge(self, other):
+
+        # add the stage times and counters of another profile, e.g. one returned by a worker
+        for name, seconds in other.stages.items():
+            self.AddTime(name, seconds, other.calls.get(name, 0))
+        for name, n in other.counters.items():
+            self.Count(name, n)
+
+    def Elapsed(self):
+        return time.perf_counter() - self._t0
+
+    def Progress(self, done, total, label='storms'):
+
+        # redraw the progress line at most once every PROGRESS_INTERVAL seconds, and on the last item
+        if not self.progress:
+            return
+        now = time.perf_counter()
+        if done < total and self._last_progress is not None and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+
+        frac = done / total if total else 1.0
+        filled = int(round(frac * PROGRESS_WIDTH))
+        stream = self.stream if self.stream is not None else sys.stderr
+        stream.write('\r[{}{}] {}/{} {} {:.0f}s'.format('#' * filled, '-' * (PROGRESS_WIDTH - filled), done, total,
+                                                       label, now - self._t0))
+        if done >= total:
+            stream.write('\n')
+        stream.flush()
+
+    def Summary(self):
+
+        total = self.Elapsed()
+        stages = {}
+        for name in self.stages:
+            stages[name] = {'seconds': round(self.stages[name], 6), 'calls': self.calls[name],
+                            'share': round(self.stages[name] / total, 4) if total > 0 else 0.0}
+
+        return {'name': self.name, 'started': self.started.isoformat(timespec='seconds'),
+                'elapsed_seconds': round(total, 6), 'stages': stages, 'counters': dict(self.counters)}
+
+    def WriteJSON(self, path):
+
+        with open(path, 'w') as f:
+            json.dump(self.Summary(), f, indent=2)
+
+    def Report(self):
+
+        # short table of the stages, slowest first
+        summary = self.Summary()
+        lines = ['{} finished in {:.2f}s'.format(self.name or 'run', summary['elapsed_seconds'])]
+        for name, s in sorted(summary['stages'].items(), key=lambda kv: -kv[1]['seconds']):
+            lines.append('  {:<18}{:>10.2f}s {:>6.1%} {:>10} calls'.format(name, s['seconds'], s['share'], s['calls']))
+        for name, n in sorted(summary['counters'].items()):
+            lines.append('  {:<18}{:>10}'.format(name, n))
+
+        return '\n'.join(lines)
@@ -0,0 +1,187 @@
+"""
+"All targets within radius r of (x, y)" for batches of storm observations.
+
+The per-platform (Ver8) and gridded (Ver5_ToGeoTIFFs) hurricane scripts both need the targets (platforms or
+grid cell centers) inside the ogr buffer of every storm observation, in projected meters. Both used to build
+an ogr polygon per observation, the first to SetSpatialFilter a platform layer, the second to rasterize it.
+This module answers the same question without ogr:
+
+    PointIndex  KD-tree over scattered targets (platforms)
+    GridIndex   cell centers of a north-up grid, the candidates are the window of the buffer bounding box
+
+Candidates are tested against the same regular polygon that ogr's Geometry.Buffer() builds, so the hits are
+the ones the ogr code paths find.
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# segments per quarter circle of an ogr buffer (the ogr default)
+BUFFER_QUADSEGS = 30
+
+# number of storm observations queried at once
+QUERY_CHUNK_SIZE = 256
+
+# number of candidate grid cells tested at once
+QUERY_CELL_BUDGET = 2 ** 22
+
+# the KD-tree is asked for a slightly larger circle so rounding never drops a target the polygon test keeps
+RADIUS_TOLERANCE = 1e-9
+
+
+def PointsInBuffer(dx, dy, radius, quadsegs=BUFFER_QUADSEGS):
+
+    # the ogr buffer of a point is a regular polygon with 4 * quadsegs vertices, the
+    # first one due east of the point. A point is inside when its distance projected
+    # onto the normal of the nearest edge is within the apothem of the polygon
+    dx, dy, radius = np.broadcast_arrays(dx, dy, radius)
+    step = np.pi / (2 * quadsegs)
+    dist = np.hypot(dx, dy)
+    inside = dist <= radius * np.cos(step / 2)
+    edge = (dist <= radius) & ~inside
+    if edge.any():
+        theta = np.mod(np.arctan2(dy[edge], dx[edge]), step)
+        inside[edge] = dist[edge] * np.cos(theta - step / 2) <= radius[edge] * np.cos(step / 2)
+
+    return inside
+
+
+def _emptyHits():
+    return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+
+class PointIndex(object):
+
+    # KD-tree over projected target coordinates, built once per run
+
+    def __init__(self, x, y):
+
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.tree = cKDTree(np.column_stack((self.x, self.y))) if len(self.x) > 0 else None
+
+    def __len__(self):
+        return len(self.x)
+
+    def QueryRadius(self, x, y, radius, chunk_size=QUERY_CHUNK_SIZE):
+        """
+        Targets inside the buffer of every observation.
+
+        Args:
+            x: array of observation x coordinates
+            y: array of observation y coordinates
+            radius: buffer radius, scalar or one per observation
+            chunk_size: number of observations queried at once
+
+        Returns: observation index and target index of every hit, ordered by observation then target
+        """
+
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        radius = np.broadcast_to(np.asarray(radius, dtype=np.float64), x.shape)
+        if self.tree is None or len(x) == 0:
+            return _emptyHits()
+
+        obs_hits = []
+        target_hits = []
+        for start in range(0, len(x), chunk_size):
+            stop = start + chunk_size
+            candidates = self.tree.query_ball_point(np.column_stack((x[start:stop], y[start:stop])),
+                                                    radius[start:stop] * (1 + RADIUS_TOLERANCE), return_sorted=True)
+            counts = np.fromiter((len(c) for c in candidates), dtype=np.intp, count=len(candidates))
+            if counts.sum() == 0:
+                continue
+
+            o = np.repeat(np.arange(start, start + len(candidates)), counts)
+            t = np.concatenate([np.asarray(c, dtype=np.intp) for c in candidates])
+            keep = PointsInBuffer(self.x[t] - x[o], self.y[t] - y[o], radius[o])
+            obs_hits.append(o[keep])
+            target_hits.append(t[keep])
+
+        if len(obs_hits) == 0:
+            return _emptyHits()
+
+        return np.concatenate(obs_hits), np.concatenate(target_hits)
+
+
+def AxisWindow(centers, lo, hi):
+
+    # start and stop index of the cell centers between lo and hi, centers are sorted either way
+    if centers[0] <= centers[-1]:
+        return np.searchsorted(centers, lo, side='left'), np.searchsorted(centers, hi, side='right')
+
+    n = len(centers)
+    return n - np.searchsorted(centers[::-1], hi, side='right'), n - np.searchsorted(centers[::-1], lo, side='left')
+
+
+class GridIndex(object):
+
+    # cell centers of a north-up grid, x_centers along the columns and y_centers along the rows
+
+    def __init__(self, x_centers, y_centers):
+
+        self.x = np.asarray(x_centers, dtype=np.float64)
+        self.y = np.asarray(y_centers, dtype=np.float64)
+        self.shape = (len(self.y), len(self.x))
+
+    def Cells(self, x, y, radius):
+
+        # (rows, cols) of the cell centers inside the buffer of a single observation
+        r0, r1 = AxisWindow(self.y, y - radius, y + radius)
+        c0, c1 = AxisWindow(self.x, x - radius, x + radius)
+
+        dx, dy = np.broadcast_arrays(self.x[np.newaxis, c0:c1] - x, self.y[r0:r1, np.newaxis] - y)
+        rows, cols = np.nonzero(PointsInBuffer(dx, dy, radius))
+
+        return rows + r0, cols + c0
+
+    def QueryRadius(self, x, y, radius, max_cells=QUERY_CELL_BUDGET):
+        """
+        Cells inside the buffer of every observation.
+
+        Args:
+            x: array of observation x coordinates
+            y: array of observation y coordinates
+            radius: buffer radius, scalar or one per observation
+            max_cells: number of candidate cells tested at once, an observation with a larger window is
+                       tested on its own
+
+        Returns: observation index and flat (row-major) cell index of every hit, ordered by observation then cell
+        """
+
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        radius = np.broadcast_to(np.asarray(radius, dtype=np.float64), x.shape)
+        if len(x) == 0:
+            return _emptyHits()
+
+        # window of the buffer bounding box of every observation, empty where the position is nan
+        r0, r1 = AxisWindow(self.y, y - radius, y + radius)
+        c0, c1 = AxisWindow(self.x, x - radius, x + radius)
+        rows = np.maximum(r1 - r0, 0)
+        cols = np.maximum(c1 - c0, 0)
+        ends = np.cumsum(rows * cols)
+
+        obs_hits = []
+        cell_hits = []
+        start = 0
+        while start < len(x):
+            # observations whose windows add up to at most max_cells candidates, at least one
+            first = ends[start - 1] if start > 0 else 0
+            stop = max(int(np.searchsorted(ends, first + max_cells, side='right')), start + 1)
+            sizes = rows[start:stop] * cols[start:stop]
+
+            # every candidate cell of every window, row by row
+            o = np.repeat(np.arange(start, stop), sizes)
+            k = np.arange(len(o)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+            row = r0[o] + k // cols[o]
+            col = c0[o] + k % cols[o]
+            keep = PointsInBuffer(self.x[col] - x[o], self.y[row] - y[o], radius[o])
+            obs_hits.append(o[keep])
+            cell_hits.append(row[keep] * self.shape[1] + col[keep])
+            start = stop
+
+        return np.concatenate(obs_hits), np.concatenate(cell_hits)
@@ -0,0 +1,72 @@
+"""
+Storm category codes from the Saffir-Simpson category (usa_sshs) or the maximum sustained wind (usa_wind).
+
+    code   name       usa_sshs   usa_wind (kts)   fixed radius (m)
+     -1    -          < 0, > 5   < 34             -
+      0    tropical   0          34 - 63          100,000
+      1    C1         1          64 - 82          300,000
+      2    C2         2          83 - 95          300,000
+      3    C3         3          96 - 112         450,000
+      4    C4         4          113 - 136        450,000
+      5    C5         5          137+             450,000
+
+The wind speed is only used when usa_sshs is missing. The hurricane scripts used to walk this table as a
+chain of if statements per observation and then compare the category strings again in the accumulators.
+categoryCodes maps whole arrays at once and the accumulators are indexed by the code.
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
+"""
+
+from bisect import bisect_right
+import numpy as np
+from arrays import asFloatArray
+
+CATEGORIES = ['tropical', 'C1', 'C2', 'C3', 'C4', 'C5']
+NO_CATEGORY = -1
+
+# usa_wind (kts) where each category starts
+WIND_THRESHOLDS = [34, 64, 83, 96, 113, 137]
+
+# buffer radius (m) per category used by the scripts before the Nederhoff RMW
+CATEGORY_RADII = [100000, 300000, 300000, 450000, 450000, 450000]
+
+# usa_sshs value -> code, anything else is NO_CATEGORY
+SSHS_CODES = {k: k for k in range(len(CATEGORIES))}
+
+
+def categoryCodes(sshs, wind):
+    """
+    Category codes of arrays of observations.
+
+    Args:
+        sshs: usa_sshs values, list (None for missing) or masked array
+        wind: usa_wind values (kts), same length as sshs
+
+    Returns: int8 array of codes, NO_CATEGORY where the observation has no category
+    """
+
+    sshs = asFloatArray(sshs)
+    wind = asFloatArray(wind)
+
+    from_sshs = np.where(np.isin(sshs, list(SSHS_CODES)), sshs, NO_CATEGORY)
+    from_wind = np.where(np.isfinite(wind), np.digitize(wind, WIND_THRESHOLDS) - 1, NO_CATEGORY)
+
+    return np.where(np.isnan(sshs), from_wind, from_sshs).astype(np.int8)
+
+
+def categoryCode(sshs, wind):
+
+    # category code of a single observation, see categoryCodes
+    if sshs is not None:
+        return SSHS_CODES.get(sshs, NO_CATEGORY)
+    if wind is None or wind != wind:
+        return NO_CATEGORY
+
+    return bisect_right(WIND_THRESHOLDS, float(wind)) - 1
+
+
+def categoryName(code):
+
+    # category string of a code, None for NO_CATEGORY
+    return CATEGORIES[code] if code != NO_CATEGORY else None
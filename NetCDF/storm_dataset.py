@@ -0,0 +1,134 @@
+"""
+Several storm NetCDFs (e.g. the per-year IBTrACS archives) presented as one dataset.
+
+The older hurricane scripts walked iglob('*.nc') serially and opened every file twice, once per variable to
+find the global lat/lon minima (GetNC_Min) and once more to process it. StormDataset reads the files in a
+process pool, one file per task, and stacks their storms in file order:
+
+    ds = StormDataset(sorted(glob(pattern)), ['usa_lat', 'usa_lon', 'iso_time', ...], workers=4)
+    ds.variables['usa_lat']         (storm, date_time) masked array over all files
+    len(ds.dimensions['storm'])     total number of storms
+    ds.extents['usa_lat']           (min, max) over all files, taken while the file was read
+
+variables and dimensions behave like those of a netCDF4.Dataset for the slicing the scripts do
+(variable[i:i + 1].tolist()[0], len(dimensions['storm'])), so the per-storm loops run unchanged over one
+concatenated observation stream. Files with a shorter date_time dimension are padded with masked values.
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import netCDF4
+
+
+class Dimension(object):
+
+    # the part of netCDF4.Dimension the scripts use
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+
+def readStormFile(path, names):
+    """
+    Read whole variables of one storm NetCDF.
+
+    Args:
+        path: storm NetCDF
+        names: variable names
+
+    Returns: dictionaries of name -> masked array, name -> dimension names and name -> (min, max) of the
+             numeric variables
+    """
+
+    variables = {}
+    dims = {}
+    extents = {}
+    with netCDF4.Dataset(path, 'r') as ds:
+        for name in names:
+            arr = np.ma.asarray(ds.variables[name][:])
+            variables[name] = arr
+            dims[name] = ds.variables[name].dimensions
+            if arr.dtype.kind in 'iuf' and arr.count() > 0:
+                extents[name] = (arr.min(), arr.max())
+
+    return variables, dims, extents
+
+
+def padSteps(arr, num_steps):
+
+    # pad the date_time (second) axis to num_steps with masked values
+    arr = np.ma.asarray(arr)
+    missing = num_steps - arr.shape[1]
+    if missing == 0:
+        return arr
+
+    pad = np.ma.masked_all((arr.shape[0], missing) + arr.shape[2:], dtype=arr.dtype)
+
+    return np.ma.concatenate([arr, pad], axis=1)
+
+
+def mergeExtents(extents):
+
+    merged = {}
+    for ext in extents:
+        for name, (lo, hi) in ext.items():
+            if name in merged:
+                lo = min(lo, merged[name][0])
+                hi = max(hi, merged[name][1])
+            merged[name] = (lo, hi)
+
+    return merged
+
+
+class StormDataset(object):
+
+    def __init__(self, paths, names, workers=1):
+        """
+        Args:
+            paths: storm NetCDFs, their storms are stacked in this order
+            names: variables to read, all with storm as first dimension
+            workers: processes reading files, 0 for one per core
+        """
+
+        self.paths = list(paths)
+        if len(self.paths) == 0:
+            raise ValueError('no storm NetCDFs given')
+        workers = workers if workers > 0 else os.cpu_count()
+
+        if workers > 1 and len(self.paths) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(self.paths))) as executor:
+                parts = list(executor.map(readStormFile, self.paths, [names] * len(self.paths)))
+        else:
+            parts = [readStormFile(p, names) for p in self.paths]
+
+        # storms of every file, and the file each storm came from
+        sizes = [len(v[names[0]]) for v, _, _ in parts]
+        self.storm_file = np.repeat(np.arange(len(self.paths)), sizes)
+
+        # longest date_time dimension of all files
+        timed = [n for n in names if parts[0][1][n][1:2] == ('date_time',)]
+        num_steps = max([v[n].shape[1] for v, _, _ in parts for n in timed] + [0])
+
+        self.variables = {}
+        for name in names:
+            arrs = [v[name] for v, _, _ in parts]
+            if name in timed:
+                arrs = [padSteps(a, num_steps) for a in arrs]
+            self.variables[name] = np.ma.concatenate(arrs, axis=0)
+
+        self.dimensions = {'storm': Dimension('storm', int(sum(sizes))),
+                           'date_time': Dimension('date_time', num_steps)}
+        self.extents = mergeExtents(e for _, _, e in parts)
+
+    def Min(self, name):
+
+        # global minimum of a numeric variable, what GetNC_Min computed with one pass per file
+        return self.extents[name][0]
@@ -0,0 +1,522 @@
+"""
+Flat table of IBTrACS storm observations.
+
+The hurricane scripts used to slice the NetCDF one storm at a time (c_lat[i:i+1].tolist()) and decode
+iso_time, subbasin and sid character by character inside the observation loop. This module reads the
+variables in bulk, decodes the char arrays in one pass and keeps one row per observation, in storm order:
+
+    storm, step, sid, time (datetime64[s]), days, lat, lon, sshs, wind, gust, pres, seahgt, subbasin
+
+days is the time each observation stands for, from the gaps to its neighbours on the storm track.
+
+Numeric columns keep their netCDF dtype and mask, so .tolist() still gives None for missing values.
+The table is cached next to the NetCDF as an .npz sidecar keyed by the file's mtime and size, so
+repeat runs skip the NetCDF parsing entirely.
+
+StormChunks reads a file in chunks of whole storms instead, for archives too large to hold as one table.
+interpolateTracks adds points between the observations of every storm, so a fast storm cannot skip over a
+platform or grid cell between two fixes.
+
+Query() selects observations by bounding box, subbasin, date window and minimum category. It goes through
+a time-sorted index and a coarse lat/lon grid index (both stored in the sidecar), so a narrow window over
+a multi-decade archive only touches the observations in that window.
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
+"""
+
+import os
+import hashlib
+import numpy as np
+import netCDF4
+from char_arrays import decodeChars, decodeTimes
+from storm_category import categoryCodes
+
+# column name -> IBTrACS v04 variable name
+NUMERIC_VARIABLES = {
+    'lat': 'usa_lat',
+    'lon': 'usa_lon',
+    'sshs': 'usa_sshs',
+    'wind': 'usa_wind',
+    'gust': 'usa_gust',
+    'pres': 'usa_pres',
+    'seahgt': 'usa_seahgt',
+}
+TIME_VARIABLE = 'iso_time'
+SID_VARIABLE = 'sid'
+SUBBASIN_VARIABLE = 'subbasin'
+
+CACHE_SUFFIX = '.obs.npz'
+# bump when the layout of the cached table changes
+CACHE_VERSION = 5
+
+# size (degrees) of the cells of the lat/lon grid index
+GRID_CELL_SIZE = 1.0
+
+SECONDS_PER_DAY = 86400.0
+
+# columns interpolated linearly in time by interpolateTracks, the others come from the nearer observation
+INTERPOLATED_COLUMNS = ['lat', 'lon', 'wind', 'pres', 'gust', 'seahgt']
+
+# default memory ceiling (bytes) of one StormChunks chunk
+MAX_CHUNK_BYTES = 256 * 2 ** 20
+
+
+class StormObservations(object):
+
+    COLUMNS = ['storm', 'step', 'sid', 'time', 'days', 'subbasin'] + list(NUMERIC_VARIABLES)
+
+    def __init__(self, columns, source=None, indexes=None):
+
+        self.columns = columns
+        self.source = source
+        # time_order, grid_order, grid_cells; built on first use
+        self.indexes = {} if indexes is None else indexes
+
+    def __len__(self):
+        return len(self.columns['time'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def Take(self, indx):
+
+        # new table with the rows in indx (boolean mask or integer indices)
+        return StormObservations({k: v[indx] for k, v in self.columns.items()}, self.source)
+
+    def Digest(self, indx, columns=None):
+
+        # sha1 of the given rows, used to check that a checkpoint still matches the data
+        sha = hashlib.sha1()
+        for name in columns if columns is not None else self.COLUMNS:
+            if name not in self.columns:
+                continue
+            col = self.columns[name][indx]
+            sha.update(name.encode())
+            sha.update(np.ascontiguousarray(np.ma.getdata(col)).tobytes())
+            sha.update(np.ascontiguousarray(np.ma.getmaskarray(col)).tobytes())
+
+        return sha.hexdigest()
+
+    def Years(self):
+        return self.columns['time'].astype('datetime64[Y]').astype(np.int64) + 1970
+
+
+    def BuildIndexes(self):
+
+        # rows sorted by time, and the times in that order for the window searches
+        self.indexes['time_order'] = np.argsort(self.columns['time'], kind='stable')
+        self.indexes['time_sorted'] = self.columns['time'][self.indexes['time_order']]
+
+        # rows sorted by grid cell, masked positions go to cell -1 and are never queried
+        cells = gridCells(self.columns['lat'], self.columns['lon'])
+        self.indexes['grid_order'] = np.argsort(cells, kind='stable')
+        self.indexes['grid_cells'] = cells[self.indexes['grid_order']]
+
+    def TimeRows(self, start=None, stop=None):
+
+        # rows with start <= time <= stop, in time order
+        if 'time_sorted' not in self.indexes:
+            self.BuildIndexes()
+        order = self.indexes['time_order']
+        sorted_time = self.indexes['time_sorted']
+        lo = 0 if start is None else np.searchsorted(sorted_time, np.datetime64(start, 's'), side='left')
+        hi = len(order) if stop is None else np.searchsorted(sorted_time, np.datetime64(stop, 's'), side='right')
+
+        return order[lo:hi]
+
+    def GridRows(self, bbox):
+
+        # rows in the grid cells overlapping bbox = (west, south, east, north), across the antimeridian when
+        # west > east
+        if 'grid_order' not in self.indexes:
+            self.BuildIndexes()
+        west, south, east, north = bbox
+        if west > east:
+            return np.concatenate([self.GridRows((west, south, 180.0, north)),
+                                   self.GridRows((-180.0, south, east, north))])
+        row0, col0 = gridRowCol(south, west)
+        row1, col1 = gridRowCol(north, east)
+
+        # cells of one grid row are contiguous codes, so each row is one range of the sorted index
+        rows = np.arange(row0, row1 + 1)
+        lo = np.searchsorted(self.indexes['grid_cells'], rows * GRID_COLUMNS + col0, side='left')
+        hi = np.searchsorted(self.indexes['grid_cells'], rows * GRID_COLUMNS + col1, side='right')
+        order = self.indexes['grid_order']
+
+        return np.concatenate([order[a:b] for a, b in zip(lo, hi)] + [np.empty(0, dtype=order.dtype)])
+
+    def Query(self, bbox=None, subbasins=None, start=None, stop=None, min_category=None):
+        """
+        Indices of the observations matching every given condition.
+
+        Args:
+            bbox: (west, south, east, north) in degrees (0-360 longitudes are accepted), a box with west > east
+                  crosses the antimeridian
+            subbasins: iterable of subbasin codes, e.g. ['GM']
+            start: first datetime of the window (inclusive)
+            stop: last datetime of the window (inclusive)
+            min_category: minimum category code (see storm_category), from usa_sshs or, where that is missing,
+                          usa_wind; observations without either never match
+
+        Returns: sorted array of row indices, i.e. in storm and time order
+        """
+
+        if bbox is not None and max(bbox[0], bbox[2]) > 180:
+            bbox = (normalizeLon(bbox[0]), bbox[1], normalizeLon(bbox[2]), bbox[3])
+
+        rows = None
+        if start is not None or stop is not None:
+            rows = self.TimeRows(start, stop)
+        if bbox is not None:
+            grid_rows = self.GridRows(bbox)
+            if rows is None or len(grid_rows) < len(rows):
+                rows = grid_rows
+
+        if rows is None:
+            rows = np.arange(len(self))
+
+        # exact checks on the candidates only
+        keep = np.ones(len(rows), dtype=bool)
+        if start is not None:
+            keep &= self.columns['time'][rows] >= np.datetime64(start, 's')
+        if stop is not None:
+            keep &= self.columns['time'][rows] <= np.datetime64(stop, 's')
+        if bbox is not None:
+            west, south, east, north = bbox
+            lat = self.columns['lat'][rows]
+            lon = normalizeLon(self.columns['lon'][rows])
+            in_lon = (lon >= west) | (lon <= east) if west > east else (lon >= west) & (lon <= east)
+            keep &= np.ma.filled((lat >= south) & (lat <= north) & in_lon, False)
+        if subbasins is not None:
+            keep &= np.isin(self.columns['subbasin'][rows], list(subbasins))
+        if min_category is not None:
+            wind = self.columns['wind'][rows] if 'wind' in self.columns else np.ma.masked_all(len(rows))
+            keep &= categoryCodes(self.columns['sshs'][rows], wind) >= min_category
+
+        return np.sort(rows[keep])
+
+    def Save(self, path, **meta):
+
+        arrays = {'_meta_' + k: np.asarray(v) for k, v in meta.items()}
+        for k, v in self.indexes.items():
+            arrays['_index_' + k] = v
+        for k, v in self.columns.items():
+            arrays[k] = np.ma.getdata(v)
+            if isinstance(v, np.ma.MaskedArray):
+                arrays['_mask_' + k] = np.ma.getmaskarray(v)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def Load(cls, path, source=None):
+
+        columns = {}
+        indexes = {}
+        meta = {}
+        with np.load(path) as npz:
+            for k in npz.files:
+                if k.startswith('_meta_'):
+                    meta[k[len('_meta_'):]] = npz[k].item()
+                elif k.startswith('_index_'):
+                    indexes[k[len('_index_'):]] = npz[k]
+                elif not k.startswith('_mask_'):
+                    columns[k] = npz[k]
+            for k in list(columns):
+                if '_mask_' + k in npz.files:
+                    columns[k] = np.ma.masked_array(columns[k], mask=npz['_mask_' + k])
+
+        return cls(columns, source, indexes), meta
+
+
+GRID_COLUMNS = int(np.ceil(360 / GRID_CELL_SIZE))
+
+
+def observationDays(storm, time):
+    """
+    Days each observation stands for, from the time to its neighbours on the track of the same storm.
+
+    An observation covers half the gap to the previous and half the gap to the next observation of its storm.
+    The first and last observation of a track have a gap on one side only and cover half of it, and a storm
+    with a single observation covers 0 days, so the days of a track add up to the time from its first to its
+    last observation whatever the time step of the data (3-hourly for v04, 6-hourly before).
+
+    Args:
+        storm: storm number of every observation
+        time: datetime64 of every observation, NaT observations cover 0 days and are skipped
+
+    Returns: float64 array of days
+    """
+
+    storm = np.asarray(storm)
+    time = np.asarray(time, dtype='datetime64[s]')
+    days = np.zeros(len(time))
+
+    # valid observations sorted by storm and time
+    valid = np.flatnonzero(~np.isnat(time))
+    order = valid[np.lexsort((time[valid], storm[valid]))]
+    gaps = np.diff(time[order]).astype(np.int64) / SECONDS_PER_DAY
+    same = storm[order][1:] == storm[order][:-1]
+
+    before = np.zeros(len(order))
+    after = np.zeros(len(order))
+    before[1:] = np.where(same, gaps, 0)
+    after[:-1] = np.where(same, gaps, 0)
+
+    days[order] = (before + after) / 2
+
+    return days
+
+
+def interpolateTracks(obs, interval):
+    """
+    Storm tracks resampled so consecutive observations of a storm are at most interval apart.
+
+    The gap between two observations of a storm is split into equal parts no longer than interval and a point is
+    added at every split. lat, lon, wind, pres, gust and seahgt are interpolated linearly in time (lon across the
+    antimeridian the short way) and are masked where either end is missing. The other columns, sshs and subbasin
+    among them, come from the nearer of the two observations. The original observations are kept unchanged,
+    except for their days, which are recomputed for the new spacing.
+
+    Args:
+        obs: StormObservations
+        interval: longest time between two points of a track, numpy timedelta64 or seconds
+
+    Returns: StormObservations sorted by storm and time, interpolated columns as float64
+    """
+
+    seconds = interval / np.timedelta64(1, 's') if isinstance(interval, np.timedelta64) else float(interval)
+    if seconds <= 0:
+        raise ValueError('interval must be positive')
+
+    order = np.lexsort((obs['time'], obs['storm']))
+    storm = obs['storm'][order]
+    time = obs['time'][order]
+
+    # parts between every observation and the next one of its storm, 1 for the last observation of a storm
+    gaps = np.zeros(len(order), dtype=np.int64)
+    gaps[:-1] = np.where(storm[1:] == storm[:-1], np.diff(time).astype(np.int64), 0)
+    parts = np.maximum(np.ceil(gaps / seconds), 1).astype(np.int64)
+
+    # every point is part k of parts[start] between observation start and the next one
+    start = np.repeat(np.arange(len(order)), parts)
+    k = np.arange(len(start)) - np.repeat(np.cumsum(parts) - parts, parts)
+    frac = k / parts[start]
+    end = np.minimum(start + 1, len(order) - 1)
+    nearest = np.where(frac <= 0.5, start, end)
+
+    columns = {}
+    for name, col in obs.columns.items():
+        col = col[order]
+        if name in INTERPOLATED_COLUMNS:
+            a = np.ma.asarray(col).astype(np.float64)[start]
+            b = np.ma.asarray(col).astype(np.float64)[end]
+            d = normalizeLon(b - a) if name == 'lon' else b - a
+            columns[name] = np.ma.where(frac == 0, a, a + frac * d)
+        elif name in ('storm', 'step', 'sid'):
+            columns[name] = col[start]
+        else:
+            columns[name] = col[nearest]
+
+    columns['lon'] = np.ma.where(frac == 0, columns['lon'], normalizeLon(columns['lon']))
+    columns['time'] = time[start] + np.rint(frac * gaps[start]).astype('timedelta64[s]')
+    columns['days'] = observationDays(columns['storm'], columns['time'])
+
+    return StormObservations(columns, obs.source)
+
+
+def normalizeLon(lon):
+
+    # longitudes in [-180, 180)
+    return np.mod(np.add(lon, 180), 360) - 180
+
+
+def gridRowCol(lat, lon):
+
+    row = int(np.floor((np.clip(lat, -90, 90) + 90) / GRID_CELL_SIZE))
+    col = int(np.floor((normalizeLon(lon) + 180) / GRID_CELL_SIZE)) if lon < 180 else GRID_COLUMNS - 1
+
+    return row, col
+
+
+def gridCells(lat, lon):
+
+    # grid cell code (row * GRID_COLUMNS + col) of every observation, -1 where lat or lon is missing
+    row = np.floor((np.clip(np.ma.filled(lat.astype(np.float64), 0), -90, 90) + 90) / GRID_CELL_SIZE)
+    col = np.floor((normalizeLon(np.ma.filled(lon.astype(np.float64), 0)) + 180) / GRID_CELL_SIZE)
+    cells = (row * GRID_COLUMNS + col).astype(np.int64)
+    cells[np.ma.getmaskarray(lat) | np.ma.getmaskarray(lon)] = -1
+
+    return cells
+
+
+def readStormSlab(ds, start, stop, variables=NUMERIC_VARIABLES, source=None):
+    """
+    Observations of storms start..stop-1 of an open IBTrACS NetCDF, one hyperslab per variable.
+
+    Args:
+        ds: open netCDF4.Dataset
+        start: first storm
+        stop: storm after the last one
+        variables: dictionary of column name -> netCDF variable name for the numeric columns
+        source: path recorded in the table
+
+    Returns: StormObservations, storm numbers counted from the start of the file
+    """
+
+    names = [TIME_VARIABLE, SID_VARIABLE, SUBBASIN_VARIABLE] + list(variables.values())
+
+    return tableFromArrays({name: ds.variables[name][start:stop] for name in names}, variables, source, start)
+
+
+def tableFromArrays(arrays, variables=NUMERIC_VARIABLES, source=None, first_storm=0):
+    """
+    StormObservations from (storm, date_time) arrays laid out like the IBTrACS variables, e.g. the
+    variables of a storm_dataset.StormDataset. Slots without an iso_time are dropped.
+
+    Args:
+        arrays: dictionary of netCDF variable name -> array, char variables as S1 arrays
+        variables: dictionary of column name -> netCDF variable name for the numeric columns
+        source: path recorded in the table
+        first_storm: storm number of the first row of the arrays
+
+    Returns: StormObservations
+    """
+
+    time = decodeTimes(arrays[TIME_VARIABLE])
+    num_storms, num_steps = time.shape
+    time = time.reshape(-1)
+    valid = ~np.isnat(time)
+
+    columns = {}
+    storm = np.repeat(np.arange(num_storms, dtype=np.int32), num_steps)[valid]
+    columns['storm'] = storm + np.int32(first_storm)
+    columns['step'] = np.tile(np.arange(num_steps, dtype=np.int32), num_storms)[valid]
+    columns['sid'] = decodeChars(arrays[SID_VARIABLE])[storm]
+    columns['time'] = time[valid]
+    columns['days'] = observationDays(columns['storm'], columns['time'])
+    columns['subbasin'] = decodeChars(arrays[SUBBASIN_VARIABLE]).reshape(-1)[valid]
+
+    for name, var in variables.items():
+        columns[name] = np.ma.asarray(arrays[var]).reshape(-1)[valid]
+
+    return StormObservations(columns, source)
+
+
+def readStormObservations(nc_path, variables=NUMERIC_VARIABLES):
+    """
+    Read an IBTrACS NetCDF into a StormObservations table, dropping slots without an iso_time.
+
+    Args:
+        nc_path: path to the storm NetCDF
+        variables: dictionary of column name -> netCDF variable name for the numeric columns
+
+    Returns: StormObservations
+    """
+
+    with netCDF4.Dataset(nc_path, 'r') as ds:
+        return readStormSlab(ds, 0, len(ds.dimensions['storm']), variables, nc_path)
+
+
+def stormBytes(ds, variables=NUMERIC_VARIABLES):
+
+    # bytes one storm takes while its slab is read and turned into table rows: values and mask of every
+    # variable, the unicode copy of the char arrays, and the table columns copied from them
+    total = 0
+    for name in list(variables.values()) + [TIME_VARIABLE, SID_VARIABLE, SUBBASIN_VARIABLE]:
+        var = ds.variables[name]
+        n = int(np.prod(var.shape[1:]))
+        total += n * (var.dtype.itemsize + 1)
+        if var.dtype.kind == 'S':
+            total += n * 4
+
+    return 2 * total
+
+
+class StormChunks(object):
+    """
+    IBTrACS NetCDF read in chunks of whole storms, for files too large to hold as one table
+    (e.g. IBTrACS.ALL.v04r00.nc):
+
+        for start, stop, obs in StormChunks(nc_path, max_bytes=256 * 2 ** 20):
+            ...
+
+    Every chunk is one contiguous hyperslab [start:stop] per variable. Its size follows from max_bytes and
+    the bytes one storm takes (stormBytes), unless storms_per_chunk is given. Chunks are read when iterated
+    and never cached.
+    """
+
+    def __init__(self, nc_path, max_bytes=MAX_CHUNK_BYTES, storms_per_chunk=None, variables=NUMERIC_VARIABLES):
+
+        self.nc_path = nc_path
+        self.variables = variables
+        with netCDF4.Dataset(nc_path, 'r') as ds:
+            self.num_storms = len(ds.dimensions['storm'])
+            self.storm_bytes = stormBytes(ds, variables)
+
+        if storms_per_chunk is None:
+            storms_per_chunk = int(max_bytes // self.storm_bytes)
+        self.storms_per_chunk = max(1, storms_per_chunk)
+
+    def __len__(self):
+        return -(-self.num_storms // self.storms_per_chunk)
+
+    def __iter__(self):
+
+        with netCDF4.Dataset(self.nc_path, 'r') as ds:
+            for start in range(0, self.num_storms, self.storms_per_chunk):
+                stop = min(start + self.storms_per_chunk, self.num_storms)
+                yield start, stop, readStormSlab(ds, start, stop, self.variables, self.nc_path)
+
+
+def cachePath(nc_path, cache_dir=None):
+
+    if cache_dir is None:
+        return nc_path + CACHE_SUFFIX
+
+    return os.path.join(cache_dir, os.path.basename(nc_path) + CACHE_SUFFIX)
+
+
+def loadStormObservations(nc_path, variables=NUMERIC_VARIABLES, cache=True, cache_dir=None):
+    """
+    StormObservations for nc_path, read from the .npz sidecar when it is up to date.
+
+    Args:
+        nc_path: path to the storm NetCDF
+        variables: dictionary of column name -> netCDF variable name for the numeric columns
+        cache: read and write the sidecar
+        cache_dir: folder for the sidecar, defaults to the folder of the NetCDF
+
+    Returns: StormObservations
+    """
+
+    if not cache:
+        return readStormObservations(nc_path, variables)
+
+    st = os.stat(nc_path)
+    key = {'mtime': st.st_mtime_ns, 'size': st.st_size, 'version': CACHE_VERSION,
+           'variables': ';'.join('{}={}'.format(k, v) for k, v in sorted(variables.items()))}
+
+    path = cachePath(nc_path, cache_dir)
+    if os.path.exists(path):
+        try:
+            obs, meta = StormObservations.Load(path, nc_path)
+        except (OSError, ValueError, KeyError):
+            meta = None
+        if meta == key:
+            return obs
+
+    obs = readStormObservations(nc_path, variables)
+    obs.BuildIndexes()
+
+    try:
+        # write to a temporary name first so an interrupted run never leaves a half written cache
+        tmp = path + '.tmp.npz'
+        obs.Save(tmp, **key)
+        os.replace(tmp, path)
+    except OSError:
+        print('Could not write observation cache: {}'.format(path))
+
+    return obs
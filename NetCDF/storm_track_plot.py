@@ -0,0 +1,255 @@
+"""
+Storm tracks of a whole observation table drawn in one go, rendered to PNG without a display.
+
+Plot ALL Storm Paths.py walks the NetCDF one storm at a time, appends the points of every category to
+lists in a Storm object and makes a Basemap plot and four scatter calls per storm, so a figure of many
+seasons means thousands of artists. Here the rows are selected with array masks on a StormObservations
+table, every segment between two consecutive observations of a storm goes into one LineCollection coloured
+by category, and the points go into one scatter:
+
+    obs = loadStormObservations(nc_path)
+    plotStormTracks(obs, 'gulf_1970_2019.png', subbasins=['GM'], years=range(1970, 2020))
+
+Categories follow the usa_wind (kts) bins of the old scripts: weak < 34, tropical 34 - 63, Cat 1-3 64 - 112,
+Cat 4-5 113+. Observations without a wind speed or position are left out. With Basemap installed the
+tracks are drawn on its Lambert conformal map, otherwise on plain lon/lat axes.
+
+Developed by: Alec Dyer
+alec.dyer@netl.doe.gov
+"""
+
+import os
+from argparse import ArgumentParser
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+from storm_observations import loadStormObservations, normalizeLon
+
+# usa_wind (kts) where each track category starts
+TRACK_WIND_THRESHOLDS = [34, 64, 113]
+TRACK_LABELS = ['Weak', 'Tropical', 'Cat 1-3', 'Cat 4-5']
+TRACK_COLORS = ['springgreen', 'c', 'darkorange', 'maroon']
+
+# (west, south, east, north) of the Gulf of Mexico map of the old scripts
+GULF_BBOX = (-98.0, 17.0, -80.0, 31.0)
+
+# margin (degrees) around the tracks when no bbox is given
+BBOX_MARGIN = 2.0
+
+
+def trackCategories(wind):
+
+    # index into TRACK_LABELS of every observation, -1 where the wind speed is missing
+    wind = np.ma.asarray(wind).astype(np.float64)
+    codes = np.digitize(np.ma.filled(wind, 0.0), TRACK_WIND_THRESHOLDS)
+
+    return np.where(np.ma.getmaskarray(wind), -1, codes)
+
+
+def trackRows(obs, subbasins=None, years=None, bbox=None):
+    """
+    Rows of the observations to draw.
+
+    Args:
+        obs: StormObservations
+        subbasins: iterable of subbasin codes, e.g. ['GM'], None for all
+        years: iterable of years, None for all
+        bbox: (west, south, east, north) in degrees, None for everywhere
+
+    Returns: boolean mask over the rows of obs
+    """
+
+    keep = np.zeros(len(obs), dtype=bool)
+    keep[obs.Query(bbox=bbox, subbasins=subbasins)] = True
+    if years is not None:
+        keep &= np.isin(obs.Years(), list(years))
+
+    # a point needs a position and a category
+    keep &= ~np.ma.getmaskarray(obs['lat']) & ~np.ma.getmaskarray(obs['lon'])
+    keep &= trackCategories(obs['wind']) >= 0
+
+    return keep
+
+
+def trackSegments(obs, keep, x, y):
+    """
+    Line segments between consecutive kept observations of the same storm.
+
+    Args:
+        obs: StormObservations in storm and time order
+        keep: boolean mask of the rows to draw
+        x, y: plot coordinates of every row
+
+    Returns: (n, 2, 2) array of segments and the row each segment starts at
+    """
+
+    storm = obs['storm']
+    start = np.nonzero(keep[:-1] & keep[1:] & (storm[:-1] == storm[1:]))[0]
+
+    # a segment across the antimeridian would be drawn across the whole map
+    lon = normalizeLon(np.ma.getdata(obs['lon']).astype(np.float64))
+    start = start[np.abs(lon[start + 1] - lon[start]) <= 180]
+
+    segments = np.empty((len(start), 2, 2))
+    segments[:, 0, 0] = x[start]
+    segments[:, 0, 1] = y[start]
+    segments[:, 1, 0] = x[start + 1]
+    segments[:, 1, 1] = y[start + 1]
+
+    return segments, start
+
+
+def tracksBBox(obs, keep):
+
+    # extent of the kept observations plus a margin
+    lat = np.ma.getdata(obs['lat'])[keep]
+    lon = normalizeLon(np.ma.getdata(obs['lon'])[keep].astype(np.float64))
+    if len(lat) == 0:
+        return GULF_BBOX
+
+    return (lon.min() - BBOX_MARGIN, lat.min() - BBOX_MARGIN, lon.max() + BBOX_MARGIN, lat.max() + BBOX_MARGIN)
+
+
+def mapAxes(fig, bbox, basemap=True):
+
+    # axes and lon/lat -> plot coordinates function, Basemap when it can be imported
+    ax = fig.add_subplot(1, 1, 1)
+    west, south, east, north = bbox
+    if basemap:
+        try:
+            from mpl_toolkits.basemap import Basemap
+        except ImportError:
+            basemap = False
+
+    if not basemap:
+        ax.set_xlim(west, east)
+        ax.set_ylim(south, north)
+        ax.set_aspect('equal')
+        ax.set_xlabel('Longitude')
+        ax.set_ylabel('Latitude')
+        return ax, lambda lon, lat: (lon, lat)
+
+    m = Basemap(llcrnrlon=west, llcrnrlat=south, urcrnrlon=east, urcrnrlat=north,
+                projection='lcc', lat_0=(south + north) / 2, lon_0=(west + east) / 2,
+                resolution='l', area_thresh=1000., ax=ax)
+    # draw coastlines and meridians
+    m.drawcoastlines()
+    m.drawlsmask(land_color='#827d7c', ocean_color='#8dcef9', lakes=True)
+    m.drawparallels(np.arange(-90, 90, 5), labels=[1, 1, 0, 0])
+    m.drawmeridians(np.arange(-180, 180, 5), labels=[0, 0, 0, 1])
+
+    return ax, m
+
+
+def plotStormTracks(obs, png_path, subbasins=None, years=None, bbox=None, title=None, basemap=True,
+                    dpi=150, size=(12, 9)):
+    """
+    All storm tracks of a selection of an observation table drawn on one figure and written to a PNG.
+
+    Args:
+        obs: StormObservations
+        png_path: output PNG
+        subbasins: iterable of subbasin codes, None for all
+        years: iterable of years, None for all
+        bbox: (west, south, east, north) of the map and the selection, None to fit the tracks
+        title: figure title
+        basemap: draw on a Basemap map when Basemap is installed
+        dpi: resolution of the PNG
+        size: figure size (inches)
+
+    Returns: number of storms drawn
+    """
+
+    keep = trackRows(obs, subbasins, years, bbox)
+    if bbox is None:
+        bbox = tracksBBox(obs, keep)
+
+    fig = Figure(figsize=size)
+    FigureCanvasAgg(fig)
+    ax, project = mapAxes(fig, bbox, basemap)
+
+    # project every row in one call, rows that are not kept are never drawn
+    lon = normalizeLon(np.ma.getdata(obs['lon']).astype(np.float64))
+    x, y = project(lon, np.ma.getdata(obs['lat']).astype(np.float64))
+    x = np.asarray(x)
+    y = np.asarray(y)
+    codes = trackCategories(obs['wind'])
+    colors = np.array(TRACK_COLORS)
+
+    segments, start = trackSegments(obs, keep, x, y)
+    ax.add_collection(LineCollection(segments, colors=colors[codes[start]], linewidths=1.0, zorder=2))
+
+    rows = np.nonzero(keep)[0]
+    ax.scatter(x[rows], y[rows], c=colors[codes[rows]], s=12, edgecolors='black', linewidths=0.3, zorder=3)
+
+    handles = [Line2D([], [], marker='o', linestyle='-', color=c, markeredgecolor='black', label=l)
+               for l, c in zip(TRACK_LABELS, TRACK_COLORS)]
+    ax.legend(handles=handles, loc='upper right')
+    if title is not None:
+        ax.set_title(title)
+
+    fig.savefig(png_path, dpi=dpi, bbox_inches='tight')
+
+    return len(np.unique(obs['storm'][rows]))
+
+
+def plotSeasons(obs, out_dir, years, subbasins=None, bbox=None, years_per_figure=1, basemap=True):
+
+    # one PNG per group of years_per_figure consecutive seasons, same map for all of them
+    years = sorted(years)
+    if bbox is None:
+        bbox = tracksBBox(obs, trackRows(obs, subbasins, years))
+
+    paths = []
+    for i in range(0, len(years), years_per_figure):
+        group = years[i:i + years_per_figure]
+        name = '{}'.format(group[0]) if len(group) == 1 else '{}_{}'.format(group[0], group[-1])
+        path = os.path.join(out_dir, 'storm_tracks_{}.png'.format(name))
+        n = plotStormTracks(obs, path, subbasins, group, bbox, title=name.replace('_', ' - '), basemap=basemap)
+        print('{} storms drawn to {}'.format(n, path))
+        paths.append(path)
+
+    return paths
+
+
+def parseYears(text):
+
+    # '2005', '1970-2019' or '1970,1985,2005'
+    years = []
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            years.extend(range(int(first), int(last) + 1))
+        else:
+            years.append(int(part))
+
+    return years
+
+
+if __name__ == '__main__':
+
+    prsr = ArgumentParser(description='Storm tracks of an IBTrACS NetCDF drawn to PNG')
+    prsr.add_argument('nc_path', help='IBTrACS v04 NetCDF')
+    prsr.add_argument('output', help='output PNG, or folder with --years_per_figure')
+    prsr.add_argument('--years', type=parseYears, default=None, help="e.g. 2005, 1970-2019 or 1970,2005")
+    prsr.add_argument('--subbasins', nargs='+', default=None, help='subbasin codes, e.g. GM')
+    prsr.add_argument('--bbox', type=float, nargs=4, default=None, metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'),
+                      help='map extent, default fits the tracks')
+    prsr.add_argument('--gulf', action='store_const', const=GULF_BBOX, dest='bbox',
+                      help='Gulf of Mexico extent of the old scripts')
+    prsr.add_argument('--years_per_figure', type=int, default=None, help='one PNG per this many seasons')
+    prsr.add_argument('--no_basemap', action='store_true', help='plain lon/lat axes even with Basemap installed')
+    args = prsr.parse_args()
+
+    obs = loadStormObservations(args.nc_path)
+
+    if args.years_per_figure is not None:
+        years = args.years if args.years is not None else np.unique(obs.Years()).tolist()
+        os.makedirs(args.output, exist_ok=True)
+        plotSeasons(obs, args.output, years, args.subbasins, args.bbox, args.years_per_figure,
+                    not args.no_basemap)
+    else:
+        n = plotStormTracks(obs, args.output, args.subbasins, args.years, args.bbox, basemap=not args.no_basemap)
+        print('{} storms drawn to {}'.format(n, args.output))